@@ -0,0 +1,101 @@
+# scripts/bench_market.py
+"""
+Match throughput and per-order latency of the market order book
+(wt_app.core.market).
+
+    python scripts/bench_market.py                     # 200k orders, engine only
+    python scripts/bench_market.py --orders 50000 --settle
+
+Orders are random bids / asks over 10 building types x 5 levels with prices
+scattered around 1000, so about a quarter of them fill on arrival. "engine"
+times OrderBook.submit with no settlement; --settle also runs the escrow
+side of a fill through the real ledger (hold on every bid, payout + refund on
+every fill), in a temp dir so the repo's data/ is untouched.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def make_orders(n: int, seed: int = 7) -> list:
+    rnd = random.Random(seed)
+    types = [f"type{i}" for i in range(10)]
+    rows = []
+    for i in range(n):
+        side = "BID" if rnd.random() < 0.5 else "ASK"
+        # bids a little below asks on average, so the book keeps some depth
+        mid = 1000 + (-30 if side == "BID" else 30)
+        rows.append({
+            "id": f"o{i}",
+            "side": side,
+            "owner": f"user{rnd.randrange(2000)}@x.com",
+            "type": rnd.choice(types),
+            "level": rnd.randint(1, 5),
+            "price": max(10, int(rnd.gauss(mid, 60))),
+            "pinId": f"p{i}" if side == "ASK" else None,
+            "createdAt": 0,
+        })
+    return rows
+
+
+def pct(sorted_ns: list, q: float) -> float:
+    return sorted_ns[min(len(sorted_ns) - 1, int(q * len(sorted_ns)))] / 1000.0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--orders", type=int, default=200_000)
+    ap.add_argument("--settle", action="store_true", help="hold / pay out escrow through the ledger")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="wt-bench-")
+    os.chdir(tmp)
+    os.environ["WT_STATE_BACKEND"] = "json"
+    (Path(tmp) / "data").mkdir()
+
+    from wt_app.core import ledger, market
+    from wt_app.api.economy import adjust_balance, escrow_hold, escrow_payout
+
+    orders = make_orders(args.orders)
+    ob = market.OrderBook()
+    def pay_out(bid, ask, price):
+        escrow_payout(bid["id"], ask["owner"], fee_pct=0.02, amount=price, refund_to=bid["owner"])
+
+    settle = pay_out if args.settle else None
+    if args.settle:
+        ledger.open_ledger()
+        for i in range(2000):
+            adjust_balance(f"user{i}@x.com", 10**9)
+
+    lat = []
+    fills = 0
+    t_start = time.perf_counter()
+    for o in orders:
+        t0 = time.perf_counter_ns()
+        if settle is not None and o["side"] == "BID":
+            escrow_hold(o["id"], o["owner"], o["price"])
+        f, _ = ob.submit(o, settle=settle)
+        lat.append(time.perf_counter_ns() - t0)
+        fills += len(f)
+    elapsed = time.perf_counter() - t_start
+    if args.settle:
+        ledger.close()
+
+    lat.sort()
+    print(f"orders: {args.orders}  mode: {'engine + ledger settle' if args.settle else 'engine'}")
+    print(f"fills: {fills}  resting: {len(ob)}")
+    print(f"throughput: {args.orders / elapsed:,.0f} orders/s  ({fills / elapsed:,.0f} fills/s)")
+    print(f"latency us: p50 {pct(lat, 0.50):.1f}  p95 {pct(lat, 0.95):.1f}  p99 {pct(lat, 0.99):.1f}  max {lat[-1] / 1000:.1f}")
+
+
+if __name__ == "__main__":
+    main()
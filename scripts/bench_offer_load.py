@@ -0,0 +1,109 @@
+# scripts/bench_offer_load.py
+"""
+Offer store load cost on a large legacy offers.json, before and after the
+one-time schema migration (wt_app.api.offers_v2.migrate_offers).
+
+    python scripts/bench_offer_load.py                  # 200k offers
+    python scripts/bench_offer_load.py --offers 500000
+
+"before": load the store and run the per-row legacy normalization that every
+offer request used to pay. "migrate": the one-time startup pass. "after":
+load the migrated store; requests trust the rows. Runs with the JSON backend
+in a temp dir, so the repo's data/ is untouched.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def make_legacy_offers(n: int, seed: int = 7) -> list:
+    rnd = random.Random(seed)
+    statuses = ["pending", "Accepted", "REJECTED", "cancelled", "EXPIRED", "weird", None]
+    now = int(time.time() * 1000)
+    rows = []
+    for i in range(n):
+        created = now - rnd.randrange(90 * 86400) * 1000
+        o = {
+            "id": f"o{i}",
+            "pinId": f"p{rnd.randrange(n // 4 + 1)}",
+            "fromOwner": f"user{rnd.randrange(5000)}@x.com",
+            "toOwner": f"user{rnd.randrange(5000)}@x.com",
+            "amount": rnd.randint(10, 5000),
+            "status": rnd.choice(statuses),
+        }
+        r = rnd.random()
+        if r < 0.3:
+            o["t"] = created                      # v1 rows: no createdAt
+        else:
+            o["createdAt"] = created
+        if r < 0.5:
+            o["expiresAt"] = created // 1000 + 86400   # seconds
+        elif r < 0.8:
+            o["expiresAt"] = created + 86400 * 1000
+        if rnd.random() < 0.5:
+            o["history"] = [{"t": created, "a": "CREATED"}]
+        rows.append(o)
+    return rows
+
+
+def timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--offers", type=int, default=200_000)
+    ap.add_argument("--requests", type=int, default=20, help="offer requests simulated per phase")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="wt-bench-")
+    os.chdir(tmp)
+    os.environ["WT_STATE_BACKEND"] = "json"
+    (Path(tmp) / "data").mkdir()
+    (Path(tmp) / "data" / "offers.json").write_text(
+        json.dumps(make_legacy_offers(args.offers), indent=2), encoding="utf-8"  # same layout the store writes
+    )
+
+    from wt_app.core import state_store
+    from wt_app.api import offers_v2
+
+    def legacy_request_path():
+        # what _load_offers did on every list / accept / reject / cancel
+        for o in state_store.offer_list():
+            offers_v2._normalize_offer(dict(o))
+
+    load_before = timed(state_store.load)
+    per_req_before = timed(lambda: [legacy_request_path() for _ in range(args.requests)]) / args.requests
+
+    t0 = time.perf_counter()
+    changed = asyncio.run(offers_v2.migrate_offers())
+    migrate = time.perf_counter() - t0
+
+    load_after = timed(state_store.load)
+    owner = "user1@x.com"
+    per_req_after = timed(
+        lambda: [offers_v2.list_offers(owner=owner) for _ in range(args.requests)]
+    ) / args.requests
+
+    print(f"offers: {args.offers}  (rows rewritten by migration: {changed})")
+    print(f"{'':>22} {'before':>10} {'after':>10}")
+    print(f"{'store load ms':>22} {load_before * 1e3:>10.1f} {load_after * 1e3:>10.1f}")
+    print(f"{'per request ms':>22} {per_req_before * 1e3:>10.1f} {per_req_after * 1e3:>10.2f}")
+    print(f"{'one-time migrate ms':>22} {migrate * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
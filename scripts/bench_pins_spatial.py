@@ -0,0 +1,136 @@
+# scripts/bench_pins_spatial.py
+"""
+Viewport query cost over a large world: GET /pins?bbox= through the pin grid
+(wt_app.core.pin_grid) against a linear scan of every pin, and
+GET /pins/clusters (wt_app.core.pin_clusters): build, per-change upkeep and
+per-viewport read at a few zooms, and GET /pins/nearest-free
+(wt_app.core.free_slots): k-d tree build and k=10 query latency.
+
+    python scripts/bench_pins_spatial.py                  # 1M pins
+    python scripts/bench_pins_spatial.py --pins 200000 --queries 500
+
+Pins are clustered around a few dozen "cities" so viewports see realistic
+density; each query is a random city-scale viewport (~0.1-0.3 deg square).
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def make_pins(n: int, seed: int = 7) -> tuple:
+    rnd = random.Random(seed)
+    cities = [(rnd.uniform(-50, 60), rnd.uniform(-120, 140)) for _ in range(40)]
+    rows = []
+    for i in range(n):
+        clat, clng = rnd.choice(cities)
+        rows.append({
+            "id": f"p{i}",
+            "lat": clat + rnd.gauss(0, 0.5),
+            "lng": clng + rnd.gauss(0, 0.5),
+            "owner": None if rnd.random() < 0.4 else f"user{rnd.randrange(5000)}@x.com",
+            "type": rnd.choice(["house", "shop", "office", "factory", "datacenter"]),
+            "level": rnd.randint(1, 5),
+        })
+    return rows, cities
+
+
+def make_boxes(cities: list, n: int, seed: int = 11) -> list:
+    rnd = random.Random(seed)
+    boxes = []
+    for _ in range(n):
+        clat, clng = rnd.choice(cities)
+        lat, lng = clat + rnd.gauss(0, 0.5), clng + rnd.gauss(0, 0.5)
+        h, w = rnd.uniform(0.05, 0.15), rnd.uniform(0.05, 0.15)
+        boxes.append((lat - h, lng - w, lat + h, lng + w))
+    return boxes
+
+
+def scan(pins: list, box: tuple) -> list:
+    a, b, c, d = box
+    return [p for p in pins if a <= p["lat"] <= c and b <= p["lng"] <= d]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pins", type=int, default=1_000_000)
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="wt-bench-"))
+    from wt_app.core.free_slots import FreeSlots, to_point as fs_point
+    from wt_app.core.pin_clusters import PinClusters
+    from wt_app.core.pin_grid import PinGrid
+
+    pins, cities = make_pins(args.pins)
+    boxes = make_boxes(cities, args.queries)
+
+    t0 = time.perf_counter()
+    g = PinGrid()
+    g.pins_reset(pins)
+    build = time.perf_counter() - t0
+
+    lat, hits = [], 0
+    for box in boxes:
+        t0 = time.perf_counter()
+        hits += len(g.within(*box))
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+
+    n_scan = min(20, len(boxes))
+    t0 = time.perf_counter()
+    for box in boxes[:n_scan]:
+        assert sorted(p["id"] for p in scan(pins, box)) == sorted(p["id"] for p in g.within(*box))
+    scan_ms = (time.perf_counter() - t0) / n_scan * 1e3
+
+    print(f"pins: {args.pins}  grid build: {build * 1e3:.0f} ms  cells: {len(g._cells)}")
+    print(f"bbox queries: {args.queries}  mean hits: {hits / len(boxes):.0f}")
+    print(f"grid ms: p50 {lat[len(lat) // 2] * 1e3:.2f}  p99 {lat[int(len(lat) * 0.99)] * 1e3:.2f}")
+    print(f"linear scan ms (+ grid, checked equal): {scan_ms:.1f}")
+
+    t0 = time.perf_counter()
+    pc = PinClusters()
+    pc.pins_reset(pins)
+    build = time.perf_counter() - t0
+    rnd = random.Random(5)
+    t0 = time.perf_counter()
+    for p in rnd.sample(pins, 10_000):
+        before = dict(p)
+        p["owner"] = None if p["owner"] else "bench@x.com"
+        pc.pin_changed(before, p)
+    upkeep_us = (time.perf_counter() - t0) / 10_000 * 1e6
+    print(f"clusters build: {build * 1e3:.0f} ms  upkeep per pin change: {upkeep_us:.1f} us")
+    for z, (h, w) in ((2, (60, 170)), (6, (4, 10)), (10, (0.3, 0.7))):
+        lat, cells = [], 0
+        for (clat, clng) in cities[:20]:
+            t0 = time.perf_counter()
+            cells += len(pc.clusters(z, clat - h / 2, clng - w / 2, clat + h / 2, clng + w / 2))
+            lat.append(time.perf_counter() - t0)
+        lat.sort()
+        print(f"clusters z={z:<2} viewport: mean cells {cells / len(lat):.0f}  p50 {lat[len(lat) // 2] * 1e3:.2f} ms  max {lat[-1] * 1e3:.2f} ms")
+
+    t0 = time.perf_counter()
+    fs = FreeSlots()
+    fs.pins_reset(pins)
+    build = time.perf_counter() - t0
+    lat = []
+    for box in boxes:
+        q = ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+        t0 = time.perf_counter()
+        fs._tree.nearest(fs_point(*q), 10, fs._live, [])
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    print(f"nearest-free: {len(fs)} free pins  tree build {build * 1e3:.0f} ms  "
+          f"k=10 p50 {lat[len(lat) // 2] * 1e3:.3f} ms  p99 {lat[int(len(lat) * 0.99)] * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# scripts/bench_store_codec.py
+"""
+Store file decode / encode throughput (wt_app.core.store_codec) on large
+data/ files, against the stdlib json path state_store used before and the
+older per-row Pydantic validation (Pin(**row) on read, model_dump() on write).
+
+    python scripts/bench_store_codec.py                 # 100k pins / offers / events
+    python scripts/bench_store_codec.py --rows 20000 --repeat 3
+
+Rows look like the ones the app writes; each timing is the best of --repeat.
+Also checks that msgspec output is byte-identical to json.dumps(indent=2).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def make_pins(n: int, rnd: random.Random) -> list:
+    return [{
+        "lat": rnd.uniform(-60, 60),
+        "lng": rnd.uniform(-180, 180),
+        "color": "#22c55e",
+        "type": rnd.choice([None, "House", "Shop", "Data Center", "PR Office"]),
+        "owner": None if rnd.random() < 0.4 else f"user{rnd.randrange(5000)}@x.com",
+        "level": rnd.randint(1, 5),
+        "streetId": None,
+        "streetName": None,
+        "id": uuid.UUID(int=rnd.getrandbits(128)).hex,
+        "createdAt": 1762266970230 + i,
+    } for i in range(n)]
+
+
+def make_offers(n: int, rnd: random.Random) -> list:
+    out = []
+    for i in range(n):
+        t = 1762436993837 + i
+        out.append({
+            "id": uuid.UUID(int=rnd.getrandbits(128)).hex,
+            "pinId": uuid.UUID(int=rnd.getrandbits(128)).hex,
+            "fromOwner": f"user{rnd.randrange(5000)}@x.com",
+            "toOwner": f"user{rnd.randrange(5000)}@x.com",
+            "amount": rnd.randrange(10, 5000),
+            "status": "ACCEPTED",
+            "createdAt": t,
+            "expiresAt": t + 86_400_000,
+            "note": "",
+            "history": [{"t": t, "a": "CREATED"}, {"t": t + 5000, "a": "ACCEPTED", "net": 95, "pinType": "House"}],
+        })
+    return out
+
+
+def make_events(n: int, rnd: random.Random) -> list:
+    return [{
+        "id": uuid.UUID(int=rnd.getrandbits(128)).hex,
+        "t": 1762438140905 + i,
+        "type": "Offer Created",
+        "city": "Global",
+        "note": f"user{rnd.randrange(5000)}@x.com → user{rnd.randrange(5000)}@x.com £{rnd.randrange(10, 5000)}",
+        "cdMins": 0,
+    } for i in range(n)]
+
+
+def best(fn, repeat: int) -> float:
+    out = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out = min(out, time.perf_counter() - t0)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="wt-bench-"))
+    from wt_app.api.pins import Pin as PinModel
+    from wt_app.core import store_codec
+
+    rnd = random.Random(7)
+    n, rep = args.rows, args.repeat
+    print(f"msgspec: {'yes' if store_codec.msgspec is not None else 'no (stdlib json fallback)'}  rows per file: {n}")
+
+    stores = [("pins", make_pins(n, rnd)), ("offers", make_offers(n, rnd)), ("events", make_events(n, rnd))]
+    for kind, rows in stores:
+        raw = json.dumps(rows, ensure_ascii=False, indent=2).encode("utf-8")
+        assert store_codec.loads(raw, kind) == rows
+        assert store_codec.dumps(rows) == raw
+        mb = len(raw) / 1e6
+
+        dec_json = best(lambda: json.loads(raw.decode("utf-8")), rep)
+        dec_codec = best(lambda: store_codec.loads(raw, kind), rep)
+        enc_json = best(lambda: json.dumps(rows, ensure_ascii=False, indent=2).encode("utf-8"), rep)
+        enc_codec = best(lambda: store_codec.dumps(rows), rep)
+        print(f"{kind:<7} {mb:6.1f} MB  decode: json {dec_json * 1e3:6.0f} ms  codec {dec_codec * 1e3:5.0f} ms "
+              f"({dec_json / dec_codec:.1f}x)  encode: json {enc_json * 1e3:6.0f} ms  codec {enc_codec * 1e3:5.0f} ms "
+              f"({enc_json / enc_codec:.1f}x)  codec rows/s: {n / dec_codec:,.0f} in, {n / enc_codec:,.0f} out")
+
+        if kind == "pins":
+            dec_model = best(lambda: [PinModel(**r) for r in json.loads(raw.decode("utf-8"))], max(1, rep // 2))
+            models = [PinModel(**r) for r in rows]
+            enc_model = best(lambda: json.dumps([m.model_dump() for m in models], ensure_ascii=False, indent=2), max(1, rep // 2))
+            print(f"{'':<7} {'':>9}  per-row Pydantic: decode {dec_model * 1e3:6.0f} ms ({dec_model / dec_codec:.1f}x codec)  "
+                  f"encode {enc_model * 1e3:6.0f} ms ({enc_model / enc_codec:.1f}x codec)")
+
+    legacy = make_pins(n, rnd)
+    for p in legacy[::1000]:
+        p["legacyField"] = 1    # one unknown key per 1000 rows forces the untyped path
+    raw = json.dumps(legacy, ensure_ascii=False, indent=2).encode("utf-8")
+    assert store_codec.loads(raw, "pins") == legacy
+    print(f"pins with legacy rows: decode codec {best(lambda: store_codec.loads(raw, 'pins'), rep) * 1e3:.0f} ms "
+          f"(typed pass fails, untyped decode keeps every row)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# scripts/bench_tick.py
+"""
+Economy tick benchmark: per-pin dict loop vs. the columnar NumPy engine.
+
+    python scripts/bench_tick.py                 # 100k and 1M pins
+    python scripts/bench_tick.py --sizes 250000
+
+"build" is the one-off column pack after a pin mutation; "tick" is the
+steady-state cost when the cached columns are reused.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from wt_app.core import tick_engine  # noqa: E402
+
+INCOME = {"Data Center": 12, "Solar Farm": 8, "PR Office": 5, "Generator Upgrade": 0, "Media Tower": 9, "HQ": 3}
+
+
+def make_pins(n: int, owners: int = 5000, seed: int = 7) -> list:
+    rnd = random.Random(seed)
+    types = list(INCOME) + ["Legacy Type"]
+    return [
+        {
+            "id": f"p{i}",
+            "owner": None if rnd.random() < 0.2 else f"user{rnd.randrange(owners)}@x.com",
+            "type": rnd.choice(types),
+            "level": rnd.randint(1, 5),
+        }
+        for i in range(n)
+    ]
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    if tick_engine.np is None:
+        sys.exit("numpy is not installed; nothing to compare")
+
+    print(f"{'pins':>10} {'loop ms':>10} {'build ms':>10} {'tick ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        pins = make_pins(n)
+        loop_s = best_of(lambda: tick_engine.accrue_loop(pins, INCOME), args.repeat)
+        build_s = best_of(lambda: tick_engine.PinColumns(pins), max(1, args.repeat // 2))
+        cols = tick_engine.PinColumns(pins)
+        tick_s = best_of(lambda: tick_engine.accrue_columns(cols, INCOME), args.repeat)
+
+        assert tick_engine.accrue_columns(cols, INCOME) == tick_engine.accrue_loop(pins, INCOME)
+        print(f"{n:>10} {loop_s * 1e3:>10.1f} {build_s * 1e3:>10.1f} {tick_s * 1e3:>10.2f} {loop_s / tick_s:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
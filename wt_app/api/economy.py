@@ -1,62 +1,69 @@
 from __future__ import annotations
 import os
-import json
+import threading
 import time
-from pathlib import Path
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 
-router = APIRouter(prefix="/economy", tags=["economy"])
+from wt_app.core import ledger, settings_store, state_store
+from wt_app.core.income_rates import rates as income_rates
+from wt_app.core.security import require_admin
+from wt_app.core.telemetry import tick_stats
 
-DATA = Path("data"); DATA.mkdir(exist_ok=True)
-PINS_FILE = DATA / "pins.json"
-TYPES_FILE = DATA / "building_types.json"
-ECO_FILE = DATA / "economy.json"
+router = APIRouter(prefix="/economy", tags=["economy"])
 
 
-# ---------- helpers (fs + time) ----------
+# ---------- helpers (time) ----------
 def _interval_sec() -> int:
-    """Auto-tick interval (seconds), default 5 minutes, env override WT_AUTO_TICK_MIN."""
-    try:
-        return int(float(os.getenv("WT_AUTO_TICK_MIN", "5")) * 60)
-    except Exception:
-        return 300
+    """Auto-tick interval (seconds): admin autoTickMin, falling back to WT_AUTO_TICK_MIN."""
+    return settings_store.auto_tick_seconds()
 
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
 
-def _read_json(path: Path, default):
-    if not path.exists():
-        return default
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return default
+# held while a tick computes + commits; a second caller gets 409 instead of queueing
+_tick_guard = threading.Lock()
 
+# Summaries of recently applied epochs, replayed for duplicate / retried ticks.
+TICK_RESULTS_KEEP = 64
+_tick_results: "OrderedDict[int, SummaryOut]" = OrderedDict()
 
-def _write_json(path: Path, obj) -> None:
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+# Cap on missed intervals credited by one tick after downtime (default: 1 day at 5 min).
+TICK_MAX_CATCHUP = int(os.getenv("WT_TICK_MAX_CATCHUP", "288") or 288)
+
+
+def _due_intervals(last_ms: int, now_ms: int, interval_ms: int) -> tuple[int, int]:
+    """
+    (intervals to credit, new lastTick) for a tick at now_ms.
+    Whole missed intervals are credited in one pass, capped at TICK_MAX_CATCHUP;
+    lastTick advances by whole intervals so the schedule keeps its phase. The
+    very first tick credits one interval; (0, last_ms) means nothing is due.
+    """
+    if not last_ms or interval_ms <= 0:
+        return 1, now_ms
+    due = (now_ms - last_ms) // interval_ms
+    if due < 1:
+        return 0, last_ms
+    if due > TICK_MAX_CATCHUP:
+        # the rest of the outage is forfeited; restart the schedule from now
+        return TICK_MAX_CATCHUP, now_ms
+    return int(due), last_ms + int(due) * interval_ms
 
 
 # ---------- domain helpers ----------
 def _type_income_map() -> Dict[str, int]:
-    raw = _read_json(TYPES_FILE, [])
     return {
         r["key"]: int(r.get("baseIncome", 0))
-        for r in raw
-        if isinstance(r, dict) and "key" in r
+        for r in state_store.building_types()
+        if "key" in r
     }
 
 
-def _load_pins() -> List[dict]:
-    raw = _read_json(PINS_FILE, [])
-    return [r for r in raw if isinstance(r, dict)]
-
-
 def _normalize_last_tick_ms_in(eco: dict) -> int:
     """
     Accept legacy keys and units; return epoch ms.
@@ -77,15 +84,10 @@ def _normalize_last_tick_ms_in(eco: dict) -> int:
 
 
 def _load_economy() -> dict:
-    eco = _read_json(ECO_FILE, {})
+    """Live economy document from the state store, normalized in place."""
+    eco = state_store.economy()
 
-    # balances map
-    if "balances" not in eco or not isinstance(eco["balances"], dict):
-        eco["balances"] = {}  # owner -> int
-
-    # escrow bucket for offers: {offer_id: amount}
-    if "escrow" not in eco or not isinstance(eco["escrow"], dict):
-        eco["escrow"] = {}
+    # balances + escrow live in the ledger (wt_app/core/ledger.py), not here
 
     # Normalize tick fields so the rest of the code can rely on eco["lastTick"] in ms
     last_ms = _normalize_last_tick_ms_in(eco)
@@ -102,49 +104,39 @@ def _save_economy(eco: dict) -> None:
         eco["lastTick"] = 0
     eco["last_tick_ms"] = int(eco["lastTick"])
 
-    # ensure required shapes before write (defensive)
-    if "balances" not in eco or not isinstance(eco["balances"], dict):
-        eco["balances"] = {}
-    if "escrow" not in eco or not isinstance(eco["escrow"], dict):
-        eco["escrow"] = {}
-
-    _write_json(ECO_FILE, eco)
+    state_store.mark_dirty("economy")
 
 
 # ---------- balance helpers (used by offers / map / etc.) ----------
+# Each write is one ledger append; checks run under the store lock so the
+# read-check-append sequence is atomic.
 def get_balance(owner: str) -> int:
-    eco = _load_economy()
-    return int(eco["balances"].get(owner, 0))
+    return ledger.balance(owner)
 
 
 def set_balance(owner: str, value: int) -> int:
-    eco = _load_economy()
-    eco["balances"][owner] = int(value)
-    _save_economy(eco)
-    return int(eco["balances"][owner])
+    with state_store.lock:
+        ledger.append("set", {owner: int(value) - ledger.balance(owner)})
+        return ledger.balance(owner)
 
 
 def adjust_balance(owner: str, delta: int) -> int:
-    eco = _load_economy()
-    cur = int(eco["balances"].get(owner, 0))
-    cur += int(delta)
-    eco["balances"][owner] = cur
-    _save_economy(eco)
-    return cur
+    with state_store.lock:
+        ledger.append("adjust", {owner: int(delta)})
+        return ledger.balance(owner)
 
 
 def transfer(from_owner: str, to_owner: str, amount: int) -> None:
-    """Atomic-ish transfer: debit buyer, credit seller, raise on insufficient funds."""
+    """Atomic transfer: debit buyer, credit seller, raise on insufficient funds."""
     amount = int(amount)
     if amount <= 0:
         raise ValueError("amount must be > 0")
-    eco = _load_economy()
-    from_bal = int(eco["balances"].get(from_owner, 0))
-    if from_bal < amount:
-        raise ValueError("insufficient funds")
-    eco["balances"][from_owner] = from_bal - amount
-    eco["balances"][to_owner] = int(eco["balances"].get(to_owner, 0)) + amount
-    _save_economy(eco)
+    with state_store.lock:
+        if ledger.balance(from_owner) < amount:
+            raise ValueError("insufficient funds")
+        deltas = {from_owner: -amount}
+        deltas[to_owner] = deltas.get(to_owner, 0) + amount
+        ledger.append("transfer", deltas)
 
 
 # ---------- NEW: escrow helpers for offers v2 ----------
@@ -157,14 +149,10 @@ def escrow_hold(offer_id: str, buyer: str, amount: int) -> None:
     if amount <= 0:
         raise ValueError("invalid escrow amount")
 
-    eco = _load_economy()
-    bal = int(eco["balances"].get(buyer, 0))
-    if bal < amount:
-        raise ValueError("insufficient funds for escrow")
-
-    eco["balances"][buyer] = bal - amount
-    eco["escrow"][offer_id] = int(eco["escrow"].get(offer_id, 0)) + amount
-    _save_economy(eco)
+    with state_store.lock:
+        if ledger.balance(buyer) < amount:
+            raise ValueError("insufficient funds for escrow")
+        ledger.append("escrow_hold", {buyer: -amount}, {offer_id: amount}, ref=offer_id)
 
 
 def escrow_refund(offer_id: str, buyer: str) -> None:
@@ -172,33 +160,43 @@ def escrow_refund(offer_id: str, buyer: str) -> None:
     Refund escrow for offer_id back to buyer (used on reject/cancel/expire).
     No-op if nothing in escrow.
     """
-    eco = _load_economy()
-    amt = int(eco["escrow"].get(offer_id, 0))
-    if amt > 0:
-        eco["escrow"].pop(offer_id, None)
-        eco["balances"][buyer] = int(eco["balances"].get(buyer, 0)) + amt
-        _save_economy(eco)
-
-
-def escrow_payout(offer_id: str, seller: str, fee_pct: float = 0.0) -> int:
+    with state_store.lock:
+        amt = ledger.escrow_amount(offer_id)
+        if amt > 0:
+            ledger.append("escrow_refund", {buyer: amt}, {offer_id: -amt}, ref=offer_id)
+
+
+def escrow_payout(
+    offer_id: str,
+    seller: str,
+    fee_pct: float = 0.0,
+    amount: Optional[int] = None,
+    refund_to: Optional[str] = None,
+) -> int:
     """
     Payout escrow for offer_id to seller, applying an optional fee percentage.
     Returns net amount credited to seller. No-op (0) if nothing in escrow.
-    """
-    eco = _load_economy()
-    amt = int(eco["escrow"].get(offer_id, 0))
-    if amt <= 0:
-        return 0
 
-    eco["escrow"].pop(offer_id, None)
+    With `amount`, only that much is paid out and the rest of the escrow goes
+    back to `refund_to` in the same ledger entry (market fills below the bid).
+    """
+    with state_store.lock:
+        held = ledger.escrow_amount(offer_id)
+        if held <= 0:
+            return 0
+        amt = held if amount is None else min(held, max(0, int(amount)))
 
-    fee_pct = max(0.0, float(fee_pct or 0.0))
-    fee = int(round(amt * fee_pct))
-    net = max(0, amt - fee)
+        fee_pct = max(0.0, float(fee_pct or 0.0))
+        fee = int(round(amt * fee_pct))
+        net = max(0, amt - fee)
 
-    eco["balances"][seller] = int(eco["balances"].get(seller, 0)) + net
-    _save_economy(eco)
-    return net
+        deltas = {seller: net}
+        released = amt
+        if held > amt and refund_to:
+            deltas[refund_to] = deltas.get(refund_to, 0) + (held - amt)
+            released = held
+        ledger.append("escrow_payout", deltas, {offer_id: -released}, ref=offer_id, fee=fee)
+        return net
 
 
 # ---------- models ----------
@@ -211,9 +209,40 @@ class BalanceItem(BaseModel):
 class SummaryOut(BaseModel):
     lastTick: int
     intervalSec: int
+    intervalsApplied: int = 0   # set by /tick: missed intervals credited in that pass
+    epoch: Optional[int] = None  # set by /tick: epoch reached (lastTick // interval)
+    duplicate: bool = False      # /tick for an epoch that was already applied (nothing credited)
     totals: List[BalanceItem]
 
 
+class LedgerEntryOut(BaseModel):
+    seq: int
+    t: int
+    op: str
+    delta: int
+    ref: Optional[str] = None
+
+
+class HistoryOut(BaseModel):
+    owner: str
+    balance: int
+    next_before: Optional[int] = None
+    items: List[LedgerEntryOut]
+
+
+class RateDiff(BaseModel):
+    owner: str
+    maintained: int
+    rebuilt: int
+
+
+class RatesCheckOut(BaseModel):
+    ok: bool
+    owners: int
+    repaired: bool = False
+    mismatches: List[RateDiff]
+
+
 class TransferIn(BaseModel):
     """Optional dev/test endpoint payload."""
     fromOwner: str = Field(..., min_length=1)
@@ -234,7 +263,7 @@ def summary():
     now = _now_ms()
     items = [
         BalanceItem(owner=k, balance=int(v), updatedAt=now)
-        for k, v in eco["balances"].items()
+        for k, v in ledger.balances().items()
         if k
     ]
     items.sort(key=lambda x: x.balance, reverse=True)
@@ -245,44 +274,143 @@ def summary():
     )
 
 
+# ---------- tick epochs ----------
+def _epoch(last_ms: int, interval_ms: int) -> int:
+    """Epoch a lastTick belongs to; lastTick advances by whole intervals, so each credited interval is one epoch."""
+    if not last_ms or interval_ms <= 0:
+        return -1
+    return int(last_ms) // interval_ms
+
+
+def next_epoch() -> int:
+    """Epoch the next tick will reach (what the scheduler asks for)."""
+    interval_ms = _interval_sec() * 1000
+    last = int(_load_economy()["lastTick"] or 0)
+    return _epoch(last, interval_ms) + 1 if last else _epoch(_now_ms(), interval_ms)
+
+
+def _replay(epoch: int) -> SummaryOut:
+    cached = _tick_results.get(epoch)
+    out = cached.model_copy() if cached is not None else summary()
+    out.epoch = epoch
+    out.duplicate = True
+    return out
+
+
 @router.post("/tick", response_model=SummaryOut)
-def tick():
+def tick(epoch: Optional[int] = Query(None, description="epoch this tick is for; already-applied epochs are no-ops")):
     """
     Accrue income per owner:
-    sum(baseIncome[type] * level) across all pins for that owner.
+    sum(baseIncome[type] * level) across all pins for that owner,
+    read from the maintained rate table (wt_app/core/income_rates.py).
+
+    Exactly once per epoch: a tick before the next interval is due (or for an
+    `epoch` already applied) credits nothing and returns that epoch's summary.
     """
-    pins = _load_pins()
-    if not pins:
+    return _run_tick(epoch)
+
+
+def scheduled_tick(epoch: Optional[int] = None) -> SummaryOut:
+    """Auto-tick entry point (called directly, not over HTTP)."""
+    return _run_tick(epoch)
+
+
+def _run_tick(epoch: Optional[int]) -> SummaryOut:
+    started = time.perf_counter()
+    if not state_store.pins():
         raise HTTPException(status_code=400, detail="No pins available")
 
-    income_map = _type_income_map()
-    if not income_map:
+    if not _type_income_map():
         raise HTTPException(status_code=500, detail="Type registry missing or empty")
 
-    # compute per owner tick income
-    per_owner: Dict[str, int] = {}
-    for p in pins:
-        owner = (p.get("owner") or "").strip()
-        if not owner:
-            continue
-        tkey = p.get("type") or ""
-        base = int(income_map.get(tkey, 0))
-        level = int(p.get("level") or 1)
-        level = min(5, max(1, level))
-        per_owner[owner] = per_owner.get(owner, 0) + (base * level)
+    if not _tick_guard.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Tick already running")
+    try:
+        with state_store.lock:
+            eco = _load_economy()
+            last = int(eco["lastTick"])
+            interval_ms = _interval_sec() * 1000
+            applied = _epoch(last, interval_ms)
+            if epoch is not None and epoch <= applied:
+                return _replay(epoch)
+            intervals, new_last = _due_intervals(last, _now_ms(), interval_ms)
+            if not intervals:
+                return _replay(applied)
+            new_epoch = _epoch(new_last, interval_ms)
+
+            # closed form for N missed intervals: rate * N, one ledger entry.
+            # accrual only for owners we found income for; others keep their balances
+            per_owner = {o: r * intervals for o, r in income_rates.snapshot().items()}
+            ledger.append("tick", per_owner, intervals=intervals, epoch=new_epoch)
+
+            # record canonical + legacy last tick in ms
+            eco["lastTick"] = new_last
+            eco["last_tick_ms"] = int(eco["lastTick"])
+
+            _save_economy(eco)
+            pins_covered = len(state_store.pins())
+
+            out = summary()
+            out.intervalsApplied = intervals
+            out.epoch = new_epoch
+            _tick_results[new_epoch] = out.model_copy()
+            while len(_tick_results) > TICK_RESULTS_KEEP:
+                _tick_results.popitem(last=False)
+    finally:
+        _tick_guard.release()
+
+    tick_stats.record(
+        (time.perf_counter() - started) * 1000,
+        pins=pins_covered,
+        owners=sum(1 for v in per_owner.values() if v),
+        intervals=intervals,
+    )
+    return out
 
-    eco = _load_economy()
 
-    # accrual only for owners we found income for; others keep their balances
-    for owner, inc in per_owner.items():
-        eco["balances"][owner] = int(eco["balances"].get(owner, 0)) + int(inc)
+@router.get("/tick-stats", dependencies=[Depends(require_admin)])
+def tick_telemetry():
+    """Tick duration histogram, pins processed and owners credited (in-memory, since start)."""
+    return tick_stats.snapshot()
 
-    # record canonical + legacy last tick in ms
-    eco["lastTick"] = _now_ms()
-    eco["last_tick_ms"] = int(eco["lastTick"])
 
-    _save_economy(eco)
-    return summary()
+@router.get("/history", response_model=HistoryOut)
+def account_history(
+    owner: str = Query(..., min_length=1),
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[int] = Query(None, ge=1),   # seq cursor from next_before
+):
+    """What happened to this account: ledger entries touching `owner`, newest first."""
+    rows = ledger.history(owner, limit=limit, before_seq=before)
+    items = [
+        LedgerEntryOut(
+            seq=int(e["seq"]),
+            t=int(e.get("t") or 0),
+            op=str(e.get("op") or ""),
+            delta=int(e["b"][owner]),
+            ref=e.get("ref"),
+        )
+        for e in rows
+    ]
+    next_before = items[-1].seq if len(items) >= limit else None
+    return HistoryOut(owner=owner, balance=get_balance(owner), next_before=next_before, items=items)
+
+
+@router.get("/rates/check", response_model=RatesCheckOut, dependencies=[Depends(require_admin)])
+def check_rates(repair: bool = Query(False)):
+    """Rebuild income rates from every pin and diff them against the maintained table."""
+    maintained, rebuilt = income_rates.check(repair=repair)
+    mismatches = [
+        RateDiff(owner=o, maintained=maintained.get(o, 0), rebuilt=rebuilt.get(o, 0))
+        for o in sorted(set(maintained) | set(rebuilt))
+        if maintained.get(o, 0) != rebuilt.get(o, 0)
+    ]
+    return RatesCheckOut(
+        ok=not mismatches,
+        owners=len(rebuilt),
+        repaired=bool(repair and mismatches),
+        mismatches=mismatches,
+    )
 
 
 # ---- optional dev/test transfer endpoint (handy for manual QA) ----
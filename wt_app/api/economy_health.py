@@ -1,31 +1,22 @@
 from __future__ import annotations
 from fastapi import APIRouter
 from pydantic import BaseModel, Field
-from pathlib import Path as FsPath
 from typing import Dict
-import os, json, time
+import time
 
-router = APIRouter(prefix="/economy", tags=["economy"])
+from wt_app.core import ledger, settings_store, state_store
 
-DATA = FsPath("data"); DATA.mkdir(exist_ok=True)
-ECO_FILE = DATA / "economy.json"
+router = APIRouter(prefix="/economy", tags=["economy"])
 
 
 def _interval_sec() -> int:
-    """Auto-tick interval (seconds), default 5 minutes, env override WT_AUTO_TICK_MIN."""
-    try:
-        return int(float(os.getenv("WT_AUTO_TICK_MIN", "5")) * 60)
-    except Exception:
-        return 5 * 60
+    """Auto-tick interval (seconds): admin autoTickMin, falling back to WT_AUTO_TICK_MIN."""
+    return settings_store.auto_tick_seconds()
 
 
 def _read_economy_raw() -> dict:
-    if not ECO_FILE.exists():
-        return {}
-    try:
-        return json.loads(ECO_FILE.read_text(encoding="utf-8")) or {}
-    except Exception:
-        return {}
+    # served from the in-memory store; economy.json is only the write-behind copy
+    return state_store.economy()
 
 
 def _normalize_last_tick_ms(raw: dict) -> int:
@@ -64,9 +55,8 @@ class HealthOut(BaseModel):
 def economy_health() -> HealthOut:
     raw = _read_economy_raw()
 
-    # balances can be in any case; normalize keys to lowercase emails
-    balances = raw.get("balances") or raw.get("BALANCES") or {}
-    norm_bal = {str(k).lower(): int(v) for (k, v) in (balances or {}).items()}
+    # balances come from the ledger and can be in any case; normalize keys to lowercase emails
+    norm_bal = {str(k).lower(): int(v) for (k, v) in ledger.balances().items()}
 
     last_tick_ms = _normalize_last_tick_ms(raw)
 
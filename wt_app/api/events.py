@@ -3,15 +3,13 @@ from __future__ import annotations
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
-from pathlib import Path
-import json, time, uuid
+import time, uuid
 
-router = APIRouter(prefix="/events", tags=["events"])
+from wt_app.core import event_log
 
-DATA_DIR = Path("data"); DATA_DIR.mkdir(exist_ok=True)
-FILE = DATA_DIR / "events.json"
+router = APIRouter(prefix="/events", tags=["events"])
 
-MAX_EVENTS = 100  # persist last 100 only
+MAX_EVENTS = event_log.RETENTION  # one limit for every producer (WT_EVENTS_RETENTION)
 
 # ---------- models ----------
 
@@ -27,66 +25,57 @@ class EventOut(EventIn):
 
 class PageOut(BaseModel):
     total: int
-    next_offset: Optional[int] = None
+    next_offset: Optional[int] = None   # offset paging (no filters)
+    next_before: Optional[int] = None   # cursor paging (filters / before)
     items: List[EventOut]
 
-# ---------- storage helpers ----------
+# ---------- routes ----------
 
-def _read() -> List[EventOut]:
-    if not FILE.exists():
-        return []
-    try:
-        raw = json.loads(FILE.read_text(encoding="utf-8"))
-    except Exception:
-        return []
+def _to_out(rows: List[Dict[str, Any]]) -> List[EventOut]:
     out: List[EventOut] = []
-    if isinstance(raw, list):
-        for r in raw:
-            if isinstance(r, dict):
-                try:
-                    out.append(EventOut(**r))
-                except Exception:
-                    # skip malformed row
-                    pass
+    for r in rows:
+        try:
+            out.append(EventOut(**r))
+        except Exception:
+            # skip malformed row
+            pass
     return out
 
-def _write(items: List[EventOut]) -> None:
-    FILE.write_text(
-        json.dumps([e.model_dump() for e in items], ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
-
-# ---------- routes ----------
 
 @router.get("", response_model=PageOut)
 def list_events(
     offset: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    type: Optional[str] = None,
+    city: Optional[str] = None,
+    since: Optional[int] = Query(None, ge=0, description="ms, inclusive"),
+    until: Optional[int] = Query(None, ge=0, description="ms, exclusive"),
+    before: Optional[int] = Query(None, ge=0, description="cursor from next_before"),
 ):
-    items = _read()
-    # newest first
-    items.sort(key=lambda r: int(r.t), reverse=True)
-
-    total = len(items)
-    page = items[offset : offset + limit]
+    """
+    Newest first. Plain offset paging over the ring, or, with any of type /
+    city / since / until / before, an indexed query paged by `next_before`.
+    """
+    if any(v is not None for v in (type, city, since, until, before)):
+        total, rows, nxt = event_log.query(
+            type_=type, city=city, since=since, until=until, before=before, limit=limit,
+        )
+        return PageOut(total=total, next_before=nxt, items=_to_out(rows))
+
+    # the ring is already in arrival order: newest first without sorting
+    total, rows = event_log.page(offset, limit)
     next_offset: Optional[int] = None
     if offset + limit < total:
         next_offset = offset + limit
 
-    return PageOut(total=total, next_offset=next_offset, items=page)
+    return PageOut(total=total, next_offset=next_offset, items=_to_out(rows))
 
 @router.post("", response_model=EventOut)
 def add_event(payload: EventIn):
-    items = _read()
-    ev = EventOut(**payload.model_dump())
-    items.append(ev)
-    # keep newest MAX_EVENTS
-    items.sort(key=lambda r: int(r.t), reverse=True)
-    items = items[:MAX_EVENTS]
-    _write(items)
-    return ev
+    ev = event_log.emit(payload.type, note=payload.note, city=payload.city, cd_mins=payload.cdMins)
+    return EventOut(**ev)
 
 @router.delete("", status_code=204)
 def clear_events():
-    _write([])
+    event_log.clear()
     return
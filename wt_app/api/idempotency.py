@@ -0,0 +1,114 @@
+# wt_app/api/idempotency.py
+"""
+Idempotency-Key support for money-moving endpoints.
+
+    @router.post("/buy")
+    def buy(payload: BuyIn, key: Optional[str] = Depends(idempotency_key)):
+        return idempotency.run("pins.buy", key, payload, lambda: _buy(payload))
+
+The first request with a key runs normally and its outcome (response, or a
+4xx error) is kept in a bounded TTL cache; a retry with the same key replays
+it without touching escrow, balances or the stores. Reusing a key for a
+different request is a 422; a retry while the first is still running is a 409.
+Requests without the header behave exactly as before.
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple, TypeVar
+
+from fastapi import Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+
+TTL_SEC = float(os.getenv("WT_IDEMPOTENCY_TTL_SEC", "86400") or 86400)
+MAX_KEYS = int(os.getenv("WT_IDEMPOTENCY_MAX_KEYS", "10000") or 10000)
+
+T = TypeVar("T")
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires", "done", "result", "error")
+
+    def __init__(self, fingerprint: str, expires: float):
+        self.fingerprint = fingerprint
+        self.expires = expires
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[Tuple[int, Any]] = None
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()   # oldest first
+
+
+def idempotency_key(
+    key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=255),
+) -> Optional[str]:
+    """FastAPI dependency: the request's Idempotency-Key header, if any."""
+    return key
+
+
+def _fingerprint(request: Any) -> str:
+    raw = json.dumps(jsonable_encoder(request), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _evict(now: float) -> None:
+    # constant TTL, so insertion order is expiry order
+    while _entries:
+        k, e = next(iter(_entries.items()))
+        if e.expires > now and len(_entries) <= MAX_KEYS:
+            break
+        if not e.done and e.expires > now:
+            break  # never drop an in-flight entry to make room
+        _entries.popitem(last=False)
+
+
+def run(scope: str, key: Optional[str], request: Any, fn: Callable[[], T]) -> T:
+    """
+    Run `fn` once per (scope, key). `request` is what identifies the call
+    (payload, path params) and must match on replay.
+    """
+    if not key:
+        return fn()
+    ck = (scope, key)
+    fp = _fingerprint(request)
+    now = time.monotonic()
+    with _lock:
+        _evict(now)
+        e = _entries.get(ck)
+        if e is not None:
+            if e.fingerprint != fp:
+                raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+            if not e.done:
+                raise HTTPException(status_code=409, detail="request with this Idempotency-Key is still in progress")
+            if e.error is not None:
+                raise HTTPException(status_code=e.error[0], detail=e.error[1])
+            return copy.deepcopy(e.result)
+        e = _entries[ck] = _Entry(fp, now + TTL_SEC)
+
+    try:
+        result = fn()
+    except HTTPException as exc:
+        with _lock:
+            if exc.status_code < 500:
+                # a 4xx is the answer to this request; replay it
+                e.error, e.done = (exc.status_code, exc.detail), True
+            else:
+                _entries.pop(ck, None)   # server-side failure: let the retry run
+        raise
+    except Exception:
+        with _lock:
+            _entries.pop(ck, None)
+        raise
+
+    with _lock:
+        # snapshot: handlers often return live store rows that change later
+        e.result, e.done = copy.deepcopy(result), True
+    return result
@@ -0,0 +1,251 @@
+# wt_app/api/market.py
+"""
+Order-book market for pins: standing bids / asks per building type and level.
+
+Bids hold their price in escrow (economy.escrow_hold) while they rest; a fill
+pays the seller the trade price less MARKET_FEE_PCT, refunds the rest of the
+bid's escrow to the buyer and moves the pin. See wt_app.core.market for the
+matching rules.
+"""
+from __future__ import annotations
+
+import os
+import time
+import uuid
+from typing import Dict, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+
+from wt_app.api import idempotency
+from wt_app.api.economy import escrow_hold, escrow_payout, escrow_refund
+from wt_app.api.idempotency import idempotency_key
+from wt_app.core import event_log, ledger, market, price_index, state_store
+
+router = APIRouter(prefix="/market", tags=["market"])
+
+MARKET_FEE_PCT = float(os.getenv("MARKET_FEE_PCT", "0.02") or 0.02)
+MIN_ORDER = int(os.getenv("MIN_ORDER_PRICE", "10") or 10)
+MAX_LEVEL = 5
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+# ---------- models ----------
+class OrderIn(BaseModel):
+    side: Literal["BID", "ASK"]
+    owner: str = Field(..., min_length=1)
+    price: int = Field(..., ge=1)
+    type: Optional[str] = None                 # required for bids; asks take it from the pin
+    level: Optional[int] = Field(None, ge=1, le=MAX_LEVEL)
+    pinId: Optional[str] = None                # required for asks
+
+
+class OrderOut(BaseModel):
+    id: str
+    side: str
+    owner: str
+    type: str
+    level: int
+    price: int
+    pinId: Optional[str] = None
+    status: str
+    createdAt: int
+    closedAt: Optional[int] = None
+
+
+class TradeOut(BaseModel):
+    t: int
+    type: str
+    level: int
+    price: int
+    pinId: Optional[str] = None
+    buyer: str
+    seller: str
+    bidId: str
+    askId: str
+
+
+class PlaceOut(BaseModel):
+    order: OrderOut
+    fills: List[TradeOut]
+
+
+class PriceLevelOut(BaseModel):
+    price: int
+    orders: int
+
+
+class BookOut(BaseModel):
+    type: str
+    level: int
+    bids: List[PriceLevelOut]
+    asks: List[PriceLevelOut]
+
+
+class WindowStatsOut(BaseModel):
+    count: int
+    min: Optional[int] = None
+    max: Optional[int] = None
+    p10: Optional[int] = None
+    p50: Optional[int] = None
+    p90: Optional[int] = None
+
+
+class LastTradeOut(BaseModel):
+    price: int
+    t: int
+
+
+class TypePricesOut(BaseModel):
+    last: LastTradeOut
+    windows: Dict[str, WindowStatsOut]
+
+
+# ---------- startup ----------
+def _bid_still_held(o: dict) -> bool:
+    # a crash between journalling a bid and holding / releasing its escrow
+    return o["side"] != "BID" or ledger.escrow_amount(o["id"]) >= int(o["price"])
+
+
+def load_orders() -> int:
+    """Replay the order journal; called from the lifespan after the ledger is open."""
+    return market.load(still_valid=_bid_still_held)
+
+
+# ---------- settlement ----------
+def _settle(bid: dict, ask: dict, price: int) -> None:
+    pin = state_store.get_pin(ask["pinId"])
+    if (
+        not pin
+        or (pin.get("owner") or "").strip().lower() != ask["owner"].lower()
+        or (pin.get("type") or "") != ask["type"]
+        or int(pin.get("level") or 1) != ask["level"]
+    ):
+        raise market.StaleOrder(ask, "pin changed")
+    if ledger.escrow_amount(bid["id"]) < bid["price"]:
+        raise market.StaleOrder(bid, "escrow missing")
+
+    net = escrow_payout(bid["id"], ask["owner"], fee_pct=MARKET_FEE_PCT, amount=price, refund_to=bid["owner"])
+    state_store.update_pin(ask["pinId"], owner=bid["owner"], lastTradeAt=_now_ms())
+    price_index.index.record(ask["type"], price)
+    event_log.emit(
+        "Market Trade",
+        f"{bid['owner']} bought pin {ask['pinId']} ({ask['type']} L{ask['level']}) "
+        f"from {ask['owner']} for £{price} (net to seller £{net})",
+    )
+
+
+def _release(dropped: List[dict]) -> None:
+    for o in dropped:
+        if o["side"] == "BID":
+            escrow_refund(o["id"], o["owner"])
+
+
+# ---------- endpoints ----------
+@router.post("/orders", response_model=PlaceOut)
+def place_order(payload: OrderIn, key: Optional[str] = Depends(idempotency_key)):
+    return idempotency.run("market.orders", key, payload, lambda: _place_order(payload))
+
+
+def _place_order(payload: OrderIn) -> PlaceOut:
+    owner = payload.owner.strip()
+    if payload.price < MIN_ORDER:
+        raise HTTPException(status_code=400, detail="price below minimum")
+
+    with state_store.lock:
+        if payload.side == "ASK":
+            if not payload.pinId:
+                raise HTTPException(status_code=400, detail="pinId is required for an ask")
+            pin = state_store.get_pin(payload.pinId)
+            if not pin:
+                raise HTTPException(status_code=404, detail="pin not found")
+            if (pin.get("owner") or "").strip().lower() != owner.lower():
+                raise HTTPException(status_code=403, detail="you do not own this pin")
+            type_, level = (pin.get("type") or ""), int(pin.get("level") or 1)
+            if not type_:
+                raise HTTPException(status_code=400, detail="pin has no building")
+            if (payload.type and payload.type != type_) or (payload.level and payload.level != level):
+                raise HTTPException(status_code=409, detail="pin type / level changed")
+            if market.book.ask_for_pin(payload.pinId):
+                raise HTTPException(status_code=409, detail="pin is already listed")
+        else:
+            if not payload.type or not payload.level:
+                raise HTTPException(status_code=400, detail="type and level are required for a bid")
+            if payload.type not in {t.get("key") for t in state_store.building_types()}:
+                raise HTTPException(status_code=400, detail="unknown building type")
+            type_, level = payload.type, payload.level
+
+        order = {
+            "id": uuid.uuid4().hex,
+            "side": payload.side,
+            "owner": owner,
+            "type": type_,
+            "level": level,
+            "price": int(payload.price),
+            "pinId": payload.pinId if payload.side == "ASK" else None,
+            "createdAt": _now_ms(),
+        }
+
+        market.record_open(order)
+        if order["side"] == "BID":
+            try:
+                escrow_hold(order["id"], buyer=owner, amount=order["price"])
+            except ValueError as e:
+                order["status"] = "REJECTED"
+                market.record_close(order)
+                raise HTTPException(status_code=400, detail=str(e))
+
+        with ledger.batch():
+            fills, dropped = market.book.submit(order, settle=_settle)
+            _release(dropped)
+
+        return PlaceOut(order=dict(order), fills=[f.to_dict() for f in fills])
+
+
+@router.post("/orders/{order_id}/cancel", response_model=OrderOut)
+def cancel_order(order_id: str):
+    with state_store.lock:
+        o = market.book.cancel(order_id)
+        if o is None:
+            raise HTTPException(status_code=404, detail="order not found or no longer open")
+        _release([o])
+        return dict(o)
+
+
+@router.get("/orders", response_model=List[OrderOut])
+def list_orders(owner: str = Query(...)):
+    with state_store.lock:
+        return [dict(o) for o in market.book.orders_for(owner)]
+
+
+@router.get("/book", response_model=BookOut)
+def order_book(type: str = Query(...), level: int = Query(1, ge=1, le=MAX_LEVEL), depth: int = Query(10, ge=1, le=100)):
+    with state_store.lock:
+        sides = market.book.depth(type, level, depth)
+    return BookOut(type=type, level=level, **sides)
+
+
+@router.get("/trades", response_model=List[TradeOut])
+def recent_trades(type: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    with state_store.lock:
+        fills = list(market.book.trades)
+    out = []
+    for f in reversed(fills):
+        if type is None or f.ask["type"] == type:
+            out.append(f.to_dict())
+            if len(out) == limit:
+                break
+    return out
+
+
+@router.get("/prices", response_model=Dict[str, TypePricesOut])
+def market_prices(type: Optional[str] = None):
+    """
+    Rolling trade prices per building type (accepted offers + market fills):
+    count / min / max / p10 / p50 / p90 over the last 1h, 24h and 7d, from the
+    in-memory sketches in wt_app.core.price_index (percentiles within ~1%).
+    """
+    return price_index.index.snapshot(type)
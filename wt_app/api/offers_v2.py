@@ -2,43 +2,29 @@
 from __future__ import annotations
 
 import os
-import json
+import asyncio
 import uuid
 import time
-from pathlib import Path
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 
+from wt_app.api import idempotency
 from wt_app.api.economy import (
-    DATA,              # shared data dir
     escrow_hold,
     escrow_refund,
     escrow_payout,
 )
+from wt_app.api.idempotency import idempotency_key
+from wt_app.core import event_log, ledger, market, offer_archive, price_index, state_store
+from wt_app.core.offer_book import book as offer_book, normalize_status as _normalize_status
+from wt_app.core.offer_book import normalize_expires_at as _normalize_expires_at
 
 router = APIRouter(prefix="/offers", tags=["offers"])
 
-OFFERS_FILE = DATA / "offers.json"
-PINS_FILE = DATA / "pins.json"
-EVENTS_FILE = DATA / "events.json"
-
-
-# ---------- basic fs helpers ----------
-def _read_json(path: Path, default):
-    if not path.exists():
-        return default
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return default
-
-
-def _write_json(path: Path, obj) -> None:
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
-
 
+# ---------- helpers ----------
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
@@ -48,158 +34,131 @@ FEE_PCT = float(os.getenv("OFFER_FEE_PCT", "0.02") or 0.02)
 EXP_HRS = int(os.getenv("OFFER_EXPIRY_HOURS", "24") or 24)
 MIN_OFFER = int(os.getenv("MIN_OFFER_AMOUNT", "10") or 10)
 LOCK_PIN_ON_PENDING = os.getenv("LOCK_PIN_ON_PENDING", "true").lower() == "true"
-
-VALID_STATUSES = {"PENDING", "ACCEPTED", "REJECTED", "CANCELED", "EXPIRED"}
-
-
-def _normalize_status(raw: Optional[str]) -> str:
-    """
-    Normalize legacy + mixed-case statuses to canonical:
-      PENDING, ACCEPTED, REJECTED, CANCELED, EXPIRED
-    """
-    if not raw:
-        return "PENDING"
-    up = str(raw).strip().upper()
-    if up == "CANCELLED":  # UK spelling
-        up = "CANCELED"
-    if up in VALID_STATUSES:
-        return up
-    # Unknown legacy → treat as PENDING so it can still flow
-    return "PENDING"
-
-
-def _normalize_expires_at(raw) -> int:
-    """
-    Handle both ms and sec legacy values.
-    """
-    if raw is None:
-        return 0
-    try:
-        v = int(raw)
-    except Exception:
-        return 0
-    # seconds vs ms heuristic
-    if 0 < v < 10_000_000_000:
-        return v * 1000
-    return v
-
+# upper bound on how long the expiry task sleeps when nothing is due sooner
+EXPIRY_POLL_SEC = float(os.getenv("OFFER_EXPIRY_POLL_SEC", "30") or 30)
 
 # ---------- domain helpers ----------
-def _load_offers() -> List[dict]:
+def _normalize_offer(o: dict) -> bool:
     """
-    Load offers and normalize legacy fields so v1 data works and matches OfferOut.
-    Ensures EVERY offer has:
+    Normalize legacy fields in place so v1 data works and matches OfferOut.
+    Ensures the offer has:
       - status in VALID_STATUSES
       - createdAt
       - expiresAt
       - history list
+    Returns True if anything changed.
     """
-    raw = _read_json(OFFERS_FILE, [])
-    if not isinstance(raw, list):
-        return []
-
-    changed = False
-    out: List[dict] = []
-
-    for o in raw:
-        if not isinstance(o, dict):
-            continue
-
-        # ---- status ----
-        old_status = o.get("status")
-        st = _normalize_status(old_status)
-        if st != old_status:
-            o["status"] = st
-            changed = True
-
-        # ---- createdAt ----
-        if "createdAt" not in o:
-            # try legacy t, else now
-            created = int(o.get("t") or _now_ms())
-            o["createdAt"] = created
-            changed = True
-        else:
-            created = int(o.get("createdAt") or 0)
-
-        # ---- expiresAt ----
-        exp_raw = o.get("expiresAt", None)
-        if exp_raw is None:
-            # legacy row without expiresAt:
-            # if still pending, give it a proper window; else 0 is fine
-            if st == "PENDING" and created:
-                exp = created + EXP_HRS * 3600 * 1000
-            else:
-                exp = 0
-            o["expiresAt"] = int(exp)
-            changed = True
+    dirty = False
+
+    # ---- status ----
+    old_status = o.get("status")
+    st = _normalize_status(old_status)
+    if st != old_status:
+        o["status"] = st
+        dirty = True
+
+    # ---- createdAt ----
+    if o.get("createdAt") is None:
+        # try legacy t, else now (rows imported into SQLite carry a null column)
+        created = int(o.get("t") or _now_ms())
+        o["createdAt"] = created
+        dirty = True
+    else:
+        created = int(o.get("createdAt") or 0)
+
+    # ---- expiresAt ----
+    exp_raw = o.get("expiresAt", None)
+    if exp_raw is None:
+        # legacy row without expiresAt:
+        # if still pending, give it a proper window; else 0 is fine
+        if st == "PENDING" and created:
+            exp = created + EXP_HRS * 3600 * 1000
         else:
-            exp_norm = _normalize_expires_at(exp_raw)
-            if exp_norm != exp_raw:
-                o["expiresAt"] = int(exp_norm)
-                changed = True
+            exp = 0
+        o["expiresAt"] = int(exp)
+        dirty = True
+    else:
+        exp_norm = _normalize_expires_at(exp_raw)
+        if exp_norm != exp_raw:
+            o["expiresAt"] = int(exp_norm)
+            dirty = True
 
-        # ---- history ----
-        if "history" not in o or not isinstance(o["history"], list):
-            o["history"] = []
-            changed = True
+    # ---- history ----
+    if "history" not in o or not isinstance(o["history"], list):
+        o["history"] = []
+        dirty = True
 
-        out.append(o)
+    return dirty
 
-    if changed:
-        _write_json(OFFERS_FILE, out)
 
-    return out
+def _offers_by_id(ids: List[str]) -> List[dict]:
+    """Live offer rows for index ids (already on the current schema, see migrate_offers)."""
+    return [o for o in map(state_store.get_offer, ids) if o is not None]
 
 
-def _save_offers(items: List[dict]) -> None:
-    _write_json(OFFERS_FILE, items)
+# ---------- price index ----------
+def seed_price_index() -> int:
+    """
+    Feed every recorded trade into the price index once at startup: ACCEPTED
+    offers (types from the accept entry, else the pin) and the market fills
+    journalled by wt_app/core/market.py -- the same trades recorded live.
+    Call after market_api.load_orders().
+    """
+    def trades():
+        for o in _offers_by_id(offer_book.ids_with_status("ACCEPTED")):
+            entry = next((h for h in reversed(o.get("history") or []) if h.get("a") == "ACCEPTED"), {})
+            type_ = entry.get("pinType") or (_get_pin(o.get("pinId")) or {}).get("type")
+            if type_:
+                yield type_, int(o.get("amount") or 0), int(entry.get("t") or o.get("createdAt") or 0)
+        for f in market.fills():
+            yield f["type"], int(f["price"]), int(f["t"])
 
+    return price_index.seed(trades())
 
-def _append_event(type_: str, note: str) -> None:
-    evs = _read_json(EVENTS_FILE, [])
-    if not isinstance(evs, list):
-        evs = []
-    evs.insert(
-        0,
-        {
-            "id": uuid.uuid4().hex,
-            "t": _now_ms(),
-            "type": type_,
-            "city": "Global",
-            "note": note,
-            "cdMins": 0,
-        },
-    )
-    _write_json(EVENTS_FILE, evs[:500])
 
+# ---------- schema migration ----------
+OFFERS_SCHEMA_VERSION = 1
 
-def _load_pins() -> List[dict]:
-    raw = _read_json(PINS_FILE, [])
-    return [p for p in raw if isinstance(p, dict)]
+
+async def migrate_offers() -> int:
+    """
+    Normalize legacy offer rows once (startup), then stamp the store so the
+    request path can trust status / createdAt / expiresAt / history.
+    Returns the number of rows rewritten.
+    """
+    if state_store.schema_version("offers") >= OFFERS_SCHEMA_VERSION:
+        return 0
+    changed = 0
+    with state_store.lock:
+        for o in state_store.offer_list():
+            fixed = dict(o)
+            if _normalize_offer(fixed):
+                # through the store so the offer book re-indexes (expiry heap etc.)
+                state_store.update_offer(o["id"], **fixed)
+                changed += 1
+    written = await state_store.flush_async()
+    if changed and "offers" not in written:
+        return changed  # not persisted; stays unstamped and reruns next start
+    state_store.set_schema_version("offers", OFFERS_SCHEMA_VERSION)
+    return changed
 
 
-def _save_pins(pins: List[dict]) -> None:
-    _write_json(PINS_FILE, pins)
+def _transition(o: dict, status: str, action: Optional[str] = None, **extra) -> dict:
+    """Move an offer to `status` and log it in its history; goes through the store so the offer book reindexes."""
+    entry = {"t": _now_ms(), "a": action or status, **extra}
+    return state_store.update_offer(o["id"], status=status, history=list(o.get("history") or []) + [entry])
+
+
+def _append_event(type_: str, note: str) -> None:
+    event_log.emit(type_, note=note)
 
 
 def _get_pin(pin_id: str) -> Optional[dict]:
-    for p in _load_pins():
-        if str(p.get("id")) == str(pin_id):
-            return p
-    return None
+    return state_store.get_pin(pin_id)
 
 
 def _set_pin_owner(pin_id: str, new_owner: str) -> None:
-    pins = _load_pins()
-    changed = False
-    for p in pins:
-        if str(p.get("id")) == str(pin_id):
-            p["owner"] = new_owner
-            p["lastTradeAt"] = _now_ms()
-            changed = True
-            break
-    if changed:
-        _save_pins(pins)
+    state_store.update_pin(pin_id, owner=new_owner, lastTradeAt=_now_ms())
 
 
 # ---------- models ----------
@@ -224,114 +183,176 @@ class OfferOut(BaseModel):
     history: List[dict] = Field(default_factory=list)
 
 
-# ---------- GC ----------
-def _gc_expire(items: List[dict]) -> int:
-    now = _now_ms()
-    changed = 0
-    for o in items:
-        st = _normalize_status(o.get("status"))
-        exp = _normalize_expires_at(o.get("expiresAt"))
-        if st == "PENDING" and exp and exp <= now:
-            o["status"] = "EXPIRED"
-            o.setdefault("history", []).append({"t": now, "a": "EXPIRED"})
-            try:
-                escrow_refund(o["id"], o["fromOwner"])
-            except Exception:
-                # swallow; log in real app
-                pass
-            _append_event(
-                "Offer Expired",
-                f"{o.get('fromOwner')} → {o.get('toOwner')} (pin {o.get('pinId')}) £{o.get('amount')}",
-            )
-            changed += 1
-    if changed:
-        _save_offers(items)
-    return changed
+class BatchActionIn(BaseModel):
+    offerId: str
+    action: Literal["accept", "reject", "cancel"]
+
+
+class BatchIn(BaseModel):
+    actions: List[BatchActionIn] = Field(..., min_length=1, max_length=500)
+
+
+class BatchResultOut(BaseModel):
+    offerId: str
+    action: str
+    ok: bool
+    error: Optional[str] = None
+    code: Optional[int] = None
+    offer: Optional[OfferOut] = None
+
+
+class BatchOut(BaseModel):
+    applied: int
+    failed: int
+    results: List[BatchResultOut]
+
+
+class OfferHistoryOut(BaseModel):
+    owner: str
+    next_before: Optional[str] = None   # "createdAt:id" cursor for the next page
+    items: List[OfferOut]
+
+
+# ---------- expiry ----------
+def _expire(o: dict) -> None:
+    _transition(o, "EXPIRED")
+    try:
+        escrow_refund(o["id"], o["fromOwner"])
+    except Exception:
+        # swallow; log in real app
+        pass
+    _append_event(
+        "Offer Expired",
+        f"{o.get('fromOwner')} → {o.get('toOwner')} (pin {o.get('pinId')}) £{o.get('amount')}",
+    )
+
+
+def expire_due(now: Optional[int] = None) -> int:
+    """Expire every pending offer whose expiresAt has passed (drains the offer book heap)."""
+    now = now or _now_ms()
+    expired = 0
+    for oid in offer_book.pop_due(now):
+        with state_store.lock:
+            o = state_store.get_offer(oid)
+            if o is None or _normalize_status(o.get("status")) != "PENDING":
+                continue
+            _expire(o)
+        expired += 1
+    return expired
+
+
+async def run_expiry() -> None:
+    """Background task: sleep until the next offer expires, then expire it. Started from the lifespan."""
+    while True:
+        nxt = offer_book.next_expiry()
+        delay = EXPIRY_POLL_SEC
+        if nxt is not None:
+            delay = min(delay, max(0.0, (nxt - _now_ms()) / 1000))
+        await asyncio.sleep(delay)
+        try:
+            await asyncio.to_thread(expire_due)
+        except Exception:
+            pass
+
+
+def _get_offer(offer_id: str) -> dict:
+    """Live offer for an action; one that is overdue but not yet drained is expired on the spot."""
+    o = state_store.get_offer(offer_id)
+    if o is None:
+        raise HTTPException(status_code=404, detail="offer not found")
+    exp = int(o.get("expiresAt") or 0)
+    if o["status"] == "PENDING" and exp and exp <= _now_ms():
+        _expire(o)
+    return o
 
 
 # ---------- list offers ----------
 @router.get("", response_model=List[OfferOut])
 def list_offers(owner: str = Query(...), status: Optional[str] = None):
-    owner_l = (owner or "").lower().strip()
-    items = _load_offers()
-    _gc_expire(items)
-
     status_filter = _normalize_status(status) if status else None
-    out: List[dict] = []
-
-    for o in items:
-        st = _normalize_status(o.get("status"))
-        if status_filter and st != status_filter:
-            continue
-        if (
-            str(o.get("fromOwner", "")).lower() == owner_l
-            or str(o.get("toOwner", "")).lower() == owner_l
-        ):
-            out.append({**o, "status": st})
-
-    return out
+    return _offers_by_id(offer_book.ids_for_owner(owner, status_filter))
+
+
+# ---------- history (hot + archived) ----------
+@router.get("/history", response_model=OfferHistoryOut)
+def offer_history(
+    owner: str = Query(..., min_length=1),
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[str] = Query(None, pattern=r"^\d+:.+$"),   # cursor from next_before
+):
+    """Every offer `owner` made or received, newest first; older months come from the archive."""
+    rows, nxt = offer_archive.history(
+        owner,
+        limit=limit,
+        before=offer_archive.parse_cursor(before),
+        status=_normalize_status(status) if status else None,
+    )
+    for o in rows:
+        _normalize_offer(o)  # copies; segments archived before the migration may hold legacy rows
+    return OfferHistoryOut(owner=owner, next_before=nxt, items=rows)
 
 
 # ---------- create offer (escrow) ----------
 @router.post("", response_model=OfferOut)
-def create_offer(payload: OfferIn):
-    pin = _get_pin(payload.pinId)
-    if not pin:
-        raise HTTPException(status_code=404, detail="pin not found")
-
-    seller = (payload.toOwner or "").strip()
-    buyer = (payload.fromOwner or "").strip()
-
-    if not seller or not buyer:
-        raise HTTPException(status_code=400, detail="missing participants")
-    if seller.lower() == buyer.lower():
-        raise HTTPException(status_code=400, detail="cannot offer to self")
-
-    if (pin.get("owner") or "").lower() != seller.lower():
-        raise HTTPException(status_code=409, detail="pin owner changed")
-
-    amount = int(payload.amount)
-    if amount < MIN_OFFER:
-        raise HTTPException(status_code=400, detail="amount below minimum")
-
-    # lock pin if another pending exists
-    if LOCK_PIN_ON_PENDING:
-        for o in _load_offers():
-            if (
-                str(o.get("pinId")) == payload.pinId
-                and _normalize_status(o.get("status")) == "PENDING"
-            ):
-                raise HTTPException(status_code=409, detail="pin has a pending offer")
-
-    offer_id = uuid.uuid4().hex
-
-    # move funds into escrow
-    try:
-        escrow_hold(offer_id, buyer=buyer, amount=amount)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception:
-        raise HTTPException(status_code=500, detail="escrow hold failed")
-
-    now = _now_ms()
-    exp = now + EXP_HRS * 3600 * 1000
-
-    offer = {
-        "id": offer_id,
-        "pinId": payload.pinId,
-        "fromOwner": buyer,
-        "toOwner": seller,
-        "amount": amount,
-        "status": "PENDING",
-        "createdAt": now,
-        "expiresAt": exp,
-        "note": payload.note or "",
-        "history": [{"t": now, "a": "CREATED"}],
-    }
-
-    items = _load_offers()
-    items.insert(0, offer)
-    _save_offers(items)
+def create_offer(payload: OfferIn, key: Optional[str] = Depends(idempotency_key)):
+    return idempotency.run("offers.create", key, payload, lambda: _create_offer(payload))
+
+
+def _create_offer(payload: OfferIn) -> dict:
+    # owner / pending-offer checks, escrow hold and put as one step: two creates
+    # on one pin can't both pass LOCK_PIN_ON_PENDING and both hold escrow
+    with state_store.lock:
+        pin = _get_pin(payload.pinId)
+        if not pin:
+            raise HTTPException(status_code=404, detail="pin not found")
+
+        seller = (payload.toOwner or "").strip()
+        buyer = (payload.fromOwner or "").strip()
+
+        if not seller or not buyer:
+            raise HTTPException(status_code=400, detail="missing participants")
+        if seller.lower() == buyer.lower():
+            raise HTTPException(status_code=400, detail="cannot offer to self")
+
+        if (pin.get("owner") or "").lower() != seller.lower():
+            raise HTTPException(status_code=409, detail="pin owner changed")
+
+        amount = int(payload.amount)
+        if amount < MIN_OFFER:
+            raise HTTPException(status_code=400, detail="amount below minimum")
+
+        # lock pin if another pending exists
+        if LOCK_PIN_ON_PENDING and offer_book.pending_for_pin(payload.pinId):
+            raise HTTPException(status_code=409, detail="pin has a pending offer")
+
+        offer_id = uuid.uuid4().hex
+
+        # move funds into escrow
+        try:
+            escrow_hold(offer_id, buyer=buyer, amount=amount)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception:
+            raise HTTPException(status_code=500, detail="escrow hold failed")
+
+        now = _now_ms()
+        exp = now + EXP_HRS * 3600 * 1000
+
+        offer = {
+            "id": offer_id,
+            "pinId": payload.pinId,
+            "fromOwner": buyer,
+            "toOwner": seller,
+            "amount": amount,
+            "status": "PENDING",
+            "createdAt": now,
+            "expiresAt": exp,
+            "note": payload.note or "",
+            "history": [{"t": now, "a": "CREATED"}],
+        }
+
+        state_store.put_offer(offer)
 
     _append_event(
         "Offer Created",
@@ -343,13 +364,14 @@ def create_offer(payload: OfferIn):
 
 # ---------- accept ----------
 @router.post("/{offer_id}/accept", response_model=OfferOut)
-def accept_offer(offer_id: str):
-    items = _load_offers()
-    _gc_expire(items)
+def accept_offer(offer_id: str, key: Optional[str] = Depends(idempotency_key)):
+    return idempotency.run("offers.accept", key, {"offerId": offer_id}, lambda: _accept_offer(offer_id))
 
-    for o in items:
-        if str(o.get("id")) != str(offer_id):
-            continue
+
+def _accept_offer(offer_id: str) -> dict:
+    # under the store lock: the expiry task may be settling this offer concurrently
+    with state_store.lock:
+        o = _get_offer(offer_id)
 
         st = _normalize_status(o.get("status"))
         if st != "PENDING":
@@ -365,11 +387,7 @@ def accept_offer(offer_id: str):
                 escrow_refund(o["id"], o["fromOwner"])
             except Exception:
                 pass
-            o["status"] = "REJECTED"
-            o.setdefault("history", []).append(
-                {"t": _now_ms(), "a": "AUTO_REJECT_PIN_MISSING"}
-            )
-            _save_offers(items)
+            _transition(o, "REJECTED", "AUTO_REJECT_PIN_MISSING")
             raise HTTPException(status_code=404, detail="pin not found")
 
         if (pin.get("owner") or "").lower() != o["toOwner"].lower():
@@ -378,11 +396,7 @@ def accept_offer(offer_id: str):
                 escrow_refund(o["id"], o["fromOwner"])
             except Exception:
                 pass
-            o["status"] = "REJECTED"
-            o.setdefault("history", []).append(
-                {"t": _now_ms(), "a": "AUTO_REJECT_OWNER_CHANGED"}
-            )
-            _save_offers(items)
+            _transition(o, "REJECTED", "AUTO_REJECT_OWNER_CHANGED")
             raise HTTPException(
                 status_code=409,
                 detail="pin owner changed; offer auto-rejected",
@@ -397,30 +411,25 @@ def accept_offer(offer_id: str):
             raise HTTPException(status_code=500, detail="escrow payout failed")
 
         _set_pin_owner(o["pinId"], o["fromOwner"])
-        o["status"] = "ACCEPTED"
-        o.setdefault("history", []).append(
-            {"t": _now_ms(), "a": "ACCEPTED", "net": net}
-        )
+        _transition(o, "ACCEPTED", net=net, pinType=pin.get("type"))
+        price_index.index.record(pin.get("type") or "", int(o["amount"]))
 
-        _save_offers(items)
         _append_event(
             "Trade Accepted",
             f"{o['fromOwner']} bought pin {o['pinId']} for £{o['amount']} (net to seller £{net})",
         )
         return o
 
-    raise HTTPException(status_code=404, detail="offer not found")
-
 
 # ---------- reject ----------
 @router.post("/{offer_id}/reject", response_model=OfferOut)
-def reject_offer(offer_id: str):
-    items = _load_offers()
-    _gc_expire(items)
+def reject_offer(offer_id: str, key: Optional[str] = Depends(idempotency_key)):
+    return idempotency.run("offers.reject", key, {"offerId": offer_id}, lambda: _reject_offer(offer_id))
+
 
-    for o in items:
-        if str(o.get("id")) != str(offer_id):
-            continue
+def _reject_offer(offer_id: str) -> dict:
+    with state_store.lock:
+        o = _get_offer(offer_id)
 
         st = _normalize_status(o.get("status"))
         if st != "PENDING":
@@ -434,28 +443,24 @@ def reject_offer(offer_id: str):
         except Exception:
             pass
 
-        o["status"] = "REJECTED"
-        o.setdefault("history", []).append({"t": _now_ms(), "a": "REJECTED"})
+        _transition(o, "REJECTED")
 
-        _save_offers(items)
         _append_event(
             "Offer Rejected",
             f"{o['toOwner']} rejected £{o['amount']} on pin {o['pinId']}",
         )
         return o
 
-    raise HTTPException(status_code=404, detail="offer not found")
-
 
 # ---------- cancel (buyer) ----------
 @router.post("/{offer_id}/cancel", response_model=OfferOut)
-def cancel_offer(offer_id: str):
-    items = _load_offers()
-    _gc_expire(items)
+def cancel_offer(offer_id: str, key: Optional[str] = Depends(idempotency_key)):
+    return idempotency.run("offers.cancel", key, {"offerId": offer_id}, lambda: _cancel_offer(offer_id))
+
 
-    for o in items:
-        if str(o.get("id")) != str(offer_id):
-            continue
+def _cancel_offer(offer_id: str) -> dict:
+    with state_store.lock:
+        o = _get_offer(offer_id)
 
         st = _normalize_status(o.get("status"))
         if st != "PENDING":
@@ -469,22 +474,40 @@ def cancel_offer(offer_id: str):
         except Exception:
             pass
 
-        o["status"] = "CANCELED"
-        o.setdefault("history", []).append({"t": _now_ms(), "a": "CANCELED"})
+        _transition(o, "CANCELED")
 
-        _save_offers(items)
         _append_event(
             "Offer Canceled",
             f"{o['fromOwner']} canceled £{o['amount']} on pin {o['pinId']}",
         )
         return o
 
-    raise HTTPException(status_code=404, detail="offer not found")
+
+# ---------- batch ----------
+@router.post("/batch", response_model=BatchOut)
+def batch_offers(payload: BatchIn):
+    """
+    Apply many accept / reject / cancel actions in order, with a result per item.
+    A failing item doesn't stop the rest. Ledger lines are written once for the
+    whole batch; pins, offers and events go out in the next background flush.
+    """
+    actions = {"accept": _accept_offer, "reject": _reject_offer, "cancel": _cancel_offer}
+    results: List[BatchResultOut] = []
+    with ledger.batch():
+        for item in payload.actions:
+            try:
+                o = actions[item.action](item.offerId)
+                results.append(BatchResultOut(offerId=item.offerId, action=item.action, ok=True, offer=o))
+            except HTTPException as e:
+                results.append(BatchResultOut(
+                    offerId=item.offerId, action=item.action, ok=False, error=str(e.detail), code=e.status_code,
+                ))
+    applied = sum(1 for r in results if r.ok)
+    return BatchOut(applied=applied, failed=len(results) - applied, results=results)
 
 
 # ---------- manual GC ----------
 @router.post("/gc")
 def gc_offers():
-    items = _load_offers()
-    expired = _gc_expire(items)
-    return {"expired": expired}
+    """Drain overdue offers now (the background expiry task does the same)."""
+    return {"expired": expire_due()}
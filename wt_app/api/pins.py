@@ -1,73 +1,52 @@
 # wt_app/api/pins.py
 from __future__ import annotations
 
-import json
+import math
 import time
 import uuid
-from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
 from pydantic import BaseModel, Field
 
+from wt_app.api import idempotency
 from wt_app.api.economy import get_balance, adjust_balance
+from wt_app.api.idempotency import idempotency_key
+from wt_app.core import state_store
+from wt_app.core.free_slots import free_slots
+from wt_app.core.pin_changes import changes as pin_changes
+from wt_app.core.pin_clusters import MAX_Z as CLUSTER_MAX_Z, clusters as pin_clusters
+from wt_app.core.pin_grid import grid as pin_grid
 
 router = APIRouter(prefix="/pins", tags=["pins"])
 
-DATA = Path("data")
-DATA.mkdir(exist_ok=True)
-
-PINS_FILE = DATA / "pins.json"
-STREETS_FILE = DATA / "streets.json"
-TYPES_FILE = DATA / "building_types.json"  # local ref to building types
-
 
 # ---------- helpers ----------
 
-def _read_json(path: Path, default):
-    if not path.exists():
-        return default
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return default
-
-
-def _write_json(path: Path, obj) -> None:
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
 
-def _load_pins() -> List[dict]:
-    raw = _read_json(PINS_FILE, [])
-    return [p for p in raw if isinstance(p, dict)]
-
-
-def _save_pins(pins: List[dict]) -> None:
-    _write_json(PINS_FILE, pins)
-
-
 def _load_types() -> List[dict]:
-    raw = _read_json(TYPES_FILE, [])
-    return [t for t in raw if isinstance(t, dict)]
+    return state_store.building_types()
 
 
-def _load_streets() -> List[dict]:
-    raw = _read_json(STREETS_FILE, [])
-    return [s for s in raw if isinstance(s, dict)]
+def _parse_bbox(raw: str) -> Tuple[float, float, float, float]:
+    """"minLat,minLng,maxLat,maxLng" -> floats; minLng > maxLng crosses the antimeridian."""
+    try:
+        min_lat, min_lng, max_lat, max_lng = (float(v) for v in raw.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be minLat,minLng,maxLat,maxLng")
+    if min_lat > max_lat or not all(math.isfinite(v) for v in (min_lat, min_lng, max_lat, max_lng)):
+        raise HTTPException(status_code=400, detail="invalid bbox")
+    return min_lat, min_lng, max_lat, max_lng
 
 
 def _get_street_for_pin(pin: dict) -> Optional[dict]:
     sid = pin.get("streetId")
     if not sid:
         return None
-    for s in _load_streets():
-        if str(s.get("id")) == str(sid):
-            return s
-    return None
+    return state_store.streets().get(str(sid))
 
 
 # ---------- models ----------
@@ -88,61 +67,150 @@ class Pin(PinIn):
     createdAt: int = Field(default_factory=_now_ms)
 
 
-class PinBuyIn(BaseModel):
-    pinId: str = Field(..., min_length=1)
-    buildingType: str = Field(..., min_length=1)
-    buyer: str = Field(..., min_length=1)
+class PinsDeltaOut(BaseModel):
+    version: int                # pass back as ?since= on the next sync
+    full: bool                  # True: `changed` is every pin; drop anything not in it
+    changed: List[Pin]
+    deleted: List[str] = Field(default_factory=list)
 
 
-# ---------- core fs ops ----------
+class ClusterOut(BaseModel):
+    z: int
+    x: int                      # web-mercator tile at zoom z + pin_clusters.SUBDIV
+    y: int
+    count: int
+    owned: int
+    ownedShare: float
+    dominantType: Optional[str] = None
+    lat: float                  # centroid of the cell's pins
+    lng: float
+
 
-def _read() -> List[Pin]:
-    raw = _read_json(PINS_FILE, [])
-    items: List[Pin] = []
-    for r in raw:
-        if not isinstance(r, dict):
-            continue
-        try:
-            items.append(Pin(**r))
-        except Exception:
-            # tolerate legacy / partial entries without killing everything
-            pass
-    return items
+class ClustersOut(BaseModel):
+    z: int
+    total: int                  # pins covered by the returned clusters
+    items: List[ClusterOut]
 
 
-def _write(items: List[Pin]) -> None:
-    _write_json(PINS_FILE, [p.model_dump() for p in items])
+class NearestFreeOut(BaseModel):
+    distanceM: float
+    pin: Pin
+
+
+class PinBuyIn(BaseModel):
+    pinId: str = Field(..., min_length=1)
+    buildingType: str = Field(..., min_length=1)
+    buyer: str = Field(..., min_length=1)
 
 
 # ---------- CRUD endpoints ----------
 
-@router.get("", response_model=List[Pin])
-def list_pins():
-    return _read()
+_NUM = (int, float)
+_OPT_STR = (str, type(None))
+
+
+def _has_coords(p: dict) -> bool:
+    """
+    Whether the row serializes as a Pin. Legacy / partial entries that don't
+    (lat null, level "3", ...) are skipped so one bad row can't fail the whole
+    response. Exact-type check first; anything else goes through the model.
+    """
+    lat, lng = p.get("lat"), p.get("lng")
+    if (
+        type(lat) in _NUM and type(lng) in _NUM
+        and math.isfinite(lat) and math.isfinite(lng)
+        and type(p.get("level", 1)) is int
+        and type(p.get("createdAt", 0)) is int
+        and type(p.get("id", "")) is str
+        and type(p.get("color", "")) is str
+        and type(p.get("type")) in _OPT_STR
+        and type(p.get("owner")) in _OPT_STR
+        and type(p.get("streetId")) in _OPT_STR
+        and type(p.get("streetName")) in _OPT_STR
+    ):
+        return True
+    try:
+        pin = Pin.model_validate(p)
+    except Exception:
+        return False
+    return math.isfinite(pin.lat) and math.isfinite(pin.lng)
+
+
+@router.get("", response_model=Union[List[Pin], PinsDeltaOut])
+def list_pins(
+    response: Response,
+    bbox: Optional[str] = Query(None, description="minLat,minLng,maxLat,maxLng"),
+    since: Optional[int] = Query(None, ge=0, description="pins version from X-Pins-Version / a previous delta"),
+):
+    if bbox is not None and since is not None:
+        raise HTTPException(status_code=400, detail="use either bbox or since")
+    if since is not None:
+        delta = pin_changes.changes_since(since)
+        if delta is None:
+            # too far behind the change log (or another process's version): resync
+            version, pins = state_store.pins_snapshot()
+            return PinsDeltaOut(version=version, full=True, changed=[p for p in pins if _has_coords(p)])
+        return PinsDeltaOut(
+            version=delta.version,
+            full=False,
+            changed=[p for p in delta.changed if _has_coords(p)],
+            deleted=delta.deleted,
+        )
+    if bbox is not None:
+        box = _parse_bbox(bbox)
+        # viewport query from the spatial grid: O(hits), not O(world); the
+        # version is read under the same lock so it matches the hits
+        with state_store.lock:
+            version = state_store.pins_version()
+            hits = pin_grid.within(*box)
+        response.headers["X-Pins-Version"] = str(version)
+        return [p for p in hits if _has_coords(p)]
+    version, pins = state_store.pins_snapshot()
+    response.headers["X-Pins-Version"] = str(version)
+    return [p for p in pins if _has_coords(p)]
+
+
+@router.get("/clusters", response_model=ClustersOut)
+def list_clusters(
+    z: int = Query(..., ge=0, le=22),
+    bbox: str = Query("-85,-180,85,180", description="minLat,minLng,maxLat,maxLng"),
+):
+    """Precomputed clusters for the zoomed-out map; zooms above the deepest cluster level get that level."""
+    z = min(z, CLUSTER_MAX_Z)
+    try:
+        items = pin_clusters.clusters(z, *_parse_bbox(bbox))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ClustersOut(z=z, total=sum(c["count"] for c in items), items=items)
+
+
+@router.get("/nearest-free", response_model=List[NearestFreeOut])
+def nearest_free(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100),
+):
+    """The k unowned pins closest to (lat, lng), nearest first (great-circle metres)."""
+    return [{"distanceM": round(d, 1), "pin": p} for p, d in free_slots.nearest(lat, lng, k)]
 
 
 @router.post("", response_model=Pin)
 def add_pin(payload: PinIn):
-    items = _read()
     pin = Pin(**payload.model_dump())
-    items.append(pin)
-    _write(items)
+    state_store.add_pins([pin.model_dump()])
     return pin
 
 
 @router.delete("", status_code=204)
 def clear_pins():
-    _write([])
+    state_store.clear_pins()
     return
 
 
 @router.delete("/{pin_id}", status_code=204)
 def delete_pin(pin_id: str):
-    items = _read()
-    new_items = [p for p in items if p.id != pin_id]
-    if len(new_items) == len(items):
+    if state_store.remove_pin(pin_id) is None:
         raise HTTPException(status_code=404, detail="Pin not found")
-    _write(new_items)
     return
 
 
@@ -158,99 +226,99 @@ def update_pin(pin_id: str, payload: dict = Body(...)):
     if not updates:
         raise HTTPException(status_code=400, detail="No valid fields to update")
 
-    items = _read()
-    for i, p in enumerate(items):
-        if p.id == pin_id:
-            data = p.model_dump()
-            data.update(updates)
-            items[i] = Pin(**data)
-            _write(items)
-            return items[i]
+    cur = state_store.get_pin(pin_id)
+    if cur is None:
+        raise HTTPException(status_code=404, detail="Pin not found")
 
-    raise HTTPException(status_code=404, detail="Pin not found")
+    # validate the merged row before touching the live store
+    pin = Pin(**{**cur, **updates})
+    state_store.update_pin(pin_id, **{k: getattr(pin, k) for k in updates})
+    return pin
 
 
 # ---------- Buy / Upgrade (uses /economy) ----------
 
 @router.post("/buy", response_model=Pin)
-def buy_or_upgrade_pin(payload: PinBuyIn):
-    items = _read()
-    pin: Optional[Pin] = next((p for p in items if p.id == payload.pinId), None)
-    if not pin:
-        raise HTTPException(status_code=404, detail="pin not found")
-
-    buyer = (payload.buyer or "").strip()
-    if not buyer:
-        raise HTTPException(status_code=400, detail="missing buyer")
-    buyer_l = buyer.lower()
-
-    owner = (pin.owner or "").strip()
-    owner_l = owner.lower() if owner else ""
-
-    # ---- enforce street ownership, if this pin belongs to a street ----
-    street = _get_street_for_pin(pin.model_dump())
-    if street:
-        street_owner = (street.get("owner") or "").strip().lower()
-
-        if street_owner:
-            # Street is owned → only street owner can buy/upgrade any slots on it
-            if street_owner != buyer_l:
-                raise HTTPException(
-                    status_code=403,
-                    detail="street owned by another player",
-                )
+def buy_or_upgrade_pin(payload: PinBuyIn, key: Optional[str] = Depends(idempotency_key)):
+    return idempotency.run("pins.buy", key, payload, lambda: _buy_or_upgrade_pin(payload))
+
+
+def _buy_or_upgrade_pin(payload: PinBuyIn) -> Pin:
+    # checks, charge and pin write as one step: concurrent buys of a pin queue here
+    with state_store.lock:
+        raw = state_store.get_pin(payload.pinId)
+        if not raw:
+            raise HTTPException(status_code=404, detail="pin not found")
+        pin = Pin(**raw)
+
+        buyer = (payload.buyer or "").strip()
+        if not buyer:
+            raise HTTPException(status_code=400, detail="missing buyer")
+        buyer_l = buyer.lower()
+
+        owner = (pin.owner or "").strip()
+        owner_l = owner.lower() if owner else ""
+
+        # ---- enforce street ownership, if this pin belongs to a street ----
+        street = _get_street_for_pin(pin.model_dump())
+        if street:
+            street_owner = (street.get("owner") or "").strip().lower()
+
+            if street_owner:
+                # Street is owned → only street owner can buy/upgrade any slots on it
+                if street_owner != buyer_l:
+                    raise HTTPException(
+                        status_code=403,
+                        detail="street owned by another player",
+                    )
+            else:
+                # If you want to FORCE claiming the street before any builds, uncomment:
+                # raise HTTPException(
+                #     status_code=400,
+                #     detail="street must be claimed before buying properties",
+                # )
+                # For now: unowned street behaves like global/unclaimed slots.
+                pass
+
+        # building type lookup
+        types = _load_types()
+        t = next((x for x in types if x.get("key") == payload.buildingType), None)
+        if not t:
+            raise HTTPException(status_code=400, detail="invalid building type")
+
+        base_price = int(t.get("basePrice") or t.get("price") or 100)
+
+        # --- BUY new slot ---
+        if not owner:
+            price = base_price
+            bal = get_balance(buyer)
+            if bal < price:
+                raise HTTPException(status_code=400, detail="insufficient funds")
+            adjust_balance(buyer, -price)
+            pin.owner = buyer
+            pin.type = payload.buildingType
+            pin.level = 1
+
+        # --- UPGRADE existing (must be owner) ---
+        elif owner_l == buyer_l:
+            cur_level = int(pin.level or 1)
+            if cur_level >= 5:
+                raise HTTPException(status_code=400, detail="max level reached")
+            new_level = cur_level + 1
+            price = base_price * new_level  # simple scaling
+
+            bal = get_balance(buyer)
+            if bal < price:
+                raise HTTPException(status_code=400, detail="insufficient funds")
+
+            adjust_balance(buyer, -price)
+            pin.level = new_level
+
+        # --- someone else owns it: use offers/trades ---
         else:
-            # If you want to FORCE claiming the street before any builds, uncomment:
-            # raise HTTPException(
-            #     status_code=400,
-            #     detail="street must be claimed before buying properties",
-            # )
-            # For now: unowned street behaves like global/unclaimed slots.
-            pass
-
-    # building type lookup
-    types = _load_types()
-    t = next((x for x in types if x.get("key") == payload.buildingType), None)
-    if not t:
-        raise HTTPException(status_code=400, detail="invalid building type")
-
-    base_price = int(t.get("basePrice") or t.get("price") or 100)
-
-    # --- BUY new slot ---
-    if not owner:
-        price = base_price
-        bal = get_balance(buyer)
-        if bal < price:
-            raise HTTPException(status_code=400, detail="insufficient funds")
-        adjust_balance(buyer, -price)
-        pin.owner = buyer
-        pin.type = payload.buildingType
-        pin.level = 1
-
-    # --- UPGRADE existing (must be owner) ---
-    elif owner_l == buyer_l:
-        cur_level = int(pin.level or 1)
-        if cur_level >= 5:
-            raise HTTPException(status_code=400, detail="max level reached")
-        new_level = cur_level + 1
-        price = base_price * new_level  # simple scaling
-
-        bal = get_balance(buyer)
-        if bal < price:
-            raise HTTPException(status_code=400, detail="insufficient funds")
-
-        adjust_balance(buyer, -price)
-        pin.level = new_level
-
-    # --- someone else owns it: use offers/trades ---
-    else:
-        raise HTTPException(status_code=403, detail="not your property")
-
-    # persist updated pin
-    for i, p in enumerate(items):
-        if p.id == pin.id:
-            items[i] = pin
-            break
-    _write(items)
+            raise HTTPException(status_code=403, detail="not your property")
 
-    return pin
+        # persist updated pin (other stored fields such as lastTradeAt are kept)
+        state_store.update_pin(pin.id, owner=pin.owner, type=pin.type, level=pin.level)
+
+        return pin
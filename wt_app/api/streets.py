@@ -1,59 +1,24 @@
 from __future__ import annotations
 
-import json
 import time
 import uuid
-from pathlib import Path
 from typing import List, Optional
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
-from wt_app.api.economy import get_balance, adjust_balance, DATA
+from wt_app.api.economy import get_balance, adjust_balance
+from wt_app.core import state_store
 
 router = APIRouter(prefix="/streets", tags=["streets"])
 
-STREETS_FILE = DATA / "streets.json"
-PINS_FILE = DATA / "pins.json"
-
 
 # ---------- helpers ----------
 
-def _read_json(path: Path, default):
-    if not path.exists():
-        return default
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return default
-
-
-def _write_json(path: Path, obj) -> None:
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
 
-def _load_streets() -> List[dict]:
-    raw = _read_json(STREETS_FILE, [])
-    return [s for s in raw if isinstance(s, dict)]
-
-
-def _save_streets(items: List[dict]) -> None:
-    _write_json(STREETS_FILE, items)
-
-
-def _load_pins() -> List[dict]:
-    raw = _read_json(PINS_FILE, [])
-    return [p for p in raw if isinstance(p, dict)]
-
-
-def _save_pins(items: List[dict]) -> None:
-    _write_json(PINS_FILE, items)
-
-
 # ---------- models ----------
 
 class Street(BaseModel):
@@ -161,37 +126,32 @@ def _generate_slots(street: dict) -> List[dict]:
 
 @router.get("", response_model=List[StreetOut])
 def list_streets():
-    return _load_streets()
+    return list(state_store.streets().values())
 
 
 @router.post("/claim", response_model=StreetOut)
 def claim_street(payload: StreetClaimIn):
-    streets = _load_streets()
-    street = next((s for s in streets if s.get("id") == payload.streetId), None)
-    if not street:
-        raise HTTPException(status_code=404, detail="street not found")
-
-    buyer = (payload.buyer or "").strip()
-    if not buyer:
-        raise HTTPException(status_code=400, detail="missing buyer")
-
-    if street.get("owner"):
-        raise HTTPException(status_code=409, detail="street already owned")
-
-    price = int(street.get("price") or 0)
-    if price > 0:
-        bal = get_balance(buyer)
-        if bal < price:
-            raise HTTPException(status_code=400, detail="insufficient funds")
-        adjust_balance(buyer, -price)
-
-    street["owner"] = buyer
-
-    pins = _load_pins()
-    new_slots = _generate_slots(street)
-    pins.extend(new_slots)
-    _save_pins(pins)
-
-    _save_streets(streets)
-
-    return StreetOut(**street)
+    # checks, charge and claim as one step: concurrent claims of a street queue here
+    with state_store.lock:
+        street = state_store.streets().get(payload.streetId)
+        if not street:
+            raise HTTPException(status_code=404, detail="street not found")
+
+        buyer = (payload.buyer or "").strip()
+        if not buyer:
+            raise HTTPException(status_code=400, detail="missing buyer")
+
+        if street.get("owner"):
+            raise HTTPException(status_code=409, detail="street already owned")
+
+        price = int(street.get("price") or 0)
+        if price > 0:
+            bal = get_balance(buyer)
+            if bal < price:
+                raise HTTPException(status_code=400, detail="insufficient funds")
+            adjust_balance(buyer, -price)
+
+        street = state_store.update_street(payload.streetId, owner=buyer)
+        state_store.add_pins(_generate_slots(street))
+
+        return StreetOut(**street)
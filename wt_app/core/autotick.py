@@ -1,57 +1,29 @@
 # wt_app/core/autotick.py
-import asyncio, json, os, time
-from pathlib import Path
+import asyncio, os, time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 import asyncio
 
+from wt_app.core import settings_store, state_store
 
-DATA = Path("data"); DATA.mkdir(exist_ok=True)
-LOCKS = DATA / "locks"; LOCKS.mkdir(exist_ok=True)
-ECO_FILE = DATA / "economy.json"
-LOCK_FILE = LOCKS / "economy.lock"
 
-def _read_json(path: Path, default):
-    if not path.exists(): return default
-    try: return json.loads(path.read_text(encoding="utf-8"))
-    except Exception: return default
-
-def _write_json(path: Path, obj) -> None:
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+# ticks are synchronous (store lock + ledger append); run them on one dedicated
+# thread so the event loop keeps serving requests and ticks never overlap
+_TICK_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wt-tick")
 
 def _now_ms() -> int: return int(time.time() * 1000)
 
+# a tick that fails (no pins yet, a manual tick in progress) is retried after this
+RETRY_SEC = float(os.getenv("WT_AUTO_TICK_RETRY_SEC", "30") or 30)
+
 def get_interval_seconds() -> int:
-    # env override, default 5 minutes
-    return int(float(os.getenv("WT_AUTO_TICK_MIN", "5")) * 60)
+    # admin autoTickMin (signed settings), else WT_AUTO_TICK_MIN, default 5 minutes
+    return settings_store.auto_tick_seconds()
 
 def _economy_last_tick_ms() -> int:
-    eco = _read_json(ECO_FILE, {})
+    eco = state_store.economy()
     return int(eco.get("lastTick") or 0)
 
-def _lock_is_stale(max_age_sec: int) -> bool:
-    if not LOCK_FILE.exists(): return True
-    try:
-        age = time.time() - LOCK_FILE.stat().st_mtime
-        return age > max_age_sec
-    except Exception:
-        return True
-
-def _acquire_lock() -> bool:
-    # naive file lock for single host dev; fine for our stage
-    try:
-        if not _lock_is_stale(600):  # 10 min stale threshold
-            return False
-        LOCK_FILE.write_text(str(time.time()), encoding="utf-8")
-        return True
-    except Exception:
-        return False
-
-def _release_lock() -> None:
-    try:
-        if LOCK_FILE.exists(): LOCK_FILE.unlink(missing_ok=True)
-    except Exception:
-        pass
-
 async def _run_tick(client_post) -> Optional[dict]:
     try:
         res = client_post()
@@ -61,30 +33,54 @@ async def _run_tick(client_post) -> Optional[dict]:
     except Exception:
         return None
 
+def _seconds_until_due() -> float:
+    last = _economy_last_tick_ms()
+    if last == 0:
+        return 0.0
+    return max(0.0, (last + get_interval_seconds() * 1000 - _now_ms()) / 1000)
+
+async def _sleep(wakeup: asyncio.Event, seconds: float) -> None:
+    """Sleep until the deadline or until settings change, whichever is first."""
+    # the caller has just computed the deadline, so earlier changes are in it;
+    # clearing first means a change during the wait is never dropped
+    wakeup.clear()
+    try:
+        await asyncio.wait_for(wakeup.wait(), timeout=seconds)
+    except asyncio.TimeoutError:
+        pass
+
 async def start_auto_tick(app):
     """
-    Background loop: every WT_AUTO_TICK_MIN minutes, if enough time
-    passed since economy.lastTick, call /economy/tick.
+    Background scheduler: sleeps until economy.lastTick + interval, then ticks.
+    The deadline is recomputed on every wake, so manual ticks push it back and
+    a new autoTickMin (settings write -> listener) takes effect immediately.
     """
     await asyncio.sleep(2)  # small delay to let startup settle
 
-    from wt_app.api.economy import tick as economy_tick
+    from wt_app.api.economy import next_epoch, scheduled_tick
+
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+
+    def on_settings(_settings: dict) -> None:
+        # write_atomic runs on a request worker thread
+        loop.call_soon_threadsafe(wakeup.set)
 
     async def post_tick():
-        return economy_tick()
-
-    while True:
-        try:
-            interval = get_interval_seconds()
-            now = _now_ms()
-            last = _economy_last_tick_ms()
-            if last == 0 or (now - last) >= interval * 1000:
-                if _acquire_lock():
-                    try:
-                        await _run_tick(post_tick)
-                    finally:
-                        _release_lock()
-        except Exception:
-            _release_lock()
-        await asyncio.sleep(5)
+        # pinning the epoch makes a retried / overlapping tick a no-op
+        return await loop.run_in_executor(_TICK_EXECUTOR, scheduled_tick, next_epoch())
 
+    settings_store.add_listener(on_settings)
+    try:
+        while True:
+            delay = _seconds_until_due()
+            if delay > 0:
+                await _sleep(wakeup, delay)
+                continue
+            # a manual tick running right now makes this one 409; it is retried below
+            before = _economy_last_tick_ms()
+            await _run_tick(post_tick)
+            if _economy_last_tick_ms() == before:
+                await _sleep(wakeup, RETRY_SEC)
+    finally:
+        settings_store.remove_listener(on_settings)
@@ -39,6 +39,12 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("env", "ENV"),
     )
 
+    # where pins/streets/offers persist: "sqlite" (tables in sqlite_url) or "json" (data/*.json)
+    state_backend: str = Field(
+        default="sqlite",
+        validation_alias=AliasChoices("wt_state_backend", "WT_STATE_BACKEND"),
+    )
+
     # Derived/normalized
     admin_emails: Set[str] = set()
 
@@ -0,0 +1,311 @@
+# wt_app/core/event_log.py
+"""
+Activity feed storage (GET /events, offer / trade notices).
+
+The newest RETENTION events live in an in-memory ring, oldest first. emit()
+appends to the ring and to a write buffer; run_flusher() appends the buffer
+to data/events/events-<n>.jsonl. A segment is closed after RETENTION lines
+and only the current and previous segments are kept, which always covers the
+ring. On first start the legacy data/events.json is imported once.
+
+Every event gets a sequence number. Secondary indexes (type -> seqs,
+city -> seqs, and the non-decreasing `t` column) are appended to as events
+arrive, so query() bisects to its window instead of scanning the ring.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from wt_app.core import store_codec
+from wt_app.core.state_store import DATA
+
+EVENTS_DIR = DATA / "events"
+LEGACY_FILE = DATA / "events.json"
+
+RETENTION = int(os.getenv("WT_EVENTS_RETENTION", "500") or 500)
+FLUSH_SEC = float(os.getenv("WT_EVENTS_FLUSH_SEC", "1.0") or 1.0)
+
+_lock = threading.Lock()        # ring + indexes + buffer
+_io_lock = threading.Lock()     # segment files
+
+# ring: _buf[i] holds seq _base + i; seqs below _head are evicted and trimmed lazily
+_buf: List[dict] = []
+_times: List[int] = []          # _buf[i]["t"], kept non-decreasing for bisect
+_base = 0
+_head = 0
+_next_seq = 0
+_by_type: Dict[str, List[int]] = {}
+_by_city: Dict[str, List[int]] = {}
+
+_pending: List[dict] = []
+_segment_no = 0
+_segment_lines = 0
+_loaded = False
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _segment(n: int) -> Path:
+    return EVENTS_DIR / f"events-{n:08d}.jsonl"
+
+
+def _segment_numbers() -> List[int]:
+    if not EVENTS_DIR.exists():
+        return []
+    return sorted(int(p.stem.split("-")[1]) for p in EVENTS_DIR.glob("events-*.jsonl"))
+
+
+def _read_segment(path: Path) -> List[dict]:
+    # stops at a torn tail from a crash mid-append
+    return store_codec.loads_lines(path.read_bytes(), "events")
+
+
+def _cut_torn_tail(path: Path) -> None:
+    """
+    Truncate the segment after its last whole line. flush() appends to it, and
+    anything written behind a torn line would be dropped by the next load.
+    """
+    raw = path.read_bytes()
+    good = 0
+    for line in raw.splitlines(keepends=True):
+        if line.strip():
+            try:
+                store_codec.loads(line)
+            except ValueError:
+                break
+        good += len(line)
+    with path.open("r+b") as f:
+        if good < len(raw):
+            f.truncate(good)
+        elif raw and not raw.endswith(b"\n"):
+            f.seek(0, 2)
+            f.write(b"\n")     # last event was written whole but its newline wasn't
+
+
+# ---------- ring + indexes (call with _lock held) ----------
+def _reset_ring() -> None:
+    global _base, _head, _next_seq
+    _buf.clear()
+    _times.clear()
+    _by_type.clear()
+    _by_city.clear()
+    _base = _head = _next_seq = 0
+
+
+def _push(ev: dict) -> None:
+    global _next_seq, _head
+    t = int(ev.get("t") or 0)
+    if _times and t < _times[-1]:
+        t = _times[-1]  # clock went backwards / legacy disorder: keep the column sorted
+    seq = _next_seq
+    _next_seq += 1
+    _buf.append(ev)
+    _times.append(t)
+    _by_type.setdefault(str(ev.get("type") or ""), []).append(seq)
+    _by_city.setdefault(str(ev.get("city") or ""), []).append(seq)
+    if _next_seq - _head > RETENTION:
+        _head = _next_seq - RETENTION
+        if _head - _base >= RETENTION:
+            _compact()
+
+
+def _compact() -> None:
+    global _base
+    drop = _head - _base
+    del _buf[:drop]
+    del _times[:drop]
+    _base = _head
+    for index in (_by_type, _by_city):
+        for key in list(index):
+            seqs = index[key]
+            del seqs[:bisect.bisect_left(seqs, _head)]
+            if not seqs:
+                del index[key]
+
+
+def _size() -> int:
+    return _next_seq - _head
+
+
+# ---------- load ----------
+def load() -> None:
+    """Fill the ring from the segments (or the legacy events.json). Called from the lifespan."""
+    global _segment_no, _segment_lines, _loaded
+    with _io_lock, _lock:
+        EVENTS_DIR.mkdir(parents=True, exist_ok=True)
+        _reset_ring()
+        _pending.clear()
+        numbers = _segment_numbers()
+        if numbers:
+            _cut_torn_tail(_segment(numbers[-1]))
+            rows: List[dict] = []
+            for n in numbers[-2:]:
+                rows = _read_segment(_segment(n))
+                for r in rows:
+                    _push(r)
+            _segment_no, _segment_lines = numbers[-1], len(rows)
+        else:
+            _segment_no, _segment_lines = 1, 0
+            _import_legacy()
+        _loaded = True
+
+
+def _import_legacy() -> None:
+    try:
+        raw = store_codec.loads(LEGACY_FILE.read_bytes(), "events") if LEGACY_FILE.exists() else []
+    except Exception:
+        raw = []
+    rows = [r for r in raw if isinstance(r, dict)] if isinstance(raw, list) else []
+    rows.sort(key=lambda r: int(r.get("t") or 0))
+    rows = rows[-RETENTION:]
+    for r in rows:
+        _push(r)
+    _pending.extend(rows)
+
+
+def _ensure_loaded() -> None:
+    if not _loaded:
+        load()
+
+
+# ---------- write ----------
+def emit(type_: str, note: Optional[str] = None, city: str = "Global", cd_mins: int = 0, **extra) -> dict:
+    """Record one event; visible to readers immediately, on disk after the next flush."""
+    _ensure_loaded()
+    ev = {
+        "id": uuid.uuid4().hex,
+        "t": _now_ms(),
+        "type": type_,
+        "city": city,
+        "note": note,
+        "cdMins": cd_mins,
+        **extra,
+    }
+    with _lock:
+        _push(ev)
+        _pending.append(ev)
+    return ev
+
+
+def flush() -> int:
+    """Append buffered events to the current segment. Returns how many were written."""
+    global _segment_no, _segment_lines
+    _ensure_loaded()
+    with _io_lock:
+        with _lock:
+            batch = list(_pending)
+            _pending.clear()
+        written = 0
+        while written < len(batch):
+            room = max(1, RETENTION - _segment_lines)
+            chunk = batch[written:written + room]
+            with _segment(_segment_no).open("ab") as f:
+                f.write(b"".join(store_codec.dumps_line(e) for e in chunk))
+            written += len(chunk)
+            _segment_lines += len(chunk)
+            if _segment_lines >= RETENTION:
+                _segment_no += 1
+                _segment_lines = 0
+                for n in _segment_numbers():
+                    if n < _segment_no - 1:
+                        _segment(n).unlink(missing_ok=True)
+        return written
+
+
+def clear() -> None:
+    """Drop every event, in memory and on disk."""
+    global _segment_no, _segment_lines
+    _ensure_loaded()
+    with _io_lock, _lock:
+        _reset_ring()
+        _pending.clear()
+        for n in _segment_numbers():
+            _segment(n).unlink(missing_ok=True)
+        _segment_no += 1
+        _segment_lines = 0
+
+
+async def run_flusher() -> None:
+    """Background loop; cancelled from the lifespan (which then calls flush() once more)."""
+    while True:
+        await asyncio.sleep(FLUSH_SEC)
+        if _pending:
+            await asyncio.to_thread(flush)
+
+
+# ---------- read ----------
+def page(offset: int = 0, limit: int = 50) -> Tuple[int, List[dict]]:
+    """(total, events newest first) straight from the ring."""
+    _ensure_loaded()
+    with _lock:
+        total = _size()
+        hi = _next_seq - offset          # exclusive
+        lo = max(_head, hi - limit)
+        items = [_buf[q - _base] for q in range(hi - 1, lo - 1, -1)]
+    return total, items
+
+
+def query(
+    type_: Optional[str] = None,
+    city: Optional[str] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    before: Optional[int] = None,
+    limit: int = 50,
+) -> Tuple[int, List[dict], Optional[int]]:
+    """
+    Events matching every given filter, newest first. `since` / `until` are ms
+    (inclusive / exclusive); `before` is a seq cursor.
+
+    Returns (matches, page, next cursor or None). `matches` counts the rows in
+    the window of the narrowest index used, so it is exact unless both type
+    and city are given (then it is an upper bound).
+    """
+    _ensure_loaded()
+    with _lock:
+        # window of seqs allowed by the time bounds + cursor: [lo, hi)
+        lo = _base + bisect.bisect_left(_times, since) if since is not None else _base
+        hi = _base + bisect.bisect_left(_times, until) if until is not None else _next_seq
+        lo = max(lo, _head)
+        if before is not None:
+            hi = min(hi, before)
+
+        keyed = []
+        if type_ is not None:
+            keyed.append(("type", type_, _by_type.get(type_, [])))
+        if city is not None:
+            keyed.append(("city", city, _by_city.get(city, [])))
+
+        if keyed:
+            # walk the narrower index inside the window; check the other field per row
+            spans = [(f, v, seqs, bisect.bisect_left(seqs, lo), bisect.bisect_left(seqs, hi)) for f, v, seqs in keyed]
+            spans.sort(key=lambda x: x[4] - x[3])
+            _, _, seqs, a, b = spans[0]
+            others = [(f, v) for f, v, *_ in spans[1:]]
+            candidates = (seqs[i] for i in range(b - 1, a - 1, -1))
+            matches = b - a
+        else:
+            others = []
+            candidates = iter(range(hi - 1, lo - 1, -1))
+            matches = max(0, hi - lo)
+
+        out: List[dict] = []
+        last = None
+        for q in candidates:
+            ev = _buf[q - _base]
+            if any(str(ev.get(f) or "") != v for f, v in others):
+                continue
+            if len(out) == limit:
+                return matches, out, last
+            out.append(ev)
+            last = q
+        return matches, out, None
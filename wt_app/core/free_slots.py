@@ -0,0 +1,230 @@
+# wt_app/core/free_slots.py
+"""
+k-nearest unowned pins (GET /pins/nearest-free).
+
+Free pins live in a static k-d tree over unit-sphere (x, y, z) points, so
+straight-line distance orders pins like great-circle distance and the
+antimeridian / poles need no special cases. The tree is kept current without
+rebuilding it on every change:
+
+    - a pin that becomes free (or moves) goes into a small `added` buffer
+      that queries scan directly;
+    - a tree entry whose pin was bought, deleted or moved is skipped at query
+      time (its point is no longer the pin's current point);
+    - once buffer + dead entries pass REBUILD_FRACTION of the tree, a worker
+      thread rebuilds the tree from a snapshot and swaps it in, replaying the
+      ids that changed meanwhile.
+
+Registered as a state_store pin listener, so buys through shop, pins_market,
+pins.buy, offers and the market drop a pin, and clearing an owner re-adds it.
+The tree build uses NumPy when installed (argpartition per node) and falls
+back to sorting.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from wt_app.core import state_store
+from wt_app.core.pin_grid import coords
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+LEAF = 16
+REBUILD_MIN = int(os.getenv("WT_FREE_SLOTS_REBUILD_MIN", "1024") or 1024)
+REBUILD_FRACTION = float(os.getenv("WT_FREE_SLOTS_REBUILD_FRACTION", "0.05") or 0.05)
+EARTH_RADIUS_M = 6_371_008.8
+
+Point = Tuple[float, float, float]
+
+
+def to_point(lat: float, lng: float) -> Point:
+    la, ln = math.radians(lat), math.radians(lng)
+    c = math.cos(la)
+    return (c * math.cos(ln), c * math.sin(ln), math.sin(la))
+
+
+def chord_to_m(d2: float) -> float:
+    """Squared chord length on the unit sphere -> great-circle metres."""
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(d2) / 2))
+
+
+def _is_free(p: Optional[dict]) -> bool:
+    return bool(p) and not (p.get("owner") or "").strip()
+
+
+def _build_order(pts: List[Point]) -> List[int]:
+    """Permutation that lays `pts` out as an implicit k-d tree (median of each range at its middle)."""
+    n = len(pts)
+    stack = [(0, n, 0)]
+    if np is not None:
+        arr = np.asarray(pts, dtype=np.float64).reshape(-1, 3)
+        idx = np.arange(n)
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= LEAF:
+                continue
+            mid = (lo + hi) // 2
+            sub = idx[lo:hi]
+            idx[lo:hi] = sub[np.argpartition(arr[sub, depth % 3], mid - lo)]
+            stack += ((lo, mid, depth + 1), (mid + 1, hi, depth + 1))
+        return idx.tolist()
+    order = list(range(n))
+    while stack:
+        lo, hi, depth = stack.pop()
+        if hi - lo <= LEAF:
+            continue
+        axis = depth % 3
+        order[lo:hi] = sorted(order[lo:hi], key=lambda i: pts[i][axis])
+        mid = (lo + hi) // 2
+        stack += ((lo, mid, depth + 1), (mid + 1, hi, depth + 1))
+    return order
+
+
+class KDTree:
+    """Static k-d tree over {id: point}; `points` is kept to tell live entries from dead ones."""
+
+    def __init__(self, points: Dict[str, Point]):
+        self.points = points
+        ids = list(points)
+        pts = list(points.values())
+        order = _build_order(pts)
+        self.ids = [ids[i] for i in order]
+        self.pts = [pts[i] for i in order]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def nearest(self, q: Point, k: int, live: Callable[[str, Point], bool], heap: List[Tuple[float, str]]) -> None:
+        """Push the k nearest live entries into `heap` (a max-heap of (-d2, id) capped at k)."""
+        ids, pts = self.ids, self.pts
+        qx, qy, qz = q
+
+        def visit(i: int) -> None:
+            p = pts[i]
+            if not live(ids[i], p):
+                return
+            d2 = (p[0] - qx) ** 2 + (p[1] - qy) ** 2 + (p[2] - qz) ** 2
+            if len(heap) < k:
+                heapq.heappush(heap, (-d2, ids[i]))
+            elif d2 < -heap[0][0]:
+                heapq.heapreplace(heap, (-d2, ids[i]))
+
+        def search(lo: int, hi: int, depth: int) -> None:
+            if hi - lo <= LEAF:
+                for i in range(lo, hi):
+                    visit(i)
+                return
+            mid = (lo + hi) // 2
+            axis = depth % 3
+            diff = q[axis] - pts[mid][axis]
+            visit(mid)
+            if diff < 0:
+                search(lo, mid, depth + 1)
+                far = (mid + 1, hi)
+            else:
+                search(mid + 1, hi, depth + 1)
+                far = (lo, mid)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                search(far[0], far[1], depth + 1)
+
+        search(0, len(ids), 0)
+
+
+class FreeSlots:
+    def __init__(self) -> None:
+        self._free: Dict[str, Point] = {}             # every free pin -> current point
+        self._tree: KDTree = KDTree({})
+        self._added: Dict[str, None] = {}             # free pins not (correctly) in the tree
+        self._dead = 0                                # tree entries no longer live
+        self._changed: Optional[set] = None           # ids touched while a rebuild runs
+        self._gen = 0                                 # bumped by pins_reset; stale rebuilds are dropped
+
+    def _live(self, pin_id: str, p: Point) -> bool:
+        return self._free.get(pin_id) is p
+
+    def _set(self, pin_id: str, pt: Optional[Point]) -> None:
+        old = self._free.get(pin_id)
+        if old == pt:
+            return
+        if old is not None and self._tree.points.get(pin_id) is old:
+            self._dead += 1
+        self._added.pop(pin_id, None)
+        if pt is None:
+            self._free.pop(pin_id, None)
+        else:
+            self._free[pin_id] = pt
+            self._added[pin_id] = None
+        if self._changed is not None:
+            self._changed.add(pin_id)
+        elif len(self._added) + self._dead > max(REBUILD_MIN, REBUILD_FRACTION * len(self._tree)):
+            self._changed = set()
+            threading.Thread(target=self._rebuild, name="wt-free-slots", daemon=True).start()
+
+    def _rebuild(self) -> None:
+        with state_store.lock:
+            snapshot = dict(self._free)
+            gen = self._gen
+        tree = KDTree(snapshot)      # the slow part, outside the lock
+        with state_store.lock:
+            changed, self._changed = self._changed or set(), None
+            if gen != self._gen:
+                return
+            self._tree = tree
+            self._added = {i: None for i in changed if i in self._free and snapshot.get(i) is not self._free[i]}
+            self._dead = sum(1 for i in changed if i in snapshot and self._free.get(i) is not snapshot[i])
+
+    # ---- state_store.PinListener ----
+    def pin_changed(self, before: Optional[dict], after: Optional[dict]) -> None:
+        pin = after if after is not None else before
+        if not pin or not pin.get("id"):
+            return
+        ll = coords(after) if _is_free(after) else None
+        self._set(str(pin["id"]), None if ll is None else to_point(*ll))
+
+    def pins_reset(self, pins: List[dict]) -> None:
+        free: Dict[str, Point] = {}
+        for p in pins:
+            ll = coords(p)
+            if ll is not None and p.get("id") and _is_free(p):
+                free[str(p["id"])] = to_point(*ll)
+        self._free = free
+        self._tree = KDTree(dict(free))
+        self._added = {}
+        self._dead = 0
+        self._gen += 1
+
+    # ---- reads ----
+    def nearest(self, lat: float, lng: float, k: int = 5) -> List[Tuple[dict, float]]:
+        """(live pin row, distance in metres) for the k nearest free pins, nearest first."""
+        q = to_point(lat, lng)
+        heap: List[Tuple[float, str]] = []
+        with state_store.lock:
+            self._tree.nearest(q, k, self._live, heap)
+            for pin_id in self._added:
+                p = self._free[pin_id]
+                d2 = (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+                if len(heap) < k:
+                    heapq.heappush(heap, (-d2, pin_id))
+                elif d2 < -heap[0][0]:
+                    heapq.heapreplace(heap, (-d2, pin_id))
+            found = sorted((-nd2, pin_id) for nd2, pin_id in heap)
+            out = []
+            for d2, pin_id in found:
+                pin = state_store.get_pin(pin_id)
+                if pin is not None:
+                    out.append((pin, chord_to_m(d2)))
+            return out
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+
+free_slots = FreeSlots()
+state_store.add_pin_listener(free_slots)
@@ -0,0 +1,80 @@
+# wt_app/core/income_rates.py
+"""
+Maintained per-owner income rate (income per tick interval).
+
+Registered as a state_store pin listener, so every buy / upgrade / trade /
+street claim adjusts the owner rates by the pin's old and new contribution,
+and a tick only has to add rates to balances: O(owners), not O(pins).
+rebuild() recomputes the table from scratch for the consistency check.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+from wt_app.core import state_store, tick_engine
+
+
+def _income_map() -> Dict[str, int]:
+    return {
+        r["key"]: int(r.get("baseIncome", 0))
+        for r in state_store.building_types()
+        if "key" in r
+    }
+
+
+class IncomeRates:
+    def __init__(self) -> None:
+        self._rates: Dict[str, int] = {}
+        self._income: Dict[str, int] = {}
+
+    def _contribution(self, p: Optional[dict]) -> Tuple[str, int]:
+        if not p:
+            return "", 0
+        owner = tick_engine.owner_of(p)
+        if not owner:
+            return "", 0
+        return owner, int(self._income.get(p.get("type") or "", 0)) * tick_engine.level_of(p)
+
+    def _add(self, owner: str, amount: int) -> None:
+        if not owner or not amount:
+            return
+        v = self._rates.get(owner, 0) + amount
+        if v:
+            self._rates[owner] = v
+        else:
+            self._rates.pop(owner, None)
+
+    # ---- state_store.PinListener ----
+    def pin_changed(self, before: Optional[dict], after: Optional[dict]) -> None:
+        old_owner, old_amt = self._contribution(before)
+        new_owner, new_amt = self._contribution(after)
+        self._add(old_owner, -old_amt)
+        self._add(new_owner, new_amt)
+
+    def pins_reset(self, pins: List[dict]) -> None:
+        self._income = _income_map()
+        self._rates = {o: v for o, v in tick_engine.accrue(pins, self._income).items() if v}
+
+    # ---- reads ----
+    def snapshot(self) -> Dict[str, int]:
+        with state_store.lock:
+            return dict(self._rates)
+
+    def check(self, repair: bool = False) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """
+        (maintained, rebuilt-from-scratch) taken under the store lock so no
+        mutation slips in between; `repair` swaps the rebuilt table in.
+        """
+        with state_store.lock:
+            version, pins = state_store.pins_snapshot()
+            rebuilt = {
+                o: v for o, v in tick_engine.accrue(pins, _income_map(), version=version).items() if v
+            }
+            maintained = dict(self._rates)
+            if repair:
+                self._rates = dict(rebuilt)
+            return maintained, rebuilt
+
+
+rates = IncomeRates()
+state_store.add_pin_listener(rates)
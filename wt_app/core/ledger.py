@@ -0,0 +1,333 @@
+# wt_app/core/ledger.py
+"""
+Append-only balance ledger.
+
+Every balance / escrow change is one JSON line in data/ledger/ledger.jsonl:
+
+    {"seq": 42, "t": 1762..., "op": "escrow_hold", "b": {"a@x": -400}, "e": {"<offer>": 400}}
+
+`b` holds balance deltas per owner, `e` escrow deltas per offer id. Every
+CHECKPOINT_EVERY entries the full balances/escrow maps are snapshotted to
+checkpoint.json and the live log is rotated into segments/, so startup only
+replays the entries written after the last checkpoint. Rotated segments are
+kept: together with the live log they are the account history.
+
+Balances, escrow and `seq` live in this process, so exactly one process may
+own the ledger: open_ledger() takes an exclusive lock on data/ledger/.lock
+and fails if another process (e.g. a second uvicorn worker) holds it.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, IO, List, Optional
+
+from wt_app.core import state_store
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: no cross-process guard
+    fcntl = None
+
+LEDGER_DIR = state_store.DATA / "ledger"
+SEGMENTS_DIR = LEDGER_DIR / "segments"
+LOG_FILE = LEDGER_DIR / "ledger.jsonl"
+CHECKPOINT_FILE = LEDGER_DIR / "checkpoint.json"
+LOCK_FILE = LEDGER_DIR / ".lock"
+
+CHECKPOINT_EVERY = int(os.getenv("WT_LEDGER_CHECKPOINT_EVERY", "1000") or 1000)
+FSYNC = os.getenv("WT_LEDGER_FSYNC", "false").lower() == "true"
+
+_balances: Dict[str, int] = {}
+_escrow: Dict[str, int] = {}
+_seq = 0                  # last applied entry
+_checkpoint_seq = 0       # seq covered by checkpoint.json
+_log: Optional[IO[str]] = None
+_owner_lock: Optional[IO[str]] = None     # held open (and flock'ed) while the ledger is open
+_opened = False
+_batch_depth = 0          # > 0: appends are buffered until the outermost batch() exits
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _apply(balances: Dict[str, int], escrow: Dict[str, int]) -> None:
+    for owner, delta in balances.items():
+        _balances[owner] = int(_balances.get(owner, 0)) + int(delta)
+    for key, delta in escrow.items():
+        amt = int(_escrow.get(key, 0)) + int(delta)
+        if amt > 0:
+            _escrow[key] = amt
+        else:
+            _escrow.pop(key, None)
+
+
+def _iter_lines(path: Path):
+    for entry, _end in _iter_entries(path):
+        yield entry
+
+
+def _iter_entries(path: Path):
+    """(entry, byte offset just past its line); stops at a torn tail."""
+    if not path.exists():
+        return
+    end = 0
+    with path.open("rb") as f:
+        for line in f:
+            end += len(line)
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except Exception:
+                # torn tail from a crash mid-append; everything after it is suspect
+                return
+            yield entry, end
+
+
+def _cut_torn_tail(good_end: int) -> None:
+    """Move whatever follows the last good line of the live log to a quarantine file."""
+    size = LOG_FILE.stat().st_size if LOG_FILE.exists() else 0
+    if good_end >= size:
+        return
+    with LOG_FILE.open("r+b") as f:
+        f.seek(good_end)
+        tail = f.read()
+        (LEDGER_DIR / f"ledger.torn-{_now_ms()}.jsonl").write_bytes(tail)
+        f.seek(good_end)
+        f.truncate()
+
+
+# ---------- open / recovery ----------
+def _lock_owner() -> None:
+    global _owner_lock
+    if _owner_lock is not None or fcntl is None:
+        return
+    f = LOCK_FILE.open("a+", encoding="utf-8")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.seek(0)
+        holder = f.read().strip() or "?"
+        f.close()
+        raise RuntimeError(
+            f"{LEDGER_DIR} is open in another process (pid {holder}); "
+            "the ledger supports a single process -- run one uvicorn worker"
+        )
+    f.truncate(0)
+    f.write(str(os.getpid()))
+    f.flush()
+    _owner_lock = f
+
+
+def open_ledger() -> None:
+    """Load the last checkpoint and replay the live log. Called from the app lifespan."""
+    global _seq, _checkpoint_seq, _log, _opened
+    with state_store.lock:
+        if _log is not None:
+            _log.close()
+            _log = None
+        LEDGER_DIR.mkdir(parents=True, exist_ok=True)
+        SEGMENTS_DIR.mkdir(exist_ok=True)
+        _lock_owner()
+        _balances.clear()
+        _escrow.clear()
+        _seq = _checkpoint_seq = 0
+
+        if CHECKPOINT_FILE.exists():
+            cp = json.loads(CHECKPOINT_FILE.read_text(encoding="utf-8"))
+            _balances.update({k: int(v) for k, v in (cp.get("balances") or {}).items()})
+            _escrow.update({k: int(v) for k, v in (cp.get("escrow") or {}).items()})
+            _seq = _checkpoint_seq = int(cp.get("seq") or 0)
+        elif not LOG_FILE.exists():
+            _seed_from_economy()
+
+        good_end = 0
+        for entry, good_end in _iter_entries(LOG_FILE):
+            seq = int(entry.get("seq") or 0)
+            if seq <= _seq:
+                continue
+            _apply(entry.get("b") or {}, entry.get("e") or {})
+            _seq = seq
+        # appends must not land behind a torn line, or the next replay stops
+        # there and drops them
+        _cut_torn_tail(good_end)
+
+        _log = LOG_FILE.open("a", encoding="utf-8")
+        if good_end and not _ends_with_newline(LOG_FILE):
+            _log.write("\n")   # last entry was written whole but its newline wasn't
+        _opened = True
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with path.open("rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _seed_from_economy() -> None:
+    """First start on a legacy tree: take balances/escrow out of economy.json."""
+    eco = state_store.economy()
+    _balances.update({str(k): int(v) for k, v in (eco.get("balances") or {}).items()})
+    _escrow.update({str(k): int(v) for k, v in (eco.get("escrow") or {}).items() if int(v) > 0})
+    _write_checkpoint()
+    # only once the checkpoint holds them; a failed write leaves economy.json as it was
+    eco.pop("balances", None)
+    eco.pop("escrow", None)
+    state_store.mark_dirty("economy")
+
+
+def _ensure_open() -> None:
+    if not _opened:
+        open_ledger()
+
+
+def _write_checkpoint() -> None:
+    global _checkpoint_seq
+    raw = json.dumps(
+        {"seq": _seq, "t": _now_ms(), "balances": _balances, "escrow": _escrow},
+        ensure_ascii=False,
+    )
+    tmp = CHECKPOINT_FILE.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(raw)
+        if FSYNC:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, CHECKPOINT_FILE)
+    _checkpoint_seq = _seq
+
+
+def checkpoint() -> int:
+    """Snapshot balances and rotate the live log into segments/. Returns the checkpoint seq."""
+    global _log
+    _ensure_open()
+    with state_store.lock:
+        if _seq == _checkpoint_seq:
+            return _seq
+        _write_checkpoint()
+        # entries <= checkpoint seq are skipped on replay, so a crash before the
+        # rotation below only costs a slightly longer replay
+        if _log is not None:
+            _log.close()
+        if LOG_FILE.exists():
+            os.replace(LOG_FILE, SEGMENTS_DIR / f"ledger-{_seq:012d}.jsonl")
+        _log = LOG_FILE.open("a", encoding="utf-8")
+        return _seq
+
+
+def close() -> None:
+    global _log, _opened, _owner_lock
+    with state_store.lock:
+        if _log is not None:
+            _log.close()
+        _log = None
+        _opened = False
+        if _owner_lock is not None:
+            _owner_lock.close()     # releases the flock
+            _owner_lock = None
+
+
+# ---------- writes ----------
+def append(
+    op: str,
+    balances: Optional[Dict[str, int]] = None,
+    escrow: Optional[Dict[str, int]] = None,
+    **meta,
+) -> int:
+    """
+    Apply and persist one entry of balance / escrow deltas. Returns its seq.
+    Callers validate (funds etc.) under state_store.lock before appending.
+    """
+    global _seq
+    _ensure_open()
+    balances = {k: int(v) for k, v in (balances or {}).items() if int(v)}
+    escrow = {k: int(v) for k, v in (escrow or {}).items() if int(v)}
+    with state_store.lock:
+        seq = _seq + 1
+        entry = {"seq": seq, "t": _now_ms(), "op": op}
+        if balances:
+            entry["b"] = balances
+        if escrow:
+            entry["e"] = escrow
+        entry.update(meta)
+        _log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        # taken only once the line is written: a failed dumps/write leaves no gap
+        _seq = seq
+        if not _batch_depth:
+            _sync()
+        _apply(balances, escrow)
+        if _seq - _checkpoint_seq >= CHECKPOINT_EVERY:
+            checkpoint()
+        return _seq
+
+
+def _sync() -> None:
+    _log.flush()
+    if FSYNC:
+        os.fsync(_log.fileno())
+
+
+@contextmanager
+def batch():
+    """
+    Group appends into one write + fsync (e.g. a batch of offer actions).
+    Holds state_store.lock for the whole block; entries still apply one by one.
+    """
+    global _batch_depth
+    _ensure_open()
+    with state_store.lock:
+        _batch_depth += 1
+        try:
+            yield
+        finally:
+            _batch_depth -= 1
+            if not _batch_depth and _log is not None:
+                _sync()
+
+
+# ---------- reads ----------
+def balance(owner: str) -> int:
+    _ensure_open()
+    return int(_balances.get(owner, 0))
+
+
+def escrow_amount(key: str) -> int:
+    _ensure_open()
+    return int(_escrow.get(key, 0))
+
+
+def balances() -> Dict[str, int]:
+    """Snapshot of every balance."""
+    _ensure_open()
+    with state_store.lock:
+        return dict(_balances)
+
+
+def history(owner: str, limit: int = 50, before_seq: Optional[int] = None) -> List[dict]:
+    """
+    Entries touching `owner`, newest first. Walks the live log and then the
+    rotated segments backwards, stopping as soon as `limit` rows are found.
+
+    There is no per-owner index: each call re-reads files until it has
+    `limit` rows, so for an owner with few entries it costs O(ledger).
+    A file's entries past a torn line are skipped, as in replay.
+    """
+    _ensure_open()
+    files = [LOG_FILE] + sorted(SEGMENTS_DIR.glob("ledger-*.jsonl"), reverse=True)
+    out: List[dict] = []
+    for path in files:
+        rows = [
+            e for e in _iter_lines(path)
+            if owner in (e.get("b") or {})
+            and (before_seq is None or int(e.get("seq") or 0) < before_seq)
+        ]
+        for e in reversed(rows):
+            out.append(e)
+            if len(out) >= limit:
+                return out
+    return out
@@ -0,0 +1,346 @@
+# wt_app/core/market.py
+"""
+Standing bids and asks per (building type, level), matched in price-time
+priority.
+
+    bids  (type, level) -> max-heap of (-price, seq, id)
+    asks  (type, level) -> min-heap of (price, seq, id)
+
+An ask lists one owned pin; a bid wants any pin of that type and level, with
+its price held in escrow while it rests. A new order crosses the best order on
+the other side while prices overlap and trades at the resting order's price.
+Orders are for one pin, so an order fills at most once. Two orders from the
+same owner never trade: the resting one is cancelled instead.
+
+OrderBook itself does no I/O. Settlement (escrow, pin transfer) is the
+`settle` callable passed to submit(); it raises StaleOrder for an order that
+can no longer trade (e.g. the ask's pin changed hands), which is dropped while
+matching carries on. Heaps are lazy: cancelled / filled ids are skipped when
+they surface, and a heap is rebuilt once it is mostly dead entries.
+
+Open orders are journalled to data/market/orders.jsonl (one line per open /
+close / fill) and replayed by load(); callers hold state_store.lock. Fills
+from the last FILLS_KEEP_SEC survive compaction, so recent trades and the
+price index (wt_app/core/price_index.py) are the same after a restart.
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, IO, List, NamedTuple, Optional, Tuple
+
+from wt_app.core import state_store
+
+MARKET_DIR = state_store.DATA / "market"
+JOURNAL_FILE = MARKET_DIR / "orders.jsonl"
+
+TRADES_KEEP = int(os.getenv("WT_MARKET_TRADES_KEEP", "500") or 500)
+# covers the longest price-index window
+FILLS_KEEP_SEC = int(os.getenv("WT_MARKET_FILLS_KEEP_SEC", str(7 * 86400)) or 7 * 86400)
+
+SIDES = ("BID", "ASK")
+Key = Tuple[str, int]
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class StaleOrder(Exception):
+    """Raised by a settle callable: `order` can't trade any more and is cancelled."""
+
+    def __init__(self, order: dict, reason: str = "stale"):
+        super().__init__(reason)
+        self.order = order
+        self.reason = reason
+
+
+class Fill(NamedTuple):
+    bid: dict
+    ask: dict
+    price: int
+    t: int
+
+    def to_dict(self) -> dict:
+        return {
+            "t": self.t,
+            "type": self.ask["type"],
+            "level": self.ask["level"],
+            "price": self.price,
+            "pinId": self.ask.get("pinId"),
+            "buyer": self.bid["owner"],
+            "seller": self.ask["owner"],
+            "bidId": self.bid["id"],
+            "askId": self.ask["id"],
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Fill":
+        """Rebuild a journalled fill (orders reduced to the fields to_dict() reads)."""
+        bid = {"id": d.get("bidId"), "owner": d.get("buyer")}
+        ask = {"id": d.get("askId"), "owner": d.get("seller"), "type": d.get("type"), "level": d.get("level"), "pinId": d.get("pinId")}
+        return cls(bid, ask, int(d.get("price") or 0), int(d.get("t") or 0))
+
+
+Settle = Callable[[dict, dict, int], None]
+
+
+def _key(o: dict) -> Key:
+    return (str(o["type"]), int(o["level"]))
+
+
+class OrderBook:
+    def __init__(self, keep_trades: int = TRADES_KEEP) -> None:
+        self._orders: Dict[str, dict] = {}                    # open orders
+        self._bids: Dict[Key, List[Tuple[int, int, str]]] = {}
+        self._asks: Dict[Key, List[Tuple[int, int, str]]] = {}
+        self._live: Dict[Tuple[str, Key], int] = {}           # open orders per heap
+        self._ask_by_pin: Dict[str, str] = {}
+        self._by_owner: Dict[str, Dict[str, None]] = {}
+        self._seq = 0
+        self.trades: Deque[Fill] = deque(maxlen=keep_trades)
+        # called once for every order that stops being open / every fill (journal hooks)
+        self.on_close: Optional[Callable[[dict], None]] = None
+        self.on_fill: Optional[Callable[[Fill], None]] = None
+
+    # ---- internals ----
+    def _heaps(self, side: str) -> Dict[Key, List[Tuple[int, int, str]]]:
+        return self._bids if side == "BID" else self._asks
+
+    def _rest(self, o: dict) -> None:
+        self._seq += 1
+        o["seq"] = self._seq
+        key = _key(o)
+        prio = -o["price"] if o["side"] == "BID" else o["price"]
+        heapq.heappush(self._heaps(o["side"]).setdefault(key, []), (prio, self._seq, o["id"]))
+        self._live[(o["side"], key)] = self._live.get((o["side"], key), 0) + 1
+        self._orders[o["id"]] = o
+        self._by_owner.setdefault(o["owner"].lower(), {})[o["id"]] = None
+        if o["side"] == "ASK" and o.get("pinId"):
+            self._ask_by_pin[o["pinId"]] = o["id"]
+
+    def _close(self, o: dict, status: str) -> None:
+        o["status"] = status
+        o["closedAt"] = _now_ms()
+        if self._orders.pop(o["id"], None) is not None:
+            key = _key(o)
+            hk = (o["side"], key)
+            self._live[hk] -= 1
+            ids = self._by_owner.get(o["owner"].lower())
+            if ids is not None:
+                ids.pop(o["id"], None)
+                if not ids:
+                    del self._by_owner[o["owner"].lower()]
+            if o["side"] == "ASK" and self._ask_by_pin.get(o.get("pinId")) == o["id"]:
+                del self._ask_by_pin[o["pinId"]]
+            heap = self._heaps(o["side"]).get(key)
+            if heap is not None and len(heap) > 64 and len(heap) > 2 * self._live[hk]:
+                heap[:] = [e for e in heap if e[2] in self._orders]
+                heapq.heapify(heap)
+        if self.on_close is not None:
+            self.on_close(o)
+
+    def _best(self, side: str, key: Key) -> Optional[dict]:
+        heap = self._heaps(side).get(key)
+        while heap:
+            o = self._orders.get(heap[0][2])
+            if o is not None:
+                return o
+            heapq.heappop(heap)
+        return None
+
+    # ---- writes ----
+    def submit(self, order: dict, settle: Optional[Settle] = None) -> Tuple[List[Fill], List[dict]]:
+        """
+        Match `order` against the other side, then rest whatever is left.
+        Returns (fills, orders cancelled along the way).
+        """
+        order["status"] = "OPEN"
+        other = "ASK" if order["side"] == "BID" else "BID"
+        key = _key(order)
+        fills: List[Fill] = []
+        dropped: List[dict] = []
+        while True:
+            rest = self._best(other, key)
+            if rest is None:
+                break
+            bid, ask = (order, rest) if order["side"] == "BID" else (rest, order)
+            if bid["price"] < ask["price"]:
+                break
+            if rest["owner"].lower() == order["owner"].lower():
+                self._close(rest, "CANCELED")   # self-trade prevention
+                dropped.append(rest)
+                continue
+            price = rest["price"]
+            try:
+                if settle is not None:
+                    settle(bid, ask, price)
+            except StaleOrder as e:
+                self._close(e.order, "CANCELED")
+                dropped.append(e.order)
+                if e.order is order:
+                    return fills, dropped
+                continue
+            fill = Fill(bid, ask, price, _now_ms())
+            self.trades.append(fill)
+            if self.on_fill is not None:
+                self.on_fill(fill)
+            fills.append(fill)
+            self._close(rest, "FILLED")
+            self._close(order, "FILLED")
+            return fills, dropped
+        self._rest(order)
+        return fills, dropped
+
+    def cancel(self, order_id: str) -> Optional[dict]:
+        o = self._orders.get(order_id)
+        if o is not None:
+            self._close(o, "CANCELED")
+        return o
+
+    def restore(self, order: dict) -> None:
+        """Re-add an open order from the journal (the book was uncrossed when it was written)."""
+        order["status"] = "OPEN"
+        self._rest(order)
+
+    def reset(self) -> None:
+        on_close, on_fill = self.on_close, self.on_fill
+        self.__init__(self.trades.maxlen or TRADES_KEEP)
+        self.on_close, self.on_fill = on_close, on_fill
+
+    # ---- reads ----
+    def get(self, order_id: str) -> Optional[dict]:
+        return self._orders.get(order_id)
+
+    def ask_for_pin(self, pin_id: str) -> Optional[str]:
+        return self._ask_by_pin.get(pin_id)
+
+    def orders_for(self, owner: str) -> List[dict]:
+        """Open orders of `owner`, newest first."""
+        ids = list(self._by_owner.get(owner.strip().lower(), ()))
+        return [self._orders[i] for i in reversed(ids)]
+
+    def open_orders(self) -> List[dict]:
+        return sorted(self._orders.values(), key=lambda o: o["seq"])
+
+    def depth(self, type_: str, level: int, levels: int = 10) -> Dict[str, List[dict]]:
+        """Best `levels` price levels per side: [{"price", "orders"}], best first."""
+        key = (type_, int(level))
+        out: Dict[str, List[dict]] = {}
+        for side in SIDES:
+            agg: Dict[int, int] = {}
+            for prio, _, oid in sorted(self._heaps(side).get(key, ())):
+                if oid not in self._orders:
+                    continue
+                price = -prio if side == "BID" else prio
+                if price not in agg and len(agg) == levels:
+                    break
+                agg[price] = agg.get(price, 0) + 1
+            out["bids" if side == "BID" else "asks"] = [{"price": p, "orders": n} for p, n in agg.items()]
+        return out
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+
+book = OrderBook()
+
+
+# ---------- journal ----------
+_journal: Optional[IO[str]] = None
+_journal_lines = 0
+_fills: Deque[dict] = deque()     # journalled fills, oldest first; kept FILLS_KEEP_SEC
+
+
+def _write(entry: dict) -> None:
+    global _journal_lines
+    if _journal is None:
+        return
+    _journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    _journal.flush()
+    _journal_lines += 1
+    if _journal_lines > 1024 and _journal_lines > 4 * (len(book) + len(_fills)):
+        _compact()
+
+
+def record_open(order: dict) -> None:
+    """Journal an order before its escrow is held, so a crash can't orphan the hold."""
+    _write({"op": "open", "order": order})
+
+
+def record_close(order: dict) -> None:
+    _write({"op": "close", "id": order["id"], "status": order["status"]})
+
+
+def record_fill(fill: Fill) -> None:
+    row = fill.to_dict()
+    _fills.append(row)
+    _write({"op": "fill", "fill": row})
+
+
+def fills() -> List[dict]:
+    """Journalled fills from the last FILLS_KEEP_SEC, oldest first (price index seed)."""
+    return list(_fills)
+
+
+def _compact() -> None:
+    global _journal, _journal_lines
+    MARKET_DIR.mkdir(parents=True, exist_ok=True)
+    horizon = _now_ms() - FILLS_KEEP_SEC * 1000
+    while _fills and _fills[0]["t"] < horizon:
+        _fills.popleft()
+    rows = [{"op": "fill", "fill": f} for f in _fills] + [{"op": "open", "order": o} for o in book.open_orders()]
+    tmp = JOURNAL_FILE.with_suffix(".jsonl.tmp")
+    tmp.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows), encoding="utf-8")
+    if _journal is not None:
+        _journal.close()
+    os.replace(tmp, JOURNAL_FILE)
+    _journal = JOURNAL_FILE.open("a", encoding="utf-8")
+    _journal_lines = len(rows)
+
+
+def load(still_valid: Optional[Callable[[dict], bool]] = None) -> int:
+    """
+    Rebuild the book from the journal and compact it. `still_valid` filters
+    replayed orders (e.g. bids whose escrow is gone). Returns open orders.
+    """
+    global _journal
+    with state_store.lock:
+        if _journal is not None:
+            _journal.close()
+            _journal = None
+        book.reset()
+        _fills.clear()
+        opened: Dict[str, dict] = {}
+        if JOURNAL_FILE.exists():
+            with JOURNAL_FILE.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        e = json.loads(line)
+                    except Exception:
+                        break  # torn tail
+                    if e.get("op") == "open":
+                        opened[e["order"]["id"]] = e["order"]
+                    elif e.get("op") == "close":
+                        opened.pop(e.get("id"), None)
+                    elif e.get("op") == "fill":
+                        _fills.append(e["fill"])
+        for o in opened.values():   # journal order = arrival order
+            if still_valid is None or still_valid(o):
+                book.restore(o)
+        book.trades.extend(Fill.from_dict(f) for f in _fills)
+        book.on_close = record_close
+        book.on_fill = record_fill
+        _compact()
+        return len(book)
+
+
+def close() -> None:
+    global _journal
+    with state_store.lock:
+        if _journal is not None:
+            _journal.close()
+        _journal = None
@@ -0,0 +1,187 @@
+# wt_app/core/offer_archive.py
+"""
+Cold storage for settled offers.
+
+Terminal offers (ACCEPTED / REJECTED / CANCELED / EXPIRED) whose last activity
+is older than OFFER_ARCHIVE_AFTER_DAYS are appended to gzip JSONL segments,
+one per month of createdAt:
+
+    data/offers_archive/offers-2025-10.jsonl.gz
+
+and then dropped from the hot store, so startup load and every in-memory
+index only carry pending and recent offers. Segments are only read by
+history(), newest month first, and only as far back as a page needs.
+"""
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from wt_app.core import state_store
+from wt_app.core.offer_book import book, normalize_expires_at, normalize_status
+
+ARCHIVE_DIR = state_store.DATA / "offers_archive"
+
+ARCHIVE_AFTER_DAYS = float(os.getenv("OFFER_ARCHIVE_AFTER_DAYS", "30") or 30)
+ARCHIVE_EVERY_SEC = float(os.getenv("OFFER_ARCHIVE_EVERY_SEC", "3600") or 3600)
+
+TERMINAL = {"ACCEPTED", "REJECTED", "CANCELED", "EXPIRED"}
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _created(o: dict) -> int:
+    return int(o.get("createdAt") or o.get("t") or 0)
+
+
+def _last_activity(o: dict) -> int:
+    hist = o.get("history")
+    if isinstance(hist, list) and hist and isinstance(hist[-1], dict) and hist[-1].get("t"):
+        return int(hist[-1]["t"])
+    return max(_created(o), normalize_expires_at(o.get("expiresAt")))
+
+
+def _month(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m")
+
+
+def _month_start_ms(month: str) -> int:
+    return int(datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _next_month_start_ms(month: str) -> int:
+    y, m = (int(x) for x in month.split("-"))
+    y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return _month_start_ms(f"{y:04d}-{m:02d}")
+
+
+def _segment(month: str) -> Path:
+    return ARCHIVE_DIR / f"offers-{month}.jsonl.gz"
+
+
+def _months_desc() -> List[str]:
+    if not ARCHIVE_DIR.exists():
+        return []
+    return sorted((p.name[len("offers-"):-len(".jsonl.gz")] for p in ARCHIVE_DIR.glob("offers-*.jsonl.gz")), reverse=True)
+
+
+# ---------- archive ----------
+def archive_settled(now: Optional[int] = None) -> int:
+    """Move old terminal offers into their month segment. Returns how many moved."""
+    now = now or _now_ms()
+    cutoff = now - int(ARCHIVE_AFTER_DAYS * 86400 * 1000)
+
+    def settled(o: Optional[dict]) -> bool:
+        return o is not None and normalize_status(o.get("status")) in TERMINAL and _last_activity(o) < cutoff
+
+    # pick + serialize under the store lock; compress and append outside it
+    by_month: Dict[str, List[str]] = {}
+    ids: List[str] = []
+    with state_store.lock:
+        for st in TERMINAL:
+            for oid in book.ids_with_status(st):
+                o = state_store.get_offer(oid)
+                if settled(o):
+                    by_month.setdefault(_month(_created(o)), []).append(json.dumps(o, ensure_ascii=False))
+                    ids.append(oid)
+    if not ids:
+        return 0
+
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    # segments first: a crash before the hot store flushes re-archives
+    # the same rows, and history() de-duplicates by id
+    for month, lines in by_month.items():
+        with gzip.open(_segment(month), "at", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line + "\n")
+    with state_store.lock:
+        # an offer touched meanwhile has fresh activity and stays hot
+        removed = state_store.remove_offers(oid for oid in ids if settled(state_store.get_offer(oid)))
+    return len(removed)
+
+
+async def run_archiver() -> None:
+    """Background task: archive settled offers at startup and every ARCHIVE_EVERY_SEC."""
+    while True:
+        try:
+            await asyncio.to_thread(archive_settled)
+        except Exception:
+            pass
+        await asyncio.sleep(ARCHIVE_EVERY_SEC)
+
+
+# ---------- history ----------
+def _read_segment(month: str) -> Iterator[dict]:
+    try:
+        with gzip.open(_segment(month), "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    except (OSError, EOFError, ValueError, zlib.error):
+        # torn tail or corrupt deflate data from a crash mid-append: keep what was readable
+        return
+
+
+def _key(o: dict) -> Tuple[int, str]:
+    return _created(o), str(o.get("id"))
+
+
+def parse_cursor(raw: Optional[str]) -> Optional[Tuple[int, str]]:
+    if not raw:
+        return None
+    t, _, oid = raw.partition(":")
+    return int(t), oid
+
+
+def history(
+    owner: str,
+    limit: int = 50,
+    before: Optional[Tuple[int, str]] = None,
+    status: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Offers where `owner` is buyer or seller, newest createdAt first: hot store
+    plus archive segments. `before` is the (createdAt, id) cursor of the last
+    row of the previous page. Returns (rows, next cursor or None).
+    """
+    who = owner.strip().lower()
+
+    def wanted(o: dict) -> bool:
+        if who not in (str(o.get("fromOwner") or "").strip().lower(), str(o.get("toOwner") or "").strip().lower()):
+            return False
+        if status and normalize_status(o.get("status")) != status:
+            return False
+        return before is None or _key(o) < before
+
+    seen: Dict[str, dict] = {}
+    with state_store.lock:
+        for oid in book.ids_for_owner(owner, status):
+            o = state_store.get_offer(oid)
+            if o is not None and wanted(o):
+                seen[str(o["id"])] = dict(o)
+
+    for month in _months_desc():
+        if before is not None and _month_start_ms(month) > before[0]:
+            continue  # whole month is newer than the cursor
+        # rows created after this month are final (hot + every newer segment
+        # already read); once they fill the page, older segments can't matter
+        done = _next_month_start_ms(month)
+        if sum(1 for o in seen.values() if _created(o) >= done) >= limit:
+            break
+        for o in _read_segment(month):
+            if o.get("id") and str(o["id"]) not in seen and wanted(o):
+                seen[str(o["id"])] = o
+
+    rows = sorted(seen.values(), key=_key, reverse=True)[:limit]
+    nxt = f"{_created(rows[-1])}:{rows[-1]['id']}" if len(rows) >= limit else None
+    return rows, nxt
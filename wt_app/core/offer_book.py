@@ -0,0 +1,161 @@
+# wt_app/core/offer_book.py
+"""
+Maintained indexes over the offers in state_store.
+
+    owner (lowercased, buyer or seller) -> offer ids, oldest first
+    status                              -> offer ids
+    pinId                               -> pending offer ids on that pin
+    min-heap of (expiresAt, id)         -> pending offers by expiry
+
+Registered as a state_store offer listener, so listing an owner's offers is
+O(their offers) and the LOCK_PIN_ON_PENDING check is a dict lookup, however
+many historical offers the store holds. The heap is lazy: entries for offers
+that stopped being pending (or got a new expiresAt) are dropped when popped.
+"""
+from __future__ import annotations
+
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+from wt_app.core import state_store
+
+VALID_STATUSES = {"PENDING", "ACCEPTED", "REJECTED", "CANCELED", "EXPIRED"}
+
+
+def normalize_status(raw: Optional[str]) -> str:
+    """
+    Normalize legacy + mixed-case statuses to canonical:
+      PENDING, ACCEPTED, REJECTED, CANCELED, EXPIRED
+    """
+    if not raw:
+        return "PENDING"
+    up = str(raw).strip().upper()
+    if up == "CANCELLED":  # UK spelling
+        up = "CANCELED"
+    if up in VALID_STATUSES:
+        return up
+    # Unknown legacy → treat as PENDING so it can still flow
+    return "PENDING"
+
+
+def normalize_expires_at(raw) -> int:
+    """
+    Handle both ms and sec legacy values.
+    """
+    if raw is None:
+        return 0
+    try:
+        v = int(raw)
+    except Exception:
+        return 0
+    # seconds vs ms heuristic
+    if 0 < v < 10_000_000_000:
+        return v * 1000
+    return v
+
+
+def _owner_key(v) -> str:
+    return str(v or "").strip().lower()
+
+
+class OfferBook:
+    def __init__(self) -> None:
+        # dicts used as insertion-ordered sets
+        self._by_owner: Dict[str, Dict[str, None]] = {}
+        self._by_status: Dict[str, Dict[str, None]] = {}
+        self._pending_by_pin: Dict[str, Dict[str, None]] = {}
+        self._status: Dict[str, str] = {}
+        self._expires: Dict[str, int] = {}           # pending id -> expiresAt (ms)
+        self._heap: List[Tuple[int, str]] = []
+
+    def _add(self, o: dict) -> None:
+        oid = str(o["id"])
+        st = normalize_status(o.get("status"))
+        self._status[oid] = st
+        for who in {_owner_key(o.get("fromOwner")), _owner_key(o.get("toOwner"))}:
+            if who:
+                self._by_owner.setdefault(who, {})[oid] = None
+        self._by_status.setdefault(st, {})[oid] = None
+        if st == "PENDING":
+            self._pending_by_pin.setdefault(str(o.get("pinId")), {})[oid] = None
+            exp = normalize_expires_at(o.get("expiresAt"))
+            if exp:
+                self._expires[oid] = exp
+                heapq.heappush(self._heap, (exp, oid))
+
+    def _remove(self, o: dict) -> None:
+        oid = str(o["id"])
+        st = self._status.pop(oid, None)
+        self._expires.pop(oid, None)  # heap entry goes stale; skipped on pop
+        for who in {_owner_key(o.get("fromOwner")), _owner_key(o.get("toOwner"))}:
+            ids = self._by_owner.get(who)
+            if ids is not None:
+                ids.pop(oid, None)
+                if not ids:
+                    del self._by_owner[who]
+        if st is not None:
+            self._by_status.get(st, {}).pop(oid, None)
+        pin = str(o.get("pinId"))
+        pending = self._pending_by_pin.get(pin)
+        if pending is not None:
+            pending.pop(oid, None)
+            if not pending:
+                del self._pending_by_pin[pin]
+
+    # ---- state_store.OfferListener ----
+    def offer_changed(self, before: Optional[dict], after: Optional[dict]) -> None:
+        if before and before.get("id"):
+            self._remove(before)
+        if after and after.get("id"):
+            self._add(after)
+
+    def offers_reset(self, offers: List[dict]) -> None:
+        self.__init__()
+        for o in offers:
+            if o.get("id"):
+                self._add(o)
+
+    # ---- reads ----
+    def ids_for_owner(self, owner: str, status: Optional[str] = None) -> List[str]:
+        """Offer ids where `owner` is buyer or seller, newest first."""
+        with state_store.lock:
+            ids = list(self._by_owner.get(_owner_key(owner), ()))
+            if status:
+                ids = [i for i in ids if self._status.get(i) == status]
+        ids.reverse()
+        return ids
+
+    def ids_with_status(self, status: str) -> List[str]:
+        with state_store.lock:
+            return list(self._by_status.get(status, ()))
+
+    def next_expiry(self) -> Optional[int]:
+        """Earliest expiresAt among pending offers (ms), or None."""
+        with state_store.lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now_ms: int) -> List[str]:
+        """Remove and return ids of pending offers with expiresAt <= now_ms, soonest first."""
+        out: Dict[str, None] = {}  # an offer updated while pending can sit in the heap twice
+        with state_store.lock:
+            self._drop_stale()
+            while self._heap and self._heap[0][0] <= now_ms:
+                _, oid = heapq.heappop(self._heap)
+                out[oid] = None
+                self._drop_stale()
+        return list(out)
+
+    def _drop_stale(self) -> None:
+        heap = self._heap
+        while heap and self._expires.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def pending_for_pin(self, pin_id: str) -> Optional[str]:
+        """Oldest pending offer id on the pin, if any."""
+        with state_store.lock:
+            return next(iter(self._pending_by_pin.get(str(pin_id), ())), None)
+
+
+book = OfferBook()
+state_store.add_offer_listener(book)
@@ -0,0 +1,72 @@
+# wt_app/core/pin_changes.py
+"""
+Bounded change log for pin delta sync (GET /pins?since=<version>).
+
+state_store bumps pins_version() once per pin change (add, update, delete,
+buy, upgrade, trade, street-claim slots) before notifying listeners; this
+listener appends (version, pin id) to a ring of the last KEEP changes.
+changes_since(v) walks back from the newest entry to v, so it costs
+O(changes since v); a `since` older than the ring (or than the last reload /
+clear) can't be answered as a delta and the caller sends a full snapshot.
+"""
+from __future__ import annotations
+
+import os
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from wt_app.core import state_store
+
+KEEP = int(os.getenv("WT_PIN_CHANGES_KEEP", "20000") or 20000)
+
+
+class Delta(NamedTuple):
+    version: int
+    changed: List[dict]         # live rows, oldest change first
+    deleted: List[str]
+
+
+class PinChanges:
+    def __init__(self, keep: int = KEEP) -> None:
+        self._keep = keep
+        self._log: Deque[Tuple[int, str]] = deque()
+        self._floor = 0         # every change after this version is in the log
+
+    # ---- state_store.PinListener ----
+    def pin_changed(self, before: Optional[dict], after: Optional[dict]) -> None:
+        pin = after if after is not None else before
+        if not pin or not pin.get("id"):
+            return
+        if len(self._log) >= self._keep:
+            self._floor = self._log.popleft()[0]
+        self._log.append((state_store.pins_version(), str(pin["id"])))
+
+    def pins_reset(self, pins: List[dict]) -> None:
+        self._log.clear()
+        self._floor = state_store.pins_version()
+
+    # ---- reads ----
+    def changes_since(self, since: int) -> Optional[Delta]:
+        """Pins changed / deleted after `since`, or None when a full snapshot is needed."""
+        with state_store.lock:
+            version = state_store.pins_version()
+            if since > version or since < self._floor:
+                return None
+            latest: Dict[str, None] = {}
+            for v, pin_id in reversed(self._log):
+                if v <= since:
+                    break
+                latest[pin_id] = None
+            changed: List[dict] = []
+            deleted: List[str] = []
+            for pin_id in reversed(list(latest)):
+                pin = state_store.get_pin(pin_id)
+                if pin is None:
+                    deleted.append(pin_id)
+                else:
+                    changed.append(pin)
+            return Delta(version, changed, deleted)
+
+
+changes = PinChanges()
+state_store.add_pin_listener(changes)
@@ -0,0 +1,171 @@
+# wt_app/core/pin_clusters.py
+"""
+Per-zoom pin clusters for the zoomed-out map (GET /pins/clusters).
+
+A cluster cell at zoom z is a web-mercator tile at zoom z + SUBDIV (so each
+map tile shows up to 2^SUBDIV x 2^SUBDIV clusters). Every zoom MIN_Z..MAX_Z
+keeps, per populated cell:
+
+    [count, owned, sum(lat), sum(lng), {type: count}]
+
+A pin's cell at each zoom is its finest cell shifted right, so the levels
+nest. Registered as a state_store pin listener: a change subtracts the
+pin's old contribution and adds the new one at every level, O(MAX_Z - MIN_Z).
+Reads only touch the cells inside the bbox, so payload size depends on the
+viewport, never on the number of pins.
+"""
+from __future__ import annotations
+
+import math
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from wt_app.core import state_store
+from wt_app.core.pin_grid import coords
+
+MIN_Z = 0
+# deeper zooms show a few km and read raw pins from GET /pins?bbox= instead
+MAX_Z = int(os.getenv("WT_PIN_CLUSTER_MAX_Z", "10") or 10)
+SUBDIV = 3
+MAX_CELLS = int(os.getenv("WT_PIN_CLUSTER_MAX_CELLS", "4096") or 4096)
+MAX_LAT = 85.05112878       # web-mercator limit
+
+Cell = Tuple[int, int]
+# (finest x, finest y, owned, type, lat, lng) or None for pins without coordinates
+Contribution = Optional[Tuple[int, int, bool, str, float, float]]
+
+
+def tile_xy(lat: float, lng: float, k: int) -> Cell:
+    """Web-mercator tile (x, y) containing (lat, lng) at tile zoom k."""
+    n = 1 << k
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _contribution(p: Optional[dict]) -> Contribution:
+    ll = coords(p)
+    if ll is None:
+        return None
+    x, y = tile_xy(ll[0], ll[1], MAX_Z + SUBDIV)
+    return x, y, bool((p.get("owner") or "").strip()), str(p.get("type") or ""), ll[0], ll[1]
+
+
+class PinClusters:
+    def __init__(self) -> None:
+        self._levels: List[Dict[Cell, list]] = [{} for _ in range(MIN_Z, MAX_Z + 1)]
+
+    def _apply(self, c: Contribution, sign: int) -> None:
+        if c is None:
+            return
+        x, y, owned, type_, lat, lng = c
+        for z in range(MAX_Z, MIN_Z - 1, -1):
+            shift = MAX_Z - z
+            key = (x >> shift, y >> shift)
+            cells = self._levels[z - MIN_Z]
+            agg = cells.get(key)
+            if agg is None:
+                agg = cells[key] = [0, 0, 0.0, 0.0, {}]
+            agg[0] += sign
+            if not agg[0]:
+                del cells[key]
+                continue
+            agg[1] += sign if owned else 0
+            agg[2] += sign * lat
+            agg[3] += sign * lng
+            if type_:
+                types = agg[4]
+                n = types.get(type_, 0) + sign
+                if n:
+                    types[type_] = n
+                else:
+                    types.pop(type_, None)
+
+    # ---- state_store.PinListener ----
+    def pin_changed(self, before: Optional[dict], after: Optional[dict]) -> None:
+        old, new = _contribution(before), _contribution(after)
+        if old == new:
+            return  # e.g. an upgrade: level isn't clustered on
+        self._apply(old, -1)
+        self._apply(new, +1)
+
+    def pins_reset(self, pins: List[dict]) -> None:
+        # fill the finest level per pin, then roll each level up into its parent
+        self.__init__()
+        finest = self._levels[-1]
+        for p in pins:
+            c = _contribution(p)
+            if c is None:
+                continue
+            x, y, owned, type_, lat, lng = c
+            agg = finest.get((x, y))
+            if agg is None:
+                agg = finest[(x, y)] = [0, 0, 0.0, 0.0, {}]
+            agg[0] += 1
+            agg[1] += owned
+            agg[2] += lat
+            agg[3] += lng
+            if type_:
+                agg[4][type_] = agg[4].get(type_, 0) + 1
+        for z in range(MAX_Z, MIN_Z, -1):
+            parents = self._levels[z - 1 - MIN_Z]
+            for (x, y), (count, owned, slat, slng, types) in self._levels[z - MIN_Z].items():
+                agg = parents.get((x >> 1, y >> 1))
+                if agg is None:
+                    agg = parents[(x >> 1, y >> 1)] = [0, 0, 0.0, 0.0, {}]
+                agg[0] += count
+                agg[1] += owned
+                agg[2] += slat
+                agg[3] += slng
+                for t, n in types.items():
+                    agg[4][t] = agg[4].get(t, 0) + n
+
+    # ---- reads ----
+    def _cells_in(self, z: int, x_lo: int, x_hi: int, y_lo: int, y_hi: int) -> Iterator[Tuple[Cell, list]]:
+        cells = self._levels[z - MIN_Z]
+        if (x_hi - x_lo + 1) * (y_hi - y_lo + 1) <= len(cells):
+            for x in range(x_lo, x_hi + 1):
+                for y in range(y_lo, y_hi + 1):
+                    agg = cells.get((x, y))
+                    if agg is not None:
+                        yield (x, y), agg
+        else:
+            for (x, y), agg in cells.items():
+                if x_lo <= x <= x_hi and y_lo <= y <= y_hi:
+                    yield (x, y), agg
+
+    def clusters(self, z: int, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> List[dict]:
+        """
+        Clusters at zoom `z` (clamped to MIN_Z..MAX_Z) whose cell meets the bbox.
+        Raises ValueError when the bbox spans more than MAX_CELLS cells.
+        """
+        z = max(MIN_Z, min(MAX_Z, int(z)))
+        k = z + SUBDIV
+        x_lo, y_lo = tile_xy(max_lat, min_lng, k)   # mercator y grows southwards
+        x_hi, y_hi = tile_xy(min_lat, max_lng, k)
+        ranges = [(x_lo, x_hi)] if x_lo <= x_hi else [(x_lo, (1 << k) - 1), (0, x_hi)]   # antimeridian
+        span = sum(b - a + 1 for a, b in ranges) * (y_hi - y_lo + 1)
+        if span > MAX_CELLS:
+            raise ValueError("bbox too large for this zoom")
+        out: List[dict] = []
+        with state_store.lock:
+            for a, b in ranges:
+                for (x, y), (count, owned, slat, slng, types) in self._cells_in(z, a, b, y_lo, y_hi):
+                    out.append({
+                        "z": z,
+                        "x": x,
+                        "y": y,
+                        "count": count,
+                        "owned": owned,
+                        "ownedShare": round(owned / count, 4),
+                        # ties broken by key so incremental and rebuilt cells agree
+                        "dominantType": max(types.items(), key=lambda kv: (kv[1], kv[0]))[0] if types else None,
+                        "lat": slat / count,
+                        "lng": slng / count,
+                    })
+        return out
+
+
+clusters = PinClusters()
+state_store.add_pin_listener(clusters)
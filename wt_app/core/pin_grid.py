@@ -0,0 +1,130 @@
+# wt_app/core/pin_grid.py
+"""
+Uniform lat/lng grid over the pins, for viewport (bbox) queries.
+
+    (floor(lat / CELL_DEG), floor(lng / CELL_DEG)) -> {pin id: live pin row}
+
+Registered as a state_store pin listener, so adds, deletes, buys and street
+claims move pins between cells as they happen. A bbox query visits the
+covered cells (or, for a bbox wider than the populated area, just the
+populated cells), takes every pin of a cell that lies fully inside the bbox
+and checks coordinates only along the edges: cost is O(hits + border cells).
+"""
+from __future__ import annotations
+
+import math
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from wt_app.core import state_store
+
+CELL_DEG = float(os.getenv("WT_PIN_GRID_DEG", "0.05") or 0.05)
+EPS = 1e-9
+
+Cell = Tuple[int, int]
+
+
+def coords(p: Optional[dict]) -> Optional[Tuple[float, float]]:
+    """(lat, lng) of a pin, or None for legacy rows without usable (finite) coordinates."""
+    if not p:
+        return None
+    try:
+        lat, lng = float(p["lat"]), float(p["lng"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (math.isfinite(lat) and math.isfinite(lng)):
+        return None
+    return lat, lng
+
+
+def _cell(lat: float, lng: float) -> Cell:
+    return (math.floor(lat / CELL_DEG), math.floor(lng / CELL_DEG))
+
+
+class PinGrid:
+    def __init__(self) -> None:
+        self._cells: Dict[Cell, Dict[str, dict]] = {}
+        self._cell_of: Dict[str, Cell] = {}
+
+    def _add(self, p: dict) -> None:
+        ll = coords(p)
+        if ll is None or not p.get("id"):
+            return
+        c = _cell(*ll)
+        self._cells.setdefault(c, {})[str(p["id"])] = p
+        self._cell_of[str(p["id"])] = c
+
+    def _remove(self, pin_id: str) -> None:
+        c = self._cell_of.pop(pin_id, None)
+        if c is None:
+            return
+        bucket = self._cells.get(c)
+        if bucket is not None:
+            bucket.pop(pin_id, None)
+            if not bucket:
+                del self._cells[c]
+
+    # ---- state_store.PinListener ----
+    def pin_changed(self, before: Optional[dict], after: Optional[dict]) -> None:
+        if before and before.get("id"):
+            self._remove(str(before["id"]))
+        if after:
+            self._add(after)
+
+    def pins_reset(self, pins: List[dict]) -> None:
+        self.__init__()
+        for p in pins:
+            self._add(p)
+
+    # ---- reads ----
+    def _cells_in(self, lat_lo: int, lat_hi: int, lng_lo: int, lng_hi: int) -> Iterator[Tuple[Cell, Dict[str, dict]]]:
+        span = (lat_hi - lat_lo + 1) * (lng_hi - lng_lo + 1)
+        if span <= len(self._cells):
+            for ci in range(lat_lo, lat_hi + 1):
+                for cj in range(lng_lo, lng_hi + 1):
+                    bucket = self._cells.get((ci, cj))
+                    if bucket:
+                        yield (ci, cj), bucket
+        else:
+            for c, bucket in self._cells.items():
+                if lat_lo <= c[0] <= lat_hi and lng_lo <= c[1] <= lng_hi:
+                    yield c, bucket
+
+    def _query(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> Iterator[dict]:
+        lat_lo, lng_lo = _cell(min_lat, min_lng)
+        lat_hi, lng_hi = _cell(max_lat, max_lng)
+        for (ci, cj), bucket in self._cells_in(lat_lo, lat_hi, lng_lo, lng_hi):
+            # EPS: a pin right on a cell edge may round into the neighbouring cell
+            inner = (
+                ci * CELL_DEG - EPS >= min_lat and (ci + 1) * CELL_DEG + EPS <= max_lat
+                and cj * CELL_DEG - EPS >= min_lng and (cj + 1) * CELL_DEG + EPS <= max_lng
+            )
+            if inner:
+                yield from bucket.values()
+                continue
+            for p in bucket.values():
+                lat, lng = coords(p)
+                if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                    yield p
+
+    def within(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float, limit: Optional[int] = None) -> List[dict]:
+        """Pins inside the box (edges inclusive). min_lng > max_lng wraps across the antimeridian."""
+        with state_store.lock:
+            if min_lng <= max_lng:
+                parts = [self._query(min_lat, min_lng, max_lat, max_lng)]
+            else:
+                parts = [self._query(min_lat, min_lng, max_lat, 180.0), self._query(min_lat, -180.0, max_lat, max_lng)]
+            out: List[dict] = []
+            for it in parts:
+                for p in it:
+                    out.append(p)
+                    if limit is not None and len(out) >= limit:
+                        return out
+            return out
+
+    def __len__(self) -> int:
+        return len(self._cell_of)
+
+
+grid = PinGrid()
+state_store.add_pin_listener(grid)
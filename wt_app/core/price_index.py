@@ -0,0 +1,191 @@
+# wt_app/core/price_index.py
+"""
+Rolling trade-price index per building type (GET /market/prices).
+
+Each window (1h, 24h, 7d) is a ring of SLOTS time slots; each slot holds a
+LogSketch of the prices traded in it. A query merges the live slots of a
+window and reads p10 / p50 / p90 off the merged sketch, so memory is
+types x windows x SLOTS x MAX_BUCKETS however many trades there are, and a
+trade costs one bucket increment per window. Windows slide a slot at a time
+(the oldest 1/SLOTS of a window is dropped in one step).
+
+LogSketch buckets values on a log scale (bucket i covers (g^(i-1), g^i] with
+g = (1+a)/(1-a)), so any quantile it returns is within ACCURACY (relative) of
+a true sample at that rank. Sketches merge by adding bucket counts.
+
+Fed by offers_v2.accept_offer and market fills; seed() rebuilds the windows
+from ACCEPTED offers once at startup.
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ACCURACY = float(os.getenv("WT_PRICE_INDEX_ACCURACY", "0.01") or 0.01)
+SLOTS = int(os.getenv("WT_PRICE_INDEX_SLOTS", "24") or 24)
+MAX_BUCKETS = 512
+
+WINDOWS: Dict[str, int] = {"1h": 3600, "24h": 86400, "7d": 7 * 86400}   # seconds
+QUANTILES = (("p10", 0.10), ("p50", 0.50), ("p90", 0.90))
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class LogSketch:
+    """Relative-accuracy quantile sketch over positive values (mergeable, bounded)."""
+
+    __slots__ = ("gamma", "log_gamma", "buckets", "zeros", "count", "min", "max")
+
+    def __init__(self, accuracy: float = ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, v: float, n: int = 1) -> None:
+        self.count += n
+        self.min = v if self.min is None else min(self.min, v)
+        self.max = v if self.max is None else max(self.max, v)
+        if v <= 0:
+            self.zeros += n
+            return
+        i = math.ceil(math.log(v) / self.log_gamma)
+        self.buckets[i] = self.buckets.get(i, 0) + n
+        if len(self.buckets) > MAX_BUCKETS:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        # fold the lowest buckets together; only the bottom of the range loses accuracy
+        keys = sorted(self.buckets)
+        spill = keys[: len(keys) - MAX_BUCKETS + 1]
+        self.buckets[spill[-1]] = sum(self.buckets.pop(k) for k in spill)
+
+    def merge(self, other: "LogSketch") -> None:
+        if not other.count:
+            return
+        for i, n in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        if len(self.buckets) > MAX_BUCKETS:
+            self._collapse()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen > rank:
+                est = 2 * self.gamma ** i / (self.gamma + 1)
+                return min(max(est, self.min), self.max)
+        return self.max
+
+
+class _Window:
+    """Ring of SLOTS sketches covering the last `span` seconds."""
+
+    __slots__ = ("slot_ms", "slots")
+
+    def __init__(self, span_sec: int):
+        self.slot_ms = max(1, span_sec * 1000 // SLOTS)
+        self.slots: List[Tuple[int, LogSketch]] = [(-1, LogSketch()) for _ in range(SLOTS)]
+
+    def add(self, price: float, t: int) -> None:
+        n = t // self.slot_ms
+        i = n % SLOTS
+        slot_no, sk = self.slots[i]
+        if slot_no != n:
+            if slot_no > n:
+                return  # older than the ring reaches
+            sk = LogSketch()
+            self.slots[i] = (n, sk)
+        sk.add(price)
+
+    def merged(self, now: int) -> LogSketch:
+        cur = now // self.slot_ms
+        out = LogSketch()
+        for slot_no, sk in self.slots:
+            if cur - SLOTS < slot_no <= cur:
+                out.merge(sk)
+        return out
+
+
+class PriceIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._types: Dict[str, Dict[str, _Window]] = {}
+        self._last: Dict[str, Tuple[int, int]] = {}        # type -> (price, t)
+
+    def record(self, type_: str, price: int, t: Optional[int] = None) -> None:
+        if not type_ or price is None:
+            return
+        t = _now_ms() if t is None else int(t)
+        with self._lock:
+            windows = self._types.get(type_)
+            if windows is None:
+                windows = self._types[type_] = {name: _Window(span) for name, span in WINDOWS.items()}
+            for w in windows.values():
+                w.add(float(price), t)
+            last = self._last.get(type_)
+            if last is None or t >= last[1]:
+                self._last[type_] = (int(price), t)
+
+    def snapshot(self, type_: Optional[str] = None, now: Optional[int] = None) -> Dict[str, dict]:
+        """{type: {"last": {...}, "windows": {name: {count, min, max, p10, p50, p90}}}}"""
+        now = _now_ms() if now is None else now
+        with self._lock:
+            names = [type_] if type_ is not None else sorted(self._types)
+            out: Dict[str, dict] = {}
+            for name in names:
+                windows = self._types.get(name)
+                if windows is None:
+                    continue
+                stats = {}
+                for wname, w in windows.items():
+                    sk = w.merged(now)
+                    row = {
+                        "count": sk.count,
+                        "min": None if sk.min is None else int(sk.min),
+                        "max": None if sk.max is None else int(sk.max),
+                    }
+                    for label, q in QUANTILES:
+                        v = sk.quantile(q)
+                        row[label] = None if v is None else int(round(v))
+                    stats[wname] = row
+                price, t = self._last[name]
+                out[name] = {"last": {"price": price, "t": t}, "windows": stats}
+            return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._types.clear()
+            self._last.clear()
+
+
+index = PriceIndex()
+
+
+def seed(trades: Iterable[Tuple[str, int, int]]) -> int:
+    """Rebuild from (type, price, t) trades. Returns how many fell inside the longest window."""
+    index.reset()
+    horizon = _now_ms() - max(WINDOWS.values()) * 1000
+    n = 0
+    for type_, price, t in trades:
+        if t >= horizon:
+            index.record(type_, price, t)
+            n += 1
+    return n
@@ -1,6 +1,6 @@
 import json, os, time, hmac, hashlib
 from pathlib import Path
-from typing import Tuple
+from typing import Callable, List, Optional, Tuple
 
 DATA = Path("data")
 DATA.mkdir(exist_ok=True)
@@ -11,6 +11,30 @@ VERSIONS.mkdir(exist_ok=True)
 
 HMAC_KEY = os.getenv("WT_SETTINGS_HMAC_KEY", "dev-hmac-key").encode("utf-8")
 
+# last verified settings.json, kept in memory so hot paths don't re-read + re-hash it;
+# _stamp is the (mtime, size) of settings.json + .sig it was read at, re-checked
+# on every read so writes from other processes (uvicorn workers) are picked up
+_current: Optional[dict] = None
+_stamp: Optional[tuple] = None
+_listeners: List[Callable[[dict], None]] = []
+
+def _file_stamp() -> tuple:
+    out = []
+    for p in (SETTINGS, SIG):
+        try:
+            st = p.stat()
+            out.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            out.append(None)
+    return tuple(out)
+
+def _notify(settings: dict) -> None:
+    for fn in list(_listeners):
+        try:
+            fn(settings)
+        except Exception:
+            pass
+
 def _digest(raw: bytes) -> str:
     return hmac.new(HMAC_KEY, raw, hashlib.sha256).hexdigest()
 
@@ -42,8 +66,56 @@ def write_atomic(obj: dict) -> str:
     ver = time.strftime("%Y%m%d_%H%M%S")
     (VERSIONS / f"settings_{ver}.json").write_bytes(raw)
     (VERSIONS / f"settings_{ver}.sig").write_text(_digest(raw), encoding="utf-8")
+
+    global _current, _stamp
+    _current = json.loads(raw)
+    _stamp = _file_stamp()
+    _notify(_current)
     return ver
 
+# ---------- in-memory view + change listeners ----------
+def current() -> dict:
+    """
+    Verified settings from memory; {} if settings.json is missing or has never verified.
+    Two stat() calls per read; the file is re-read only when it changed on disk.
+    """
+    global _current, _stamp
+    stamp = _file_stamp()
+    if _current is not None and stamp == _stamp:
+        return _current
+    try:
+        fresh = read_verified() if SETTINGS.exists() else {}
+    except Exception:
+        # another process is mid-write (new json, old sig) or the file is bad:
+        # keep the last good view and look again on the next read
+        if _current is None:
+            _current = {}
+        return _current
+    changed = _current is not None and fresh != _current
+    _current, _stamp = fresh, stamp
+    if changed:
+        _notify(fresh)
+    return _current
+
+def add_listener(fn: Callable[[dict], None]) -> None:
+    """
+    fn(settings) runs after every write_atomic (on the writer's thread) and when
+    current() notices a change written by another process (on the reader's).
+    """
+    _listeners.append(fn)
+
+def remove_listener(fn: Callable[[dict], None]) -> None:
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+def auto_tick_seconds() -> int:
+    """Auto-tick interval: signed autoTickMin, else WT_AUTO_TICK_MIN, else 5 minutes."""
+    try:
+        minutes = current().get("autoTickMin") or os.getenv("WT_AUTO_TICK_MIN", "5")
+        return max(60, int(float(minutes) * 60))
+    except Exception:
+        return 5 * 60
+
 def list_versions() -> list:
     return sorted([p.name for p in VERSIONS.glob("settings_*.json")])
 
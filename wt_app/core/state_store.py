@@ -0,0 +1,520 @@
+# wt_app/core/state_store.py
+"""
+Process-wide in-memory world state (pins, streets, offers, economy).
+
+Collections are loaded once (in the app lifespan) and served from memory.
+Mutations go through the helpers below, which mark the touched rows dirty; a
+background task flushes them once writes have been quiet for
+FLUSH_DEBOUNCE_SEC (or FLUSH_MAX_DELAY_SEC has passed).
+
+Pins, streets and offers persist to indexed SQLite tables (wt_app/db/world.py)
+when settings.state_backend == "sqlite" -- only the dirty rows are upserted --
+or to data/*.json with the "json" backend. Economy and building types are
+always JSON. Files are decoded and encoded whole through
+wt_app/core/store_codec.py (msgspec structs when installed).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Protocol, Set, Tuple
+
+from wt_app.core import store_codec
+from wt_app.core.config import settings
+
+DATA = Path("data"); DATA.mkdir(exist_ok=True)
+
+PINS_FILE = DATA / "pins.json"
+STREETS_FILE = DATA / "streets.json"
+OFFERS_FILE = DATA / "offers.json"
+ECO_FILE = DATA / "economy.json"
+TYPES_FILE = DATA / "building_types.json"
+META_FILE = DATA / "store_meta.json"     # {"schema": {collection: version}}
+
+FLUSH_DEBOUNCE_SEC = float(os.getenv("WT_FLUSH_DEBOUNCE_SEC", "1.0") or 1.0)
+FLUSH_MAX_DELAY_SEC = float(os.getenv("WT_FLUSH_MAX_DELAY_SEC", "5.0") or 5.0)
+FLUSH_POLL_SEC = 0.25
+
+# Guards every collection below. Re-entrant so helpers can nest.
+lock = threading.RLock()
+
+_pins: Dict[str, dict] = {}      # id -> pin, file order
+_streets: Dict[str, dict] = {}   # id -> street, file order
+_offers: Dict[str, dict] = {}    # id -> offer, oldest first (file is newest first)
+_economy: dict = {}
+_types: List[dict] = []
+
+_pins_version = 0               # bumped on every pin change; see _fill() for the starting point
+_pin_listeners: list = []       # see add_pin_listener()
+_offer_listeners: list = []     # see add_offer_listener()
+
+_loaded = False
+# name -> dirty row ids, or None when the whole collection must be rewritten
+_dirty: Dict[str, Optional[Set[str]]] = {}
+_first_dirty = 0.0
+_last_dirty = 0.0
+
+
+# ---------- fs helpers ----------
+def _read_json(path: Path, default, kind: Optional[str] = None):
+    if not path.exists():
+        return default
+    try:
+        return store_codec.loads(path.read_bytes(), kind)
+    except Exception:
+        return default
+
+
+def _write_json_atomic(path: Path, raw: bytes) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(raw)
+    os.replace(tmp, path)
+
+
+def read_rows(path: Path, kind: Optional[str] = None) -> List[dict]:
+    """Object rows of a JSON array file; `kind` is its store_codec schema."""
+    raw = _read_json(path, [], kind)
+    return [r for r in raw if isinstance(r, dict)] if isinstance(raw, list) else []
+
+
+_DB_COLLECTIONS = ("pins", "streets", "offers")
+
+
+def _use_db(name: str) -> bool:
+    return settings.state_backend == "sqlite" and name in _DB_COLLECTIONS
+
+
+# ---------- load ----------
+def _fill(pins_rows: List[dict], streets_rows: List[dict], offers_oldest_first: List[dict]) -> None:
+    global _pins_version
+    # start above any version an earlier process handed out (one per change,
+    # far fewer than 1000 per ms), so a client's `since` can't alias across restarts
+    _pins_version = max(_pins_version, int(time.time() * 1000) * 1000)
+    _pins.clear()
+    missing_ids = False
+    for p in pins_rows:
+        if not p.get("id"):
+            # legacy rows without an id used to get a fresh one per read
+            p["id"] = uuid.uuid4().hex
+            missing_ids = True
+        _pins[str(p["id"])] = p
+
+    _streets.clear()
+    for s in streets_rows:
+        if s.get("id"):
+            _streets[str(s["id"])] = s
+
+    _offers.clear()
+    for o in offers_oldest_first:
+        if o.get("id"):
+            _offers[str(o["id"])] = o
+
+    if missing_ids:
+        mark_dirty("pins")
+    _notify_reset()
+    _notify_offers_reset()
+
+
+def _load_documents() -> None:
+    # call with `lock` held
+    global _loaded
+    eco = _read_json(ECO_FILE, {}, "economy")
+    _economy.clear()
+    _economy.update(eco if isinstance(eco, dict) else {})
+
+    # types first: pin listeners (income rates) price pins on reset
+    _types[:] = read_rows(TYPES_FILE)
+    _loaded = True
+
+
+def load() -> None:
+    """(Re)load every collection from data/*.json."""
+    with lock:
+        _dirty.clear()
+        _load_documents()
+        _fill(
+            read_rows(PINS_FILE, "pins"),
+            read_rows(STREETS_FILE, "streets"),
+            list(reversed(read_rows(OFFERS_FILE, "offers"))),
+        )
+
+
+async def load_async() -> None:
+    """
+    Lifespan entry point. JSON backend: every store from data/*.json. SQLite
+    backend: economy and types from JSON, pins/streets/offers from the tables
+    (importing data/*.json once into a fresh DB) -- the JSON copies of those
+    are never parsed, and listeners are filled only once.
+    """
+    if settings.state_backend != "sqlite":
+        load()
+        return
+    from wt_app.db import world
+    from wt_app.db.importer import import_json
+
+    with lock:
+        _dirty.clear()
+        _load_documents()
+    await import_json()
+    rows = {name: await world.load(name) for name in _DB_COLLECTIONS}
+    with lock:
+        for name in _DB_COLLECTIONS:
+            _dirty.pop(name, None)
+        _fill(rows["pins"], rows["streets"], rows["offers"])
+
+
+def _ensure_loaded() -> None:
+    # scripts / tests that never ran the lifespan still get a populated store
+    # (straight from data/*.json, whatever the backend: the tables need the
+    # async lifespan, so with the sqlite backend such callers see the JSON
+    # snapshot the tables were imported from)
+    if not _loaded:
+        load()
+
+
+# ---------- dirty tracking + flush ----------
+def mark_dirty(name: str, *keys: str) -> None:
+    """Mark rows `keys` of a collection dirty; no keys means the whole collection."""
+    global _first_dirty, _last_dirty
+    now = time.monotonic()
+    with lock:
+        if not _dirty:
+            _first_dirty = now
+        _last_dirty = now
+        if keys and _dirty.get(name, ()) is not None:
+            _dirty.setdefault(name, set()).update(str(k) for k in keys)
+        else:
+            _dirty[name] = None
+
+
+def _collection(name: str) -> Dict[str, dict]:
+    return {"pins": _pins, "streets": _streets, "offers": _offers}[name]
+
+
+def _serialize(name: str) -> Optional[bytes]:
+    if name == "pins":
+        obj = list(_pins.values())
+    elif name == "streets":
+        obj = list(_streets.values())
+    elif name == "offers":
+        obj = list(reversed(_offers.values()))
+    elif name == "economy":
+        obj = _economy
+    else:
+        return None
+    return store_codec.dumps(obj)
+
+
+def _db_changes(name: str, keys: Optional[Set[str]]) -> dict:
+    from wt_app.db import world
+
+    coll = _collection(name)
+    if keys is None:
+        return {"upserts": [world.to_row(name, r) for r in coll.values()], "replace_all": True}
+    return {
+        "upserts": [world.to_row(name, coll[k]) for k in keys if k in coll],
+        "deletes": [k for k in keys if k not in coll],
+    }
+
+
+_PATHS = {
+    "pins": PINS_FILE,
+    "streets": STREETS_FILE,
+    "offers": OFFERS_FILE,
+    "economy": ECO_FILE,
+}
+
+
+def _write_files(payloads) -> List[str]:
+    written: List[str] = []
+    for name, raw in payloads:
+        if raw is None:
+            continue
+        try:
+            _write_json_atomic(_PATHS[name], raw)
+            written.append(name)
+        except Exception:
+            # keep it dirty so the next pass retries
+            mark_dirty(name)
+    return written
+
+
+async def flush_async() -> List[str]:
+    """Persist every dirty collection (files + tables). Returns the names written."""
+    with lock:
+        taken = dict(_dirty)
+        _dirty.clear()
+        files = [(n, _serialize(n)) for n in taken if not _use_db(n)]
+        tables = [(n, _db_changes(n, taken[n])) for n in taken if _use_db(n)]
+
+    written: List[str] = []
+    try:
+        written += await asyncio.to_thread(_write_files, files)
+        if tables:
+            from wt_app.db import world
+
+            for name, change in tables:
+                try:
+                    await world.save(name, **change)
+                    written.append(name)
+                except Exception:
+                    keys = taken[name]
+                    mark_dirty(name, *(keys or ()))
+    except BaseException:
+        # cancelled mid-write (the lifespan stopping run_flusher): the save may
+        # have rolled back, so the final flush has to see these rows again
+        for name, keys in taken.items():
+            if name not in written:
+                mark_dirty(name, *(keys or ()))
+        raise
+    return written
+
+
+def _flush_due() -> bool:
+    if not _dirty:
+        return False
+    now = time.monotonic()
+    return (now - _last_dirty) >= FLUSH_DEBOUNCE_SEC or (now - _first_dirty) >= FLUSH_MAX_DELAY_SEC
+
+
+async def run_flusher() -> None:
+    """Background write-behind loop; cancelled from the lifespan on shutdown."""
+    while True:
+        await asyncio.sleep(FLUSH_POLL_SEC)
+        if _flush_due():
+            await flush_async()
+
+
+# ---------- pin listeners ----------
+class PinListener(Protocol):
+    def pin_changed(self, before: Optional[dict], after: Optional[dict]) -> None: ...
+    def pins_reset(self, pins: List[dict]) -> None: ...
+
+
+def add_pin_listener(listener: PinListener) -> None:
+    """
+    Keep a derived structure in step with the pins. pin_changed() gets a copy of
+    the row before and the live row after each add, update or delete (None on
+    the missing side); pins_reset() gets every pin after a (re)load or clear.
+    Both run under `lock`.
+    """
+    with lock:
+        _pin_listeners.append(listener)
+        if _loaded:
+            listener.pins_reset(list(_pins.values()))
+
+
+def _notify(before: Optional[dict], after: Optional[dict]) -> None:
+    _bump_pins()   # one version per pin change; listeners see the new one
+    for listener in _pin_listeners:
+        listener.pin_changed(before, after)
+
+
+def _notify_reset() -> None:
+    _bump_pins()
+    pins_now = list(_pins.values())
+    for listener in _pin_listeners:
+        listener.pins_reset(pins_now)
+
+
+# ---------- offer listeners ----------
+class OfferListener(Protocol):
+    def offer_changed(self, before: Optional[dict], after: Optional[dict]) -> None: ...
+    def offers_reset(self, offers: List[dict]) -> None: ...
+
+
+def add_offer_listener(listener: OfferListener) -> None:
+    """Same contract as add_pin_listener(); offers_reset() gets offers oldest first."""
+    with lock:
+        _offer_listeners.append(listener)
+        if _loaded:
+            listener.offers_reset(list(_offers.values()))
+
+
+def _notify_offer(before: Optional[dict], after: Optional[dict]) -> None:
+    for listener in _offer_listeners:
+        listener.offer_changed(before, after)
+
+
+def _notify_offers_reset() -> None:
+    offers_now = list(_offers.values())
+    for listener in _offer_listeners:
+        listener.offers_reset(offers_now)
+
+
+# ---------- pins ----------
+def _bump_pins() -> None:
+    global _pins_version
+    _pins_version += 1
+
+
+def pins_version() -> int:
+    return _pins_version
+
+
+def pins_snapshot() -> Tuple[int, List[dict]]:
+    """(version, pins) taken atomically, for caches keyed on the pins version."""
+    _ensure_loaded()
+    with lock:
+        return _pins_version, list(_pins.values())
+
+
+def pins() -> Dict[str, dict]:
+    _ensure_loaded()
+    return _pins
+
+
+def pin_list() -> List[dict]:
+    """Snapshot of the pins, safe to iterate while other threads mutate."""
+    _ensure_loaded()
+    return list(_pins.values())
+
+
+def get_pin(pin_id: str) -> Optional[dict]:
+    _ensure_loaded()
+    return _pins.get(str(pin_id))
+
+
+def add_pins(items: Iterable[dict]) -> None:
+    _ensure_loaded()
+    with lock:
+        ids = []
+        for p in items:
+            before = _pins.get(str(p["id"]))
+            _pins[str(p["id"])] = p
+            ids.append(str(p["id"]))
+            _notify(dict(before) if before else None, p)
+        mark_dirty("pins", *ids)
+
+
+def update_pin(pin_id: str, **fields) -> Optional[dict]:
+    _ensure_loaded()
+    with lock:
+        pin = _pins.get(str(pin_id))
+        if pin is None:
+            return None
+        before = dict(pin)
+        pin.update(fields)
+        _notify(before, pin)
+        mark_dirty("pins", pin_id)
+        return pin
+
+
+def remove_pin(pin_id: str) -> Optional[dict]:
+    _ensure_loaded()
+    with lock:
+        pin = _pins.pop(str(pin_id), None)
+        if pin is not None:
+            _notify(pin, None)
+            mark_dirty("pins", pin_id)
+        return pin
+
+
+def clear_pins() -> None:
+    _ensure_loaded()
+    with lock:
+        _pins.clear()
+        _notify_reset()
+        mark_dirty("pins")
+
+
+# ---------- streets ----------
+def streets() -> Dict[str, dict]:
+    _ensure_loaded()
+    return _streets
+
+
+def update_street(street_id: str, **fields) -> Optional[dict]:
+    _ensure_loaded()
+    with lock:
+        street = _streets.get(str(street_id))
+        if street is None:
+            return None
+        street.update(fields)
+        mark_dirty("streets", street_id)
+        return street
+
+
+# ---------- offers ----------
+def offers() -> Dict[str, dict]:
+    _ensure_loaded()
+    return _offers
+
+
+def offer_list() -> List[dict]:
+    """Snapshot of the offers, newest first (same order as offers.json)."""
+    _ensure_loaded()
+    return list(reversed(_offers.values()))
+
+
+def get_offer(offer_id: str) -> Optional[dict]:
+    _ensure_loaded()
+    return _offers.get(str(offer_id))
+
+
+def put_offer(offer: dict) -> None:
+    _ensure_loaded()
+    with lock:
+        before = _offers.get(str(offer["id"]))
+        _offers[str(offer["id"])] = offer
+        _notify_offer(dict(before) if before else None, offer)
+        mark_dirty("offers", offer["id"])
+
+
+def remove_offers(offer_ids: Iterable[str]) -> List[dict]:
+    """Drop offers from the hot set (e.g. once archived). Returns the removed rows."""
+    _ensure_loaded()
+    removed: List[dict] = []
+    with lock:
+        for oid in offer_ids:
+            offer = _offers.pop(str(oid), None)
+            if offer is not None:
+                _notify_offer(offer, None)
+                removed.append(offer)
+        if removed:
+            mark_dirty("offers", *(o["id"] for o in removed))
+    return removed
+
+
+def update_offer(offer_id: str, **fields) -> Optional[dict]:
+    """Update fields of an offer in place; status changes must go through here (offer indexes)."""
+    _ensure_loaded()
+    with lock:
+        offer = _offers.get(str(offer_id))
+        if offer is None:
+            return None
+        before = dict(offer)
+        offer.update(fields)
+        _notify_offer(before, offer)
+        mark_dirty("offers", offer_id)
+        return offer
+
+
+# ---------- economy + types ----------
+def economy() -> dict:
+    _ensure_loaded()
+    return _economy
+
+
+def building_types() -> List[dict]:
+    _ensure_loaded()
+    return _types
+
+
+# ---------- schema versions ----------
+def schema_version(name: str) -> int:
+    """Schema version a collection's rows were last migrated to (0 = never)."""
+    meta = _read_json(META_FILE, {})
+    return int(((meta if isinstance(meta, dict) else {}).get("schema") or {}).get(name) or 0)
+
+
+def set_schema_version(name: str, version: int) -> None:
+    """Stamp a collection; call only once the migrated rows are flushed."""
+    meta = _read_json(META_FILE, {})
+    meta = meta if isinstance(meta, dict) else {}
+    meta.setdefault("schema", {})[name] = int(version)
+    _write_json_atomic(META_FILE, store_codec.dumps(meta))
@@ -0,0 +1,144 @@
+# wt_app/core/store_codec.py
+"""
+Whole-file JSON decode / encode for the data/ stores.
+
+With msgspec installed the flat stores have a Struct for their rows (Pin,
+Street, Event) or document (Economy). A file is decoded in one typed pass
+straight from bytes and handed back as plain dicts, the shape the rest of
+the app works with; writes go through msgspec's encoder and keep the layout
+json.dumps(..., ensure_ascii=False, indent=2) produced. Offers carry nested
+history lists, which make the Struct -> dict conversion cost more than the
+typed pass saves, so they take the untyped msgspec decode.
+
+Every field defaults to UNSET and unknown fields are rejected, so a typed
+decode hands back exactly the keys that were on disk. Anything the structs
+don't describe (legacy rows with extra or oddly typed fields, non-object
+entries) fails the typed pass and the file is decoded untyped instead, so
+such rows load just as before. Files msgspec rejects outright (NaN or
+Infinity, which json.dumps writes for non-finite floats) fall back to the
+stdlib parser. Without msgspec the stdlib json module is used throughout.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, TypeVar, Union
+
+try:
+    import msgspec
+    from msgspec import UNSET, UnsetType
+except ImportError:  # pragma: no cover - msgspec is optional
+    msgspec = None
+
+T = TypeVar("T")
+
+if msgspec is not None:
+    Maybe = Union[T, UnsetType]
+    Num = Union[int, float]
+
+    # gc=False: decoded rows only hold JSON values, never cycles, and 100k
+    # tracked objects would otherwise trigger several collections per file
+    class _Row(msgspec.Struct, forbid_unknown_fields=True, gc=False):
+        pass
+
+    class Pin(_Row):
+        id: Maybe[str] = UNSET
+        lat: Maybe[float] = UNSET
+        lng: Maybe[float] = UNSET
+        color: Maybe[Optional[str]] = UNSET
+        type: Maybe[Optional[str]] = UNSET
+        owner: Maybe[Optional[str]] = UNSET
+        level: Maybe[int] = UNSET
+        streetId: Maybe[Optional[str]] = UNSET
+        streetName: Maybe[Optional[str]] = UNSET
+        createdAt: Maybe[int] = UNSET
+        lastTradeAt: Maybe[int] = UNSET
+
+    class Street(_Row):
+        id: Maybe[str] = UNSET
+        name: Maybe[str] = UNSET
+        price: Maybe[int] = UNSET
+        slots: Maybe[int] = UNSET
+        coords: Maybe[List[List[float]]] = UNSET
+        owner: Maybe[Optional[str]] = UNSET
+
+    class Event(_Row):
+        id: Maybe[str] = UNSET
+        t: Maybe[int] = UNSET
+        type: Maybe[Optional[str]] = UNSET
+        city: Maybe[Optional[str]] = UNSET
+        note: Maybe[Optional[str]] = UNSET
+        cdMins: Maybe[int] = UNSET
+
+    class Economy(_Row):
+        lastTick: Maybe[int] = UNSET
+        last_tick_ms: Maybe[int] = UNSET
+        last_tick: Maybe[int] = UNSET
+        # pre-ledger trees; moved into the ledger on first start
+        balances: Maybe[Dict[str, Num]] = UNSET
+        escrow: Maybe[Dict[str, Num]] = UNSET
+
+    _DECODERS = {
+        "pins": msgspec.json.Decoder(List[Pin]),
+        "streets": msgspec.json.Decoder(List[Street]),
+        "events": msgspec.json.Decoder(List[Event]),
+        "economy": msgspec.json.Decoder(Economy),
+    }
+    _LINE_DECODERS = {"events": msgspec.json.Decoder(Event)}
+    _decoder = msgspec.json.Decoder()
+    _encoder = msgspec.json.Encoder()
+
+
+def loads(raw: bytes, kind: Optional[str] = None) -> Any:
+    """Decode a JSON document; `kind` ("pins", "economy", ...) names the schema to try first."""
+    if msgspec is None:
+        return json.loads(raw)
+    dec = _DECODERS.get(kind)
+    if dec is not None:
+        try:
+            return msgspec.to_builtins(dec.decode(raw))
+        except msgspec.DecodeError:
+            pass  # legacy rows: take the file as it is
+    return _decode_untyped(raw)
+
+
+def _decode_untyped(raw: bytes) -> Any:
+    try:
+        return _decoder.decode(raw)
+    except msgspec.DecodeError:
+        return json.loads(raw)  # NaN / Infinity: only the stdlib parser takes them
+
+
+def loads_lines(raw: bytes, kind: Optional[str] = None) -> List[dict]:
+    """Object rows of a .jsonl file, stopping at the first undecodable line (a torn tail)."""
+    if msgspec is not None:
+        dec = _LINE_DECODERS.get(kind)
+        if dec is not None:
+            try:
+                return msgspec.to_builtins(dec.decode_lines(raw))
+            except msgspec.DecodeError:
+                pass  # legacy rows or a torn tail: line by line
+    out: List[dict] = []
+    for line in raw.splitlines():
+        if not line.strip():
+            continue
+        try:
+            row = _decode_untyped(line) if msgspec is not None else json.loads(line)
+        except ValueError:
+            break
+        if isinstance(row, dict):
+            out.append(row)
+    return out
+
+
+def dumps(obj: Any) -> bytes:
+    """Indented UTF-8 JSON, as the store files have always been written."""
+    if msgspec is None:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return msgspec.json.format(_encoder.encode(obj), indent=2)
+
+
+def dumps_line(obj: Any) -> bytes:
+    """One compact .jsonl line, newline included."""
+    if msgspec is None:
+        return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+    return _encoder.encode(obj) + b"\n"
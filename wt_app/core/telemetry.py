@@ -0,0 +1,95 @@
+# wt_app/core/telemetry.py
+"""
+Small in-memory metrics for ops endpoints (no external metrics stack).
+
+Histogram keeps cumulative bucket counts plus count/sum/min/max;
+TickStats adds the last few tick samples so recent percentiles are exact.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence
+
+# milliseconds
+DEFAULT_BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BOUNDS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)   # last bucket = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, v)] += 1
+        self.count += 1
+        self.sum += v
+        self.min = v if self.min is None else min(self.min, v)
+        self.max = v if self.max is None else max(self.max, v)
+
+    def snapshot(self) -> dict:
+        buckets = [{"le": b, "count": c} for b, c in zip(self.bounds, self.counts)]
+        buckets.append({"le": "+Inf", "count": self.counts[-1]})
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 3) if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+            "buckets": buckets,
+        }
+
+
+def _pct(sorted_vals: List[float], q: float) -> Optional[float]:
+    if not sorted_vals:
+        return None
+    i = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+
+class TickStats:
+    """Duration histogram + recent samples for economy ticks."""
+
+    def __init__(self, keep: int = 200):
+        self._lock = threading.Lock()
+        self.duration_ms = Histogram()
+        self.recent: Deque[dict] = deque(maxlen=keep)
+        self.pins_total = 0
+        self.owners_total = 0
+
+    def record(self, duration_ms: float, pins: int, owners: int, **extra) -> None:
+        with self._lock:
+            self.duration_ms.observe(duration_ms)
+            self.pins_total += int(pins)
+            self.owners_total += int(owners)
+            self.recent.append({
+                "t": int(time.time() * 1000),
+                "ms": round(duration_ms, 3),
+                "pins": int(pins),
+                "owners": int(owners),
+                **extra,
+            })
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            recent = list(self.recent)
+            hist = self.duration_ms.snapshot()
+            pins_total, owners_total = self.pins_total, self.owners_total
+        ms = sorted(s["ms"] for s in recent)
+        return {
+            "ticks": hist["count"],
+            "pinsProcessed": pins_total,
+            "ownersCredited": owners_total,
+            "durationMs": hist,
+            "recentPercentilesMs": {"p50": _pct(ms, 0.50), "p95": _pct(ms, 0.95), "p99": _pct(ms, 0.99)},
+            "recent": recent[-20:],
+        }
+
+
+tick_stats = TickStats()
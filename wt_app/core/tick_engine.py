@@ -0,0 +1,112 @@
+# wt_app/core/tick_engine.py
+"""
+Columnar economy tick.
+
+Pins are packed into three parallel arrays (owner index, type index, level)
+and income comes from a (type x level) lookup table, so a tick's per-owner
+accrual is one gather plus one bincount instead of a Python loop over dicts.
+The columns are cached against state_store.pins_version() and only rebuilt
+after a pin mutation.
+
+NumPy is optional: without it accrue() falls back to accrue_loop(), which is
+the original per-pin loop and the reference the vectorized path must match.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+MAX_LEVEL = 5
+
+
+def owner_of(p: dict) -> str:
+    return (p.get("owner") or "").strip()
+
+
+def level_of(p: dict) -> int:
+    try:
+        level = int(p.get("level") or 1)
+    except (TypeError, ValueError):
+        level = 1   # legacy row with a junk level: price it like a fresh build
+    return min(MAX_LEVEL, max(1, level))
+
+
+def accrue_loop(pins: List[dict], income_map: Dict[str, int]) -> Dict[str, int]:
+    """Reference implementation: sum(baseIncome[type] * level) per owner."""
+    per_owner: Dict[str, int] = {}
+    for p in pins:
+        owner = owner_of(p)
+        if not owner:
+            continue
+        base = int(income_map.get(p.get("type") or "", 0))
+        per_owner[owner] = per_owner.get(owner, 0) + (base * level_of(p))
+    return per_owner
+
+
+class PinColumns:
+    """Owned pins as parallel arrays; `owners[i]` / `types[j]` decode the indexes."""
+
+    def __init__(self, pins: List[dict]):
+        owner_ix: Dict[str, int] = {}
+        type_ix: Dict[str, int] = {}
+        o_col: List[int] = []
+        t_col: List[int] = []
+        l_col: List[int] = []
+        for p in pins:
+            owner = owner_of(p)
+            if not owner:
+                continue
+            o_col.append(owner_ix.setdefault(owner, len(owner_ix)))
+            t_col.append(type_ix.setdefault(p.get("type") or "", len(type_ix)))
+            l_col.append(level_of(p))
+        self.owners: List[str] = list(owner_ix)
+        self.types: List[str] = list(type_ix)
+        self.owner_idx = np.asarray(o_col, dtype=np.int64)
+        self.type_idx = np.asarray(t_col, dtype=np.int64)
+        self.level = np.asarray(l_col, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.owner_idx)
+
+
+def income_table(types: List[str], income_map: Dict[str, int]):
+    """table[t, lvl] = baseIncome[types[t]] * lvl (unknown types earn 0)."""
+    base = np.asarray([int(income_map.get(t, 0)) for t in types], dtype=np.int64)
+    return base[:, None] * np.arange(MAX_LEVEL + 1, dtype=np.int64)[None, :]
+
+
+def accrue_columns(cols: PinColumns, income_map: Dict[str, int]) -> Dict[str, int]:
+    if not len(cols):
+        return {}
+    per_pin = income_table(cols.types, income_map)[cols.type_idx, cols.level]
+    # float weights are exact for integers below 2**53
+    totals = np.bincount(cols.owner_idx, weights=per_pin, minlength=len(cols.owners))
+    return {o: int(v) for o, v in zip(cols.owners, np.rint(totals).astype(np.int64).tolist())}
+
+
+_cache_lock = threading.Lock()
+_cache: Tuple[Optional[int], Optional[PinColumns]] = (None, None)
+
+
+def columns_for(pins: List[dict], version: int) -> PinColumns:
+    """PinColumns for this pins snapshot, reused while the store version is unchanged."""
+    global _cache
+    with _cache_lock:
+        cached_version, cols = _cache
+        if cols is None or cached_version != version:
+            cols = PinColumns(pins)
+            _cache = (version, cols)
+        return cols
+
+
+def accrue(pins: List[dict], income_map: Dict[str, int], version: Optional[int] = None) -> Dict[str, int]:
+    """Per-owner income for one tick; vectorized when NumPy is available."""
+    if np is None:
+        return accrue_loop(pins, income_map)
+    cols = PinColumns(pins) if version is None else columns_for(pins, version)
+    return accrue_columns(cols, income_map)
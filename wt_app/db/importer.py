@@ -0,0 +1,64 @@
+# wt_app/db/importer.py
+"""
+One-shot import of data/pins.json, streets.json and offers.json into SQLite.
+
+Runs automatically on startup until the DB is stamped as imported (so tables
+emptied later, e.g. by DELETE /pins, stay empty); can also be run by hand
+(e.g. to re-seed a dev DB):
+
+    python -m wt_app.db.importer            # only if never imported
+    python -m wt_app.db.importer --force    # replace whatever is there
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import uuid
+from typing import Dict
+
+from wt_app.core.state_store import OFFERS_FILE, PINS_FILE, STREETS_FILE, read_rows, set_schema_version
+from wt_app.db import world
+from wt_app.db.base import init_db
+
+
+async def import_json(force: bool = False) -> Dict[str, int]:
+    """Copy the JSON stores into the tables. Returns rows imported per table."""
+    if not force and await world.imported():
+        return {}
+    if not force and not await world.is_empty():
+        await world.mark_imported()     # filled before the stamp existed
+        return {}
+
+    pins = read_rows(PINS_FILE, "pins")
+    for p in pins:
+        if not p.get("id"):
+            p["id"] = uuid.uuid4().hex
+    streets = [s for s in read_rows(STREETS_FILE, "streets") if s.get("id")]
+    # offers.json is newest first; insert oldest first so rowid order = age
+    offers = [o for o in reversed(read_rows(OFFERS_FILE, "offers")) if o.get("id")]
+
+    counts: Dict[str, int] = {}
+    for name, items in (("pins", pins), ("streets", streets), ("offers", offers)):
+        await world.save(name, [world.to_row(name, i) for i in items], replace_all=True)
+        counts[name] = len(items)
+    # the imported offers may be legacy rows: un-stamp the store so the next
+    # startup runs offers_v2.migrate_offers over them again
+    set_schema_version("offers", 0)
+    await world.mark_imported()
+    return counts
+
+
+async def _main(force: bool) -> None:
+    await init_db()
+    counts = await import_json(force=force)
+    if not counts:
+        print("already imported; use --force to replace")
+        return
+    for name, n in counts.items():
+        print(f"{name}: {n} rows")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--force", action="store_true", help="replace existing rows")
+    asyncio.run(_main(ap.parse_args().force))
@@ -1,5 +1,6 @@
 from datetime import datetime
-from sqlalchemy import String, Integer, Float, DateTime, func, UniqueConstraint
+from typing import Optional
+from sqlalchemy import String, Integer, BigInteger, Float, DateTime, JSON, Text, func, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 from wt_app.db.base import Base
 
@@ -18,3 +19,48 @@ class Waitlist(Base):
     position: Mapped[int] = mapped_column(Integer, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
     __table_args__ = (UniqueConstraint("email", name="uq_waitlist_email"),)
+
+
+# ---------- world state (pins / streets / offers) ----------
+# Column names are snake_case; wt_app/db/world.py maps them to the camelCase
+# dicts the API works with. Unknown keys on a row are kept in `extra`; columns
+# are nullable so legacy / partial rows survive the round trip.
+
+class Pin(Base):
+    __tablename__ = "pins"
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    lat: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    lng: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    color: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    type: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    owner: Mapped[Optional[str]] = mapped_column(String(320), nullable=True, index=True)
+    level: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    street_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    street_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    last_trade_at: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    extra: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+
+class Street(Base):
+    __tablename__ = "streets"
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    slots: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    coords: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
+    owner: Mapped[Optional[str]] = mapped_column(String(320), nullable=True, index=True)
+    extra: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+
+class Offer(Base):
+    __tablename__ = "offers"
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    pin_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    from_owner: Mapped[Optional[str]] = mapped_column(String(320), nullable=True, index=True)
+    to_owner: Mapped[Optional[str]] = mapped_column(String(320), nullable=True, index=True)
+    amount: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    status: Mapped[Optional[str]] = mapped_column(String(16), nullable=True, index=True)
+    created_at: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    expires_at: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    note: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    history: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
+    extra: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
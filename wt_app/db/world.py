@@ -0,0 +1,135 @@
+# wt_app/db/world.py
+"""
+SQLite persistence for the in-memory world state (see wt_app/core/state_store.py).
+
+The API keeps working with plain camelCase dicts; this module maps them to the
+indexed Pin / Street / Offer tables and back.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import delete, func, literal_column, select, text
+from sqlalchemy.dialects.sqlite import insert
+
+from wt_app.db.base import engine
+from wt_app.db.models import Offer, Pin, Street
+
+# json key -> column, per table
+_FIELDS: Dict[str, Tuple[type, Dict[str, str]]] = {
+    "pins": (Pin, {
+        "id": "id",
+        "lat": "lat",
+        "lng": "lng",
+        "color": "color",
+        "type": "type",
+        "owner": "owner",
+        "level": "level",
+        "streetId": "street_id",
+        "streetName": "street_name",
+        "createdAt": "created_at",
+        "lastTradeAt": "last_trade_at",
+    }),
+    "streets": (Street, {
+        "id": "id",
+        "name": "name",
+        "price": "price",
+        "slots": "slots",
+        "coords": "coords",
+        "owner": "owner",
+    }),
+    "offers": (Offer, {
+        "id": "id",
+        "pinId": "pin_id",
+        "fromOwner": "from_owner",
+        "toOwner": "to_owner",
+        "amount": "amount",
+        "status": "status",
+        "createdAt": "created_at",
+        "expiresAt": "expires_at",
+        "note": "note",
+        "history": "history",
+    }),
+}
+
+# keys that are only written back when set (legacy rows never had them)
+_OPTIONAL_KEYS = {"lastTradeAt"}
+
+_CHUNK = 500  # stay well under SQLite's bound-parameter limit
+
+
+def to_row(name: str, item: dict) -> dict:
+    _, fields = _FIELDS[name]
+    row = {col: item.get(key) for key, col in fields.items()}
+    extra = {k: v for k, v in item.items() if k not in fields}
+    row["extra"] = extra or None
+    return row
+
+
+def from_row(name: str, obj) -> dict:
+    _, fields = _FIELDS[name]
+    out: dict = {}
+    for key, col in fields.items():
+        v = getattr(obj, col)
+        if v is None and key in _OPTIONAL_KEYS:
+            continue
+        out[key] = v
+    if obj.extra:
+        out.update(obj.extra)
+    return out
+
+
+async def is_empty() -> bool:
+    async with engine.connect() as conn:
+        for model, _ in _FIELDS.values():
+            n = (await conn.execute(select(func.count()).select_from(model))).scalar_one()
+            if n:
+                return False
+    return True
+
+
+# PRAGMA user_version once data/*.json has been copied in (0 = never)
+_IMPORTED = 1
+
+
+async def imported() -> bool:
+    async with engine.connect() as conn:
+        return (await conn.execute(text("PRAGMA user_version"))).scalar_one() >= _IMPORTED
+
+
+async def mark_imported() -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text(f"PRAGMA user_version = {_IMPORTED}"))
+
+
+async def load(name: str) -> List[dict]:
+    """All rows of one collection in insertion (rowid) order."""
+    model, _ = _FIELDS[name]
+    async with engine.connect() as conn:
+        res = await conn.execute(select(model).order_by(literal_column("rowid")))
+        return [from_row(name, r) for r in res]
+
+
+async def save(
+    name: str,
+    upserts: Iterable[dict],
+    deletes: Iterable[str] = (),
+    replace_all: bool = False,
+) -> None:
+    """
+    Apply one flush of a collection in a single transaction.
+    `upserts` are column dicts from to_row(); `replace_all` wipes the table first.
+    """
+    model, _ = _FIELDS[name]
+    rows = list(upserts)
+    ids = list(deletes)
+    async with engine.begin() as conn:
+        if replace_all:
+            await conn.execute(delete(model))
+        for i in range(0, len(ids), _CHUNK):
+            await conn.execute(delete(model).where(model.id.in_(ids[i:i + _CHUNK])))
+        for i in range(0, len(rows), _CHUNK):
+            stmt = insert(model).values(rows[i:i + _CHUNK])
+            cols = {c: stmt.excluded[c] for c in rows[0] if c != "id"}
+            await conn.execute(stmt.on_conflict_do_update(index_elements=["id"], set_=cols))
+
@@ -22,8 +22,10 @@ from wt_app.api import shop
 from wt_app.api.economy_health import router as economy_health_router
 from wt_app.api.pins_market import router as pins_market_router
 from wt_app.api import offers_v2                  # ✅ v2 offers only
+from wt_app.api import market as market_api
 
 from wt_app.core.autotick import start_auto_tick
+from wt_app.core import event_log, ledger, market, offer_archive, state_store
 
 from sqlalchemy import select, func
 from wt_app.db.models import User
@@ -32,14 +34,34 @@ from wt_app.db.models import User
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await state_store.load_async()
+    await offers_v2.migrate_offers()
+    ledger.open_ledger()
+    market_api.load_orders()
+    offers_v2.seed_price_index()
+    event_log.load()
+    flusher = asyncio.create_task(state_store.run_flusher())
     task = asyncio.create_task(start_auto_tick(app))
+    expiry = asyncio.create_task(offers_v2.run_expiry())
+    archiver = asyncio.create_task(offer_archive.run_archiver())
+    events_flusher = asyncio.create_task(event_log.run_flusher())
     app.state.auto_tick_task = task
+    app.state.flush_task = flusher
+    app.state.offer_expiry_task = expiry
+    app.state.offer_archive_task = archiver
     try:
         yield
     finally:
-        task.cancel()
-        with suppress(asyncio.CancelledError):
-            await task
+        for t in (task, expiry, archiver, events_flusher, flusher):
+            t.cancel()
+            with suppress(asyncio.CancelledError):
+                await t
+        # final write-behind pass so nothing dirty is lost on shutdown
+        await state_store.flush_async()
+        event_log.flush()
+        market.close()
+        ledger.checkpoint()
+        ledger.close()
 
 
 app = FastAPI(title="World Tycoon", lifespan=lifespan)
@@ -59,6 +81,7 @@ app.include_router(economy_health_router)
 app.include_router(pins_market_router)
 app.include_router(streets_api.router)   # ✅ streets
 app.include_router(offers_v2.router)     # ✅ only v2 offers
+app.include_router(market_api.router)
 
 # CORS
 app.add_middleware(